@@ -465,6 +465,7 @@ async def delete_permission_group(
     # 删除权限分组（会级联删除相关权限）
     await db.delete(db_group)
     await db.commit()
+    auth.invalidate_permission_cache()
     return {"detail": "权限分组已删除"}
 
 @router.get("/permissions", response_model=Dict[str, List])
@@ -577,6 +578,7 @@ async def update_permission(
         setattr(db_permission, key, value)
 
     await db.commit()
+    auth.invalidate_permission_cache()
     await db.refresh(db_permission)
 
     # 重新查询权限以获取完整的关联数据
@@ -605,6 +607,7 @@ async def delete_permission(
     await db.execute(delete(role_permission).where(role_permission.c.permission_id == permission_id))
     await db.delete(db_permission)
     await db.commit()
+    auth.invalidate_permission_cache()
     return {"detail": "权限已删除"}
 
 # 角色管理接口
@@ -738,6 +741,7 @@ async def update_role(
                 db_role.permissions.append(db_permission)
     
     await db.commit()
+    auth.invalidate_permission_cache()
     await db.refresh(db_role)
 
     # 重新查询角色以获取完整的关联数据
@@ -768,6 +772,7 @@ async def delete_role(
     await db.execute(delete(user_role).where(user_role.c.role_id == role_id))
     await db.delete(db_role)
     await db.commit()
+    auth.invalidate_permission_cache()
     return {"detail": "角色已删除"}
 
 # 用户角色管理接口
@@ -829,6 +834,7 @@ async def assign_user_roles(
             db_user.roles.append(db_role)
 
     await db.commit()
+    auth.invalidate_user_cache(db_user.id)
     await db.refresh(db_user)
 
     # 重新查询用户以获取完整的关联数据
@@ -5,15 +5,24 @@
 这些API允许前端对数据库进行CRUD操作，同时确保安全和权限控制。
 """
 
+import asyncio
 import json
 from typing import Any, Dict, List, Optional, Union
 from fastapi import APIRouter, Depends, HTTPException, Query, Path, Body, UploadFile, File, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 
 from core.auth import get_current_active_user, RoleChecker, PermissionChecker
 from core.permissions import view_database, view_table_p, update_table_p, delete_table_p, manage_database
 from core.db_manager import DBManager
+from core.db_export import EXPORT_FORMATS, iter_export
+from core.db_import import (
+    detect_import_format,
+    import_jobs,
+    run_import,
+    run_import_in_background,
+    spool_to_tempfile
+)
 from schemas.database import (
     TableSchema, 
     TableInfo, 
@@ -164,10 +173,16 @@ async def get_table_data(
     search: Optional[str] = Query(None, description="搜索关键词"),
     sort_by: Optional[str] = Query(None, description="排序字段"),
     sort_desc: bool = Query(False, description="是否降序排序"),
+    keyset: bool = Query(False, description="是否使用游标分页（按排序字段+主键定位，不使用OFFSET）"),
+    cursor: Optional[str] = Query(None, description="游标分页时上一页返回的next_cursor"),
     current_user: User = Depends(view_table_p)
 ):
     """
     获取表数据，支持分页、搜索和排序
+
+    search 使用全文索引搜索文本列，结果按相关度排序（指定 sort_by 时按该字段排序）。
+    传入 keyset=true 或 cursor 时使用游标分页，深度翻页的耗时与页码无关；
+    总记录数来自 DBManager 的行数缓存，不再每页执行 COUNT(*)。
     """
     try:
         # 计算偏移量
@@ -175,29 +190,48 @@ async def get_table_data(
         
         # 准备条件
         condition = {}
-        if search:
-            # 这里需要实现搜索逻辑，但需要根据具体数据库实现
-            # 简化处理
-            pass
-            
-        # 执行查询
-        query_result = await db_manager.execute_query(
-            operation="select",
-            table_name=table_name,
-            condition=condition,
-            limit=per_page,
-            offset=offset,
-            sort_by=sort_by,
-            sort_desc=sort_desc
-        )
-        
-        # 获取总记录数
-        count_query = await db_manager.execute_query(
-            operation="raw",
-            sql=f"SELECT COUNT(*) as total FROM {table_name}"
-        )
+
+        next_cursor = None
+        has_more = None
+        total = None
+        if search and search.strip():
+            # 全文搜索，结果按相关度排序
+            search_result = await db_manager.search_table(
+                table_name,
+                search,
+                limit=per_page,
+                offset=offset,
+                sort_by=sort_by,
+                sort_desc=sort_desc
+            )
+            query_result = search_result["items"]
+            total = search_result["total"]
+        elif keyset or cursor:
+            keyset_page = await db_manager.select_keyset_page(
+                table_name,
+                limit=per_page,
+                sort_by=sort_by,
+                sort_desc=sort_desc,
+                cursor=cursor
+            )
+            query_result = keyset_page["items"]
+            next_cursor = keyset_page["next_cursor"]
+            has_more = keyset_page["has_more"]
+        else:
+            # 执行查询
+            query_result = await db_manager.execute_query(
+                operation="select",
+                table_name=table_name,
+                condition=condition,
+                limit=per_page,
+                offset=offset,
+                sort_by=sort_by,
+                sort_desc=sort_desc
+            )
         
-        total = count_query[0]["total"] if count_query else 0
+        # 获取总记录数（缓存）
+        if total is None:
+            total = await db_manager.get_row_count(table_name)
         
         # 构建响应
         result = {
@@ -205,7 +239,9 @@ async def get_table_data(
             "total": total,
             "page": page,
             "per_page": per_page,
-            "pages": (total + per_page - 1) // per_page
+            "pages": (total + per_page - 1) // per_page,
+            "next_cursor": next_cursor,
+            "has_more": has_more
         }
         
         return result
@@ -433,43 +469,11 @@ async def bulk_insert_data(
     查询主键，如果主键存在，则更新，否则插入
     """
     try:
-        # 获取表结构，找出主键
-        schema = await db_manager.get_table_schema(table_name)
-        primary_key = next((col["name"] for col in schema["columns"] if col["primary_key"]), None)
-        
-        if not primary_key:
-            raise ValueError(f"表 {table_name} 没有主键，无法批量插入")
-        
-        inserted_count = 0
-        for item in data:
-            # 构建条件
-            condition = {primary_key: item[primary_key]}
-            
-            # 执行查询
-            result = await db_manager.execute_query(
-                operation="select",
-                table_name=table_name,
-                condition=condition
-            )
-            
-            if result:
-                # 更新
-                await db_manager.execute_query(
-                    operation="update",
-                    table_name=table_name,
-                    data=item,
-                    condition=condition
-                )
-            else:
-                # 插入
-                await db_manager.execute_query(
-                    operation="insert",
-                    table_name=table_name,
-                    data=item
-                )
-            inserted_count += 1
-            
-        return {"message": f"成功插入 {inserted_count} 条记录"}
+        # 按主键批量插入或更新
+        result = await db_manager.bulk_upsert(table_name, data)
+        inserted_count = result["inserted"] + result["updated"]
+
+        return {"message": f"成功插入 {inserted_count} 条记录", **result}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except SQLAlchemyError as e:
@@ -481,123 +485,99 @@ async def bulk_insert_data(
 @router.post("/tables/{table_name}/import", status_code=201)
 async def import_table_data(
     table_name: str = Path(..., description="表名"),
-    file: UploadFile = File(..., description="要导入的CSV或JSON文件"),
+    file: UploadFile = File(..., description="要导入的CSV、JSON或NDJSON文件"),
+    background: bool = Query(False, description="是否后台导入，立即返回任务ID"),
     current_user: User = Depends(update_table_p)
 ):
     """
-    从CSV或JSON文件导入数据到表
+    从CSV、JSON或NDJSON文件导入数据到表
+
+    文件按块流式解析并分批写入，内存占用与文件大小无关。
+    background=true 时立即返回任务ID，可通过 /tables/{table_name}/import/{job_id} 查询进度。
     """
     try:
-        file_content = await file.read()
-        file_extension = file.filename.split('.')[-1].lower()
-        
-        if file_extension == 'json':
-            data = json.loads(file_content)
-            if not isinstance(data, list):
-                raise HTTPException(status_code=400, detail="JSON文件必须包含数据对象的数组")
-        elif file_extension == 'csv':
-            # 处理CSV导入
-            import csv
-            import io
-            
-            content = file_content.decode('utf-8')
-            csv_reader = csv.DictReader(io.StringIO(content))
-            data = [row for row in csv_reader]
-        else:
-            raise HTTPException(status_code=400, detail="只支持CSV或JSON文件")
-        
-        if not data:
-            raise HTTPException(status_code=400, detail="文件不包含有效数据")
-        
-        # 批量插入数据，查询主键，如果主键存在，则更新，否则插入
-        inserted_count = 0
-        for item in data:
-            # 获取表结构，找出主键
-            schema = await db_manager.get_table_schema(table_name)
-            primary_key = next((col["name"] for col in schema["columns"] if col["primary_key"]), None)
-            
-            if not primary_key:
-                raise ValueError(f"表 {table_name} 没有主键，无法批量插入")
-            
-            # 构建条件
-            condition = {primary_key: item[primary_key]}
-            
-            # 执行查询
-            result = await db_manager.execute_query(
-                operation="select",
-                table_name=table_name,
-                condition=condition
+        file_format = detect_import_format(file.filename)
+        job = import_jobs.create(table_name, file.filename)
+
+        if background:
+            # 请求结束后上传文件会被关闭，先转存到临时文件
+            loop = asyncio.get_running_loop()
+            temp_file = await loop.run_in_executor(None, spool_to_tempfile, file.file)
+            job.task = asyncio.create_task(
+                run_import_in_background(db_manager, job, temp_file, file_format)
             )
-            
-            if result:
-                # 更新
-                await db_manager.execute_query(
-                    operation="update",
-                    table_name=table_name,
-                    data=item,
-                    condition=condition
-                )
-            else:
-                # 插入
-                await db_manager.execute_query(
-                    operation="insert",
-                    table_name=table_name,
-                    data=item
-                )
-            inserted_count += 1
-            
-        return {"message": f"成功导入 {inserted_count} 条记录"}
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+            return {"message": "导入任务已创建", "job_id": job.id}
+
+        # 直接从上传的临时文件流式读取，查询主键，如果主键存在，则更新，否则插入
+        await run_import(db_manager, job, file.file, file_format)
+        inserted_count = job.inserted + job.updated
+
+        return {
+            "message": f"成功导入 {inserted_count} 条记录",
+            "inserted": job.inserted,
+            "updated": job.updated,
+            "job_id": job.id
+        }
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="JSON格式无效")
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="文件编码无效，请使用UTF-8编码")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"导入数据失败: {str(e)}")
 
 
+@router.get("/tables/{table_name}/import/{job_id}", response_model=Dict[str, Any])
+async def get_import_job(
+    table_name: str = Path(..., description="表名"),
+    job_id: str = Path(..., description="导入任务ID"),
+    current_user: User = Depends(view_table_p)
+):
+    """
+    查询导入任务进度
+    """
+    job = import_jobs.get(job_id)
+    if not job or job.table_name != table_name:
+        raise HTTPException(status_code=404, detail=f"导入任务 {job_id} 不存在")
+    return job.to_dict()
+
+
 @router.get("/tables/{table_name}/export")
 async def export_table_data(
     table_name: str = Path(..., description="表名"),
-    format: str = Query("json", description="导出格式，支持json或csv"),
+    format: str = Query("json", description="导出格式，支持json、csv、ndjson、parquet或arrow"),
     current_user: User = Depends(view_table_p)
 ):
     """
-    导出表数据为JSON或CSV格式
+    流式导出表数据
+
+    通过服务端游标分批读取并边编码边发送，导出大表时内存占用只与批大小有关。
     """
     try:
-        if format.lower() not in ["json", "csv"]:
-            raise HTTPException(status_code=400, detail="只支持json或csv格式")
-        
-        # 获取所有数据
-        data = await db_manager.execute_query(
-            operation="select",
-            table_name=table_name
+        file_format = format.lower()
+        if file_format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail="只支持json、csv、ndjson、parquet或arrow格式")
+
+        if not await db_manager.table_exists(table_name):
+            raise HTTPException(status_code=404, detail=f"表 {table_name} 不存在")
+
+        table = db_manager.tables[table_name]
+        media_type, extension = EXPORT_FORMATS[file_format]
+        content = iter_export(table, db_manager.stream_rows(table_name), file_format)
+
+        return StreamingResponse(
+            content,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={table_name}.{extension}"}
         )
-        
-        if format.lower() == "json":
-            return JSONResponse(content=data)
-        else:
-            import csv
-            import io
-            
-            if not data:
-                return JSONResponse(content={"message": "表中没有数据"})
-                
-            output = io.StringIO()
-            writer = csv.DictWriter(output, fieldnames=data[0].keys())
-            writer.writeheader()
-            writer.writerows(data)
-            
-            response = JSONResponse(content={"csv_data": output.getvalue()})
-            response.headers["Content-Disposition"] = f"attachment; filename={table_name}.csv"
-            return response
+    except HTTPException:
+        raise
     except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"导出数据失败: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"导出数据失败: {str(e)}")
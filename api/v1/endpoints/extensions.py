@@ -4,6 +4,7 @@
 from datetime import datetime
 from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi.responses import FileResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -11,6 +12,8 @@ from sqlalchemy.orm import selectinload
 from config import settings
 from core import auth,permissions
 from core.extension_manager import ExtensionManager
+from core.extension_executor import extension_executor
+from core.extension_jobs import extension_job_manager, ExtensionJob, JOB_SUCCEEDED, RESULT_MEDIA_TYPES
 from db.session import get_db
 from models.extension import Extension
 from schemas.extension import ExtensionInDB, ExtensionUpdate
@@ -57,6 +60,78 @@ async def get_extensions(
     return extensions
 
 
+@router.get("/executor/metrics")
+async def get_executor_metrics(
+        current_user: User = Depends(manage_extensions),
+) -> Any:
+    """
+    获取扩展执行器指标（并发、排队、超时、耗时）、结果缓存和热加载统计
+    """
+    metrics = extension_executor.get_metrics()
+    metrics["result_cache"] = extension_manager.result_cache.get_stats()
+    metrics["watcher"] = extension_manager.watcher.get_stats()
+    return metrics
+
+
+def _get_own_job(job_id: str, current_user: User) -> ExtensionJob:
+    """获取任务，只有提交者和超级管理员可以访问"""
+    job = extension_job_manager.get(job_id)
+    if not job or (job.user_id != current_user.id and not current_user.is_superuser):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在或已过期")
+    return job
+
+
+@router.get("/jobs")
+async def list_extension_jobs(
+        current_user: User = Depends(auth.get_current_active_user),
+) -> Any:
+    """
+    获取当前用户的扩展后台任务
+    """
+    return [job.to_dict() for job in extension_job_manager.list_jobs(current_user.id)]
+
+
+@router.get("/jobs/{job_id}")
+async def get_extension_job(
+        job_id: str,
+        current_user: User = Depends(auth.get_current_active_user),
+) -> Any:
+    """
+    获取扩展后台任务状态和进度
+    """
+    return _get_own_job(job_id, current_user).to_dict()
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_extension_job_result(
+        job_id: str,
+        current_user: User = Depends(auth.get_current_active_user),
+) -> Any:
+    """
+    获取扩展后台任务结果
+    """
+    job = _get_own_job(job_id, current_user)
+    if job.status != JOB_SUCCEEDED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"任务未成功完成，当前状态: {job.status}")
+    return FileResponse(job.result_path, media_type=RESULT_MEDIA_TYPES[job.result_format])
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_extension_job(
+        job_id: str,
+        current_user: User = Depends(auth.get_current_active_user),
+) -> Any:
+    """
+    取消扩展后台任务
+
+    在线程中执行的任务无法强制终止，返回的状态为 cancelling，调用结束后变为 cancelled
+    """
+    job = _get_own_job(job_id, current_user)
+    if not extension_job_manager.cancel(job):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"任务已结束，当前状态: {job.status}")
+    return {"success": True, "job_id": job.id, "status": job.status}
+
+
 @router.post("", response_model=ExtensionInDB)
 async def create_extension(
         *,
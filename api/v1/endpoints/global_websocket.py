@@ -8,6 +8,7 @@ import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from starlette.websockets import WebSocketState
 
 from core.global_websocket_manager import global_ws_manager, MessageType
 from core.websocket_auth import authenticate_websocket
@@ -56,7 +57,8 @@ async def global_websocket_endpoint(
         )
         
         # 处理消息循环
-        while True:
+        # 连接可能因发送失败被服务端关闭
+        while websocket.application_state == WebSocketState.CONNECTED:
             try:
                 # 接收消息
                 data = await websocket.receive_text()
@@ -90,7 +92,7 @@ async def global_websocket_endpoint(
     finally:
         # 清理连接
         if user_id:
-            await global_ws_manager.disconnect(user_id)
+            await global_ws_manager.disconnect(user_id, websocket)
 
 async def handle_global_message(user_id: int, message: dict, db: AsyncSession):
     """处理全局WebSocket消息"""
@@ -29,7 +29,7 @@ from config import settings
 from models.user import User as DBUser
 from models.chat import (
     ChatRoom as DBChatRoom, ChatMessage as DBChatMessage, MessageReadReceipt,
-    MessageReaction as DBMessageReaction, UserTyping, chat_room_members, RoomType,
+    MessageReaction as DBMessageReaction, UserTyping, chat_room_members, chat_room_unread, RoomType,
     ChatRoomJoinRequest as DBChatRoomJoinRequest, JoinRequestStatus as DBJoinRequestStatus
 )
 from schemas.modern_chat import (
@@ -44,6 +44,9 @@ from schemas.modern_chat import (
 )
 from core.logger import get_logger
 from core.global_websocket_manager import global_ws_manager, MessageType
+from core.chat_unread import chat_unread_counter
+from core.chat_membership import chat_membership_cache
+from core.chat_rooms import set_room_last_message, refresh_room_last_message
 
 router = APIRouter()
 logger = get_logger("chat")
@@ -61,60 +64,62 @@ async def get_chat_rooms(
 ):
     """获取聊天室列表"""
     try:
-        # 构建查询
-        query = select(DBChatRoom).options(
-            selectinload(DBChatRoom.creator),
-            selectinload(DBChatRoom.members),
-            selectinload(DBChatRoom.messages).selectinload(DBChatMessage.sender)
-        ).where(DBChatRoom.is_active == True)
+        # 成员数和是否为成员使用关联子查询，最后消息读取聊天室上的摘要字段，不加载成员和消息
+        member_count = select(func.count()).select_from(chat_room_members).where(
+            chat_room_members.c.room_id == DBChatRoom.id
+        ).correlate(DBChatRoom).scalar_subquery()
+        is_member = select(chat_room_members.c.user_id).where(
+            and_(
+                chat_room_members.c.room_id == DBChatRoom.id,
+                chat_room_members.c.user_id == current_user.id
+            )
+        ).correlate(DBChatRoom).exists()
+
+        query = select(DBChatRoom, member_count, is_member).where(DBChatRoom.is_active == True)
         
         # 过滤类型
         if room_type:
             query = query.where(DBChatRoom.room_type == room_type)
         
         # 只显示用户参与的聊天室或公开聊天室
-        query = query.where(
-            or_(
-                DBChatRoom.is_public == True,
-                DBChatRoom.members.any(DBUser.id == current_user.id)
-            )
-        )
+        query = query.where(or_(DBChatRoom.is_public == True, is_member))
         
         query = query.order_by(desc(DBChatRoom.last_message_at)).offset(skip).limit(limit)
         
         result = await db.execute(query)
-        rooms = result.scalars().all()
+        rows = result.all()
+
+        # 未读数从计数器读取（首次读取时整批加载该用户的计数）
+        unread_counts = await chat_unread_counter.get_counts(db, current_user.id)
+
+        # 私聊显示对方的用户名，只为本页的私聊查询一次对方用户
+        private_peers = {}
+        private_room_ids = [room.id for room, _, _ in rows if room.room_type == RoomType.private]
+        if private_room_ids:
+            peer_result = await db.execute(
+                select(chat_room_members.c.room_id, DBUser).join(
+                    DBUser, DBUser.id == chat_room_members.c.user_id
+                ).where(
+                    and_(
+                        chat_room_members.c.room_id.in_(private_room_ids),
+                        chat_room_members.c.user_id != current_user.id
+                    )
+                )
+            )
+            for peer_room_id, peer in peer_result.all():
+                private_peers.setdefault(peer_room_id, peer)
         
         # 转换为响应模型
         room_list = []
-        for room in rooms:
-            # 获取最后一条消息
-            last_message = None
-            if room.messages:
-                last_msg = max(room.messages, key=lambda x: x.created_at)
-                last_message = last_msg.content[:50] + "..." if len(last_msg.content) > 50 else last_msg.content
-            
-            # 计算未读消息数（简化版）
-            unread_count = 0  # TODO: 实现真正的未读计数
-            
+        for room, room_member_count, room_is_member in rows:
             # 对于私聊，显示对方的用户名
             display_name = room.name
             display_avatar = room.avatar
 
-            if room.room_type == RoomType.private:
-                # 获取私聊中的其他用户
-                other_user = None
-                for member in room.members:
-                    if member.id != current_user.id:
-                        other_user = member
-                        break
-
-                if other_user:
-                    display_name = other_user.nickname or other_user.username
-                    display_avatar = getattr(other_user, 'avatar', None)
-
-            # 检查用户是否是成员
-            is_member = any(member.id == current_user.id for member in room.members)
+            other_user = private_peers.get(room.id)
+            if other_user:
+                display_name = other_user.nickname or other_user.username
+                display_avatar = getattr(other_user, 'avatar', None)
 
             room_item = ChatRoomListItem(
                 id=room.id,
@@ -123,12 +128,14 @@ async def get_chat_rooms(
                 room_type=room.room_type.value if hasattr(room.room_type, 'value') else room.room_type,
                 is_public=room.is_public,
                 avatar=display_avatar,
-                member_count=len(room.members),
-                is_member=is_member,
+                member_count=room_member_count or 0,
+                is_member=bool(room_is_member),
                 created_at=room.created_at,
-                last_message=last_message,
+                last_message=room.last_message_preview,
+                last_message_id=room.last_message_id,
+                last_message_sender=room.last_message_sender_name,
                 last_message_at=room.last_message_at,
-                unread_count=unread_count,
+                unread_count=unread_counts.get(room.id, 0),
                 is_muted=False,  # TODO: 实现静音状态
                 allow_search=room.allow_search,
                 enable_invite_code=room.enable_invite_code,
@@ -385,6 +392,7 @@ async def update_chat_room(
             setattr(room, field, value)
         
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
         await db.refresh(room)
         
         logger.info(f"用户 {current_user.username} 更新聊天室: {room.name}")
@@ -455,6 +463,7 @@ async def delete_chat_room(
         # 软删除
         room.is_active = False
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
 
         logger.info(f"用户 {current_user.username} 删除聊天室: {room.name}")
 
@@ -624,31 +633,28 @@ async def get_room_messages(
     room_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    before_id: Optional[int] = Query(None, description="获取此消息之前的更早消息"),
+    after_id: Optional[int] = Query(None, description="获取此消息之后的新消息"),
     current_user: DBUser = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db),
     _: None = Depends(view_chat_rooms)
 ):
-    """获取聊天室消息"""
+    """
+    获取聊天室消息
+
+    按消息ID游标分页：不带游标时返回最新的消息，向上滚动时传入当前最早消息的ID作为 before_id，
+    断线重连补齐时传入当前最新消息的ID作为 after_id。has_more 表示该方向上是否还有消息。
+    skip 仅为兼容旧客户端保留，消息很多时应使用游标。
+    """
     try:
-        # 检查聊天室访问权限
-        room_query = select(DBChatRoom).where(DBChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
+        # 检查聊天室访问权限（成员缓存命中时不查询数据库）
+        room = await chat_membership_cache.get(db, room_id)
 
         if not room:
             raise HTTPException(status_code=404, detail="聊天室不存在")
 
         # 检查用户是否是聊天室成员
-        member_query = select(chat_room_members).where(
-            and_(
-                chat_room_members.c.room_id == room_id,
-                chat_room_members.c.user_id == current_user.id
-            )
-        )
-        member_result = await db.execute(member_query)
-        is_member = member_result.first() is not None
-
-        if not is_member:
+        if not room.is_member(current_user.id):
             if room.room_type.value == "public":
                 # 公共聊天室：自动加入
                 insert_member = chat_room_members.insert().values(
@@ -660,6 +666,7 @@ async def get_room_messages(
                 )
                 await db.execute(insert_member)
                 await db.commit()
+                chat_membership_cache.invalidate(room_id)
 
                 print(f"用户 {current_user.username} 自动加入公共聊天室 {room.name}")
             else:
@@ -677,10 +684,24 @@ async def get_room_messages(
                 DBChatMessage.room_id == room_id,
                 DBChatMessage.is_deleted == False
             )
-        ).order_by(desc(DBChatMessage.created_at)).offset(skip).limit(limit)
+        )
+        # 使用 (room_id, is_deleted, id) 索引，多取一条判断是否还有更多
+        if after_id is not None:
+            query = query.where(DBChatMessage.id > after_id).order_by(DBChatMessage.id)
+        else:
+            if before_id is not None:
+                query = query.where(DBChatMessage.id < before_id)
+            query = query.order_by(desc(DBChatMessage.id))
+            if skip:
+                query = query.offset(skip)
+        query = query.limit(limit + 1)
 
         result = await db.execute(query)
         messages = result.scalars().all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after_id is None:
+            messages.reverse()  # 按时间正序返回
 
         # 转换为响应模型
         message_list = []
@@ -748,20 +769,9 @@ async def get_room_messages(
             )
             message_list.append(message)
 
-        # 获取总数
-        count_query = select(func.count(DBChatMessage.id)).where(
-            and_(
-                DBChatMessage.room_id == room_id,
-                DBChatMessage.is_deleted == False
-            )
-        )
-        count_result = await db.execute(count_query)
-        total = count_result.scalar()
-
         return MessageList(
-            messages=list(reversed(message_list)),  # 按时间正序返回
-            total=total,
-            has_more=skip + limit < total
+            messages=message_list,
+            has_more=has_more
         )
 
     except HTTPException:
@@ -781,29 +791,17 @@ async def mark_messages_as_read(
     """标记聊天室消息为已读"""
     try:
         # 检查聊天室访问权限
-        room_query = select(DBChatRoom).where(DBChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
+        room = await chat_membership_cache.get(db, room_id)
 
         if not room:
             raise HTTPException(status_code=404, detail="聊天室不存在")
 
         # 检查用户是否是聊天室成员
-        if not room.is_public:
-            member_query = select(chat_room_members).where(
-                and_(
-                    chat_room_members.c.room_id == room_id,
-                    chat_room_members.c.user_id == current_user.id
-                )
-            )
-            member_result = await db.execute(member_query)
-            is_member = member_result.first() is not None
-
-            if not is_member:
-                raise HTTPException(status_code=403, detail="无权访问此聊天室")
+        if not room.is_public and not room.is_member(current_user.id):
+            raise HTTPException(status_code=403, detail="无权访问此聊天室")
 
-        # 这里可以添加具体的已读标记逻辑
-        # 目前只是返回成功，前端已经清除了未读计数
+        # 未读数清零并推送给用户的其他客户端
+        await chat_unread_counter.mark_read(room_id, current_user.id)
 
         return {"message": "消息已标记为已读"}
 
@@ -945,7 +943,7 @@ async def send_room_update_notification(room: DBChatRoom, last_message: DBChatMe
                 },
                 "created_at": last_message.created_at.isoformat()
             },
-            "last_message_at": room.last_message_at.isoformat()
+            "last_message_at": last_message.created_at.isoformat()
         }
 
         # 根据聊天室类型选择通知范围
@@ -966,13 +964,10 @@ async def notify_room_members(room_id: int, message_type: MessageType, data: dic
 
         async with AsyncSessionLocal() as db:
             # 获取聊天室成员
-            member_query = select(chat_room_members).where(chat_room_members.c.room_id == room_id)
-            member_result = await db.execute(member_query)
-            members = member_result.fetchall()
+            member_ids = await chat_membership_cache.get_member_ids(db, room_id)
 
-            # 通知每个成员
-            member_ids = [member.user_id for member in members]
-            await global_ws_manager.send_to_users(member_ids, message_type, data)
+        # 通知每个成员
+        await global_ws_manager.send_to_users(list(member_ids), message_type, data)
 
     except Exception as e:
         logger.error(f"通知聊天室成员失败: {e}")
@@ -1012,28 +1007,18 @@ async def send_message(
 ):
     """发送消息"""
     try:
-        # 检查聊天室权限
-        room_query = select(DBChatRoom).where(DBChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
+        # 检查聊天室权限（成员缓存命中时不查询数据库）
+        room = await chat_membership_cache.get(db, room_id)
 
         if not room:
             raise HTTPException(status_code=404, detail="聊天室不存在")
 
+        member_info = room.get_member(current_user.id)
+
         # 根据聊天室类型检查权限
         if room.room_type.value == "public":
             # 公共聊天室：检查是否是成员，如果不是则自动加入
-            member_query = select(chat_room_members).where(
-                and_(
-                    chat_room_members.c.room_id == room_id,
-                    chat_room_members.c.user_id == current_user.id
-                )
-            )
-            member_result = await db.execute(member_query)
-            is_member = member_result.first() is not None
-
-            if not is_member:
-                # 自动加入公共聊天室
+            if not member_info:
                 insert_member = chat_room_members.insert().values(
                     room_id=room_id,
                     user_id=current_user.id,
@@ -1043,42 +1028,23 @@ async def send_message(
                 )
                 await db.execute(insert_member)
                 await db.commit()
+                chat_membership_cache.invalidate(room_id)
 
                 logger.info(f"用户 {current_user.username} 自动加入公共聊天室 {room.name}")
-                is_member = True
         else:
             # 私密聊天室和私聊：需要检查成员资格
-            member_query = select(chat_room_members).where(
-                and_(
-                    chat_room_members.c.room_id == room_id,
-                    chat_room_members.c.user_id == current_user.id
-                )
-            )
-            member_result = await db.execute(member_query)
-            is_member = member_result.first() is not None
-
-            if not is_member:
+            if not member_info:
                 if room.room_type.value == "private":
                     raise HTTPException(status_code=403, detail="您不是此私聊的参与者")
                 else:
                     raise HTTPException(status_code=403, detail="您不是此私密聊天室的成员")
 
-        # 检查是否被静音（只对非公开聊天室检查）
-        if room.room_type.value != "public":
-            member_query = select(chat_room_members).where(
-                and_(
-                    chat_room_members.c.room_id == room_id,
-                    chat_room_members.c.user_id == current_user.id
-                )
-            )
-            member_result = await db.execute(member_query)
-            member_info = member_result.first()
-
-            if member_info and member_info.is_muted:
+            # 检查是否被静音（只对非公开聊天室检查）
+            if member_info.is_muted:
                 raise HTTPException(status_code=403, detail="您在此聊天室中被静音")
 
         # 创建消息
-        db_message = DBChatMessage(
+        message = DBChatMessage(
             room_id=room_id,
             sender_id=current_user.id,
             content=message_data.content,
@@ -1089,21 +1055,13 @@ async def send_message(
             file_size=message_data.file_size
         )
 
-        db.add(db_message)
+        db.add(message)
+        await db.flush()
 
-        # 更新聊天室最后消息时间
-        room.last_message_at = datetime.now()
+        # 更新聊天室最后消息摘要和时间
+        await set_room_last_message(db, message, current_user)
 
         await db.commit()
-        await db.refresh(db_message)
-
-        # 加载发送者信息
-        query = select(DBChatMessage).options(
-            selectinload(DBChatMessage.sender)
-        ).where(DBChatMessage.id == db_message.id)
-
-        result = await db.execute(query)
-        message = result.scalar_one()
 
         logger.info(f"用户 {current_user.username} 在聊天室 {room.name} 发送消息")
 
@@ -1113,6 +1071,9 @@ async def send_message(
         # 发送聊天室更新通知
         await send_room_update_notification(room, message, current_user)
 
+        # 其他成员未读数加一
+        await chat_unread_counter.on_new_message(room.id, current_user.id)
+
         return Message(
             id=message.id,
             room_id=message.room_id,
@@ -1120,10 +1081,10 @@ async def send_message(
             message_type=message.message_type.value if hasattr(message.message_type, 'value') else message.message_type,
             reply_to_id=message.reply_to_id,
             sender=UserInfo(
-                id=message.sender.id,
-                username=message.sender.username,
-                nickname=message.sender.nickname,
-                avatar=getattr(message.sender, 'avatar', None)
+                id=current_user.id,
+                username=current_user.username,
+                nickname=current_user.nickname,
+                avatar=getattr(current_user, 'avatar', None)
             ),
             file_url=message.file_url,
             file_name=message.file_name,
@@ -1295,6 +1256,7 @@ async def join_room_by_invite_code(
         )
         await db.execute(insert_member)
         await db.commit()
+        chat_membership_cache.invalidate(room.id)
 
         # 通知聊天室成员
         await notify_room_members(
@@ -1533,6 +1495,7 @@ async def process_join_request(
             raise HTTPException(status_code=400, detail="无效的操作")
 
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
 
         # 创建系统消息记录
         system_message = DBChatMessage(
@@ -1549,8 +1512,11 @@ async def process_join_request(
             }
         )
         db.add(system_message)
+        await db.flush()
+        await set_room_last_message(db, system_message, current_user)
         await db.commit()
         await db.refresh(system_message)
+        await chat_unread_counter.on_new_message(room_id, current_user.id)
 
         # 通知聊天室成员
         await notify_room_members(
@@ -1813,7 +1779,12 @@ async def kick_member(
             )
         )
         await db.execute(delete_member)
+        await db.execute(delete(chat_room_unread).where(
+            and_(chat_room_unread.c.room_id == room_id, chat_room_unread.c.user_id == user_id)
+        ))
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
+        chat_unread_counter.forget(room_id, user_id)
 
         # 通知聊天室成员
         await notify_room_members(
@@ -1930,6 +1901,7 @@ async def invite_user_to_room(
         )
         await db.execute(insert_member)
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
 
         # 通知聊天室成员
         await notify_room_members(
@@ -2044,6 +2016,7 @@ async def mute_member(
 
         await db.execute(update_member)
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
 
         # 通知聊天室成员
         action = "禁言" if is_muting else "取消禁言"
@@ -2150,6 +2123,7 @@ async def change_member_role(
 
         await db.execute(update_member)
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
 
         # 通知聊天室成员
         role_names = {"member": "普通成员", "admin": "管理员"}
@@ -2250,6 +2224,9 @@ async def leave_room(
             )
         )
         await db.execute(delete_member)
+        await db.execute(delete(chat_room_unread).where(
+            and_(chat_room_unread.c.room_id == room_id, chat_room_unread.c.user_id == current_user.id)
+        ))
 
         # 如果是创建者且没有其他成员，删除聊天室
         if room.created_by == current_user.id:
@@ -2259,11 +2236,15 @@ async def leave_room(
             await db.execute(delete(DBChatRoom).where(DBChatRoom.id == room_id))
 
             await db.commit()
+            chat_membership_cache.invalidate(room_id)
+            chat_unread_counter.forget(room_id, current_user.id)
 
             logger.info(f"用户 {current_user.username} 解散了聊天室 {room.name}")
             return {"message": f"聊天室 {room.name} 已解散"}
 
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
+        chat_unread_counter.forget(room_id, current_user.id)
 
         # 通知其他聊天室成员
         await notify_room_members(
@@ -2361,6 +2342,7 @@ async def transfer_room_ownership(
         await db.execute(update_new_owner)
 
         await db.commit()
+        chat_membership_cache.invalidate(room_id)
 
         # 通知聊天室成员
         await notify_room_members(
@@ -2422,14 +2404,8 @@ async def add_message_reaction(
             raise HTTPException(status_code=404, detail="消息不存在")
 
         # 检查用户是否有权限访问该聊天室
-        member_query = select(chat_room_members).where(
-            and_(
-                chat_room_members.c.room_id == message.room_id,
-                chat_room_members.c.user_id == current_user.id
-            )
-        )
-        member_result = await db.execute(member_query)
-        member_info = member_result.first()
+        room = await chat_membership_cache.get(db, message.room_id)
+        member_info = room.get_member(current_user.id) if room else None
 
         if not member_info:
             raise HTTPException(status_code=403, detail="您不是聊天室成员")
@@ -2503,14 +2479,8 @@ async def get_message_reactions(
             raise HTTPException(status_code=404, detail="消息不存在")
 
         # 检查用户是否有权限访问该聊天室
-        member_query = select(chat_room_members).where(
-            and_(
-                chat_room_members.c.room_id == message.room_id,
-                chat_room_members.c.user_id == current_user.id
-            )
-        )
-        member_result = await db.execute(member_query)
-        member_info = member_result.first()
+        room = await chat_membership_cache.get(db, message.room_id)
+        member_info = room.get_member(current_user.id) if room else None
 
         if not member_info:
             raise HTTPException(status_code=403, detail="您不是聊天室成员")
@@ -2601,6 +2571,8 @@ async def update_message(
         message.is_edited = True
         message.edit_count = (message.edit_count or 0) + 1
         message.updated_at = datetime.utcnow()
+        await db.flush()
+        await refresh_room_last_message(db, room_id, message_id)
 
         await db.commit()
         await db.refresh(message)
@@ -2680,6 +2652,8 @@ async def delete_message(
         message.is_deleted = True
         message.content = "[此消息已被删除]"
         message.updated_at = datetime.now(timezone.utc)
+        await db.flush()
+        await refresh_room_last_message(db, room_id, message_id)
 
         await db.commit()
 
@@ -2724,16 +2698,8 @@ async def get_room_statistics(
             raise HTTPException(status_code=404, detail="聊天室不存在")
 
         # 检查用户是否有权限查看
-        member_query = select(chat_room_members).where(
-            and_(
-                chat_room_members.c.room_id == room_id,
-                chat_room_members.c.user_id == current_user.id
-            )
-        )
-        member_result = await db.execute(member_query)
-        user_member = member_result.first()
-
-        if not user_member and room.room_type != RoomType.public:
+        membership = await chat_membership_cache.get(db, room_id)
+        if not membership.is_member(current_user.id) and room.room_type != RoomType.public:
             raise HTTPException(status_code=403, detail="您不是聊天室成员")
 
         # 获取统计信息
@@ -2846,27 +2812,16 @@ async def pin_message(
     """置顶消息"""
     try:
         # 检查聊天室是否存在
-        room_query = select(DBChatRoom).where(DBChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
+        room = await chat_membership_cache.get(db, room_id)
 
         if not room:
             raise HTTPException(status_code=404, detail="聊天室不存在")
 
         # 检查用户权限
-        member_query = select(chat_room_members).where(
-            and_(
-                chat_room_members.c.room_id == room_id,
-                chat_room_members.c.user_id == current_user.id
-            )
-        )
-        member_result = await db.execute(member_query)
-        member_info = member_result.first()
-
-        if not member_info:
+        if not room.is_member(current_user.id):
             raise HTTPException(status_code=403, detail="您不是聊天室成员")
 
-        if member_info.role not in ["admin", "creator"] and room.created_by != current_user.id:
+        if not room.is_admin(current_user.id):
             raise HTTPException(status_code=403, detail="只有管理员可以置顶消息")
 
         # 检查消息是否存在
@@ -2925,27 +2880,16 @@ async def unpin_message(
     """取消置顶消息"""
     try:
         # 检查聊天室是否存在
-        room_query = select(DBChatRoom).where(DBChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
+        room = await chat_membership_cache.get(db, room_id)
 
         if not room:
             raise HTTPException(status_code=404, detail="聊天室不存在")
 
         # 检查用户权限
-        member_query = select(chat_room_members).where(
-            and_(
-                chat_room_members.c.room_id == room_id,
-                chat_room_members.c.user_id == current_user.id
-            )
-        )
-        member_result = await db.execute(member_query)
-        member_info = member_result.first()
-
-        if not member_info:
+        if not room.is_member(current_user.id):
             raise HTTPException(status_code=403, detail="您不是聊天室成员")
 
-        if member_info.role not in ["admin", "creator"] and room.created_by != current_user.id:
+        if not room.is_admin(current_user.id):
             raise HTTPException(status_code=403, detail="只有管理员可以取消置顶消息")
 
         # 检查消息是否存在
@@ -3002,24 +2946,13 @@ async def get_pinned_messages(
     """获取聊天室置顶消息列表"""
     try:
         # 检查聊天室是否存在
-        room_query = select(DBChatRoom).where(DBChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
+        room = await chat_membership_cache.get(db, room_id)
 
         if not room:
             raise HTTPException(status_code=404, detail="聊天室不存在")
 
         # 检查用户是否有权限查看
-        member_query = select(chat_room_members).where(
-            and_(
-                chat_room_members.c.room_id == room_id,
-                chat_room_members.c.user_id == current_user.id
-            )
-        )
-        member_result = await db.execute(member_query)
-        user_member = member_result.first()
-
-        if not user_member and room.room_type != RoomType.public:
+        if not room.is_member(current_user.id) and room.room_type != RoomType.public:
             raise HTTPException(status_code=403, detail="您不是聊天室成员")
 
         # 获取置顶消息
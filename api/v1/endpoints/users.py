@@ -171,6 +171,7 @@ async def delete_user(
         .values(is_active=False)
     )
     await db.commit()
+    auth.invalidate_user_cache(user_id)
 
     return {"message": "用户删除成功"}
 
@@ -206,6 +207,7 @@ async def toggle_user_superuser(
         .values(is_superuser=is_superuser)
     )
     await db.commit()
+    auth.invalidate_user_cache(user_id)
 
     action = "设置为" if is_superuser else "取消"
     return {"message": f"已{action}超级管理员"}
@@ -67,6 +67,16 @@ class Settings(BaseSettings):
     SQLALCHEMY_DATABASE_URI: Optional[str] = _config_data.get("SQLALCHEMY_DATABASE_URI") or os.getenv("DATABASE_URL", "sqlite+aiosqlite:///database.sqlite")
     SYNC_SQLALCHEMY_DATABASE_URI: Optional[str] = _config_data.get("SYNC_SQLALCHEMY_DATABASE_URI") or os.getenv("DATABASE_URL", "sqlite:///database.sqlite")
 
+    # 数据库连接池配置 - 从配置文件读取
+    DB_POOL_SIZE: int = _config_data.get("DB_POOL_SIZE", 5)
+    DB_MAX_OVERFLOW: int = _config_data.get("DB_MAX_OVERFLOW", 10)
+    DB_POOL_TIMEOUT: int = _config_data.get("DB_POOL_TIMEOUT", 30)
+    DB_POOL_RECYCLE: int = _config_data.get("DB_POOL_RECYCLE", 1800)
+    DB_POOL_PRE_PING: bool = _config_data.get("DB_POOL_PRE_PING", True)
+    DB_ECHO: bool = _config_data.get("DB_ECHO", False)
+    SQLITE_WAL: bool = _config_data.get("SQLITE_WAL", True)
+    SQLITE_SYNCHRONOUS: str = _config_data.get("SQLITE_SYNCHRONOUS", "NORMAL")
+
     # JWT配置 - 从配置文件读取
     SECRET_KEY: str = _config_data.get("SECRET_KEY", secrets.token_urlsafe(32))
     ALGORITHM: str = _config_data.get("ALGORITHM", "HS256")
@@ -107,6 +117,24 @@ class Settings(BaseSettings):
     EXTENSIONS_DIR: str = _config_data.get("EXTENSIONS_DIR", "data/extensions")
     EXTENSIONS_ENTRY_POINT_PREFIX: str = _config_data.get("EXTENSIONS_ENTRY_POINT_PREFIX", "/query/")
     ALLOW_EXTENSION_UPLOAD: bool = _config_data.get("ALLOW_EXTENSION_UPLOAD", True)
+    EXTENSION_LAZY_LOAD: bool = _config_data.get("EXTENSION_LAZY_LOAD", False)
+    EXTENSION_HOT_RELOAD: bool = _config_data.get("EXTENSION_HOT_RELOAD", False)
+    EXTENSION_WATCH_INTERVAL: float = _config_data.get("EXTENSION_WATCH_INTERVAL", 2.0)
+    EXTENSION_THREAD_WORKERS: int = _config_data.get("EXTENSION_THREAD_WORKERS", 8)
+    EXTENSION_PROCESS_WORKERS: int = _config_data.get("EXTENSION_PROCESS_WORKERS", 2)
+    EXTENSION_MAX_CONCURRENCY: int = _config_data.get("EXTENSION_MAX_CONCURRENCY", 4)
+    EXTENSION_TIMEOUT: int = _config_data.get("EXTENSION_TIMEOUT", 120)
+    EXTENSION_WORKER_MAX_CALLS: int = _config_data.get("EXTENSION_WORKER_MAX_CALLS", 500)
+    EXTENSION_WORKER_MAX_RSS_MB: int = _config_data.get("EXTENSION_WORKER_MAX_RSS_MB", 512)
+    EXTENSION_CACHE_MAX_ENTRIES: int = _config_data.get("EXTENSION_CACHE_MAX_ENTRIES", 256)
+    EXTENSION_UPLOAD_BYTES_LIMIT_MB: int = _config_data.get("EXTENSION_UPLOAD_BYTES_LIMIT_MB", 50)
+    EXTENSION_JOB_MAX_PER_USER: int = _config_data.get("EXTENSION_JOB_MAX_PER_USER", 2)
+    EXTENSION_JOB_TIMEOUT: int = _config_data.get("EXTENSION_JOB_TIMEOUT", 3600)
+    EXTENSION_JOB_RESULT_TTL: int = _config_data.get("EXTENSION_JOB_RESULT_TTL", 86400)
+
+    @property
+    def EXTENSION_JOB_DIR(self) -> str:
+        return os.path.join(self.DATA_DIR, "extension_jobs")
 
     # 动态计算的目录路径
     @property
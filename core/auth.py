@@ -1,8 +1,11 @@
 """
 认证模块，提供用户认证和权限管理功能
 """
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, FrozenSet, Union
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -13,7 +16,7 @@ from sqlalchemy import select
 
 from config import settings
 from core.logger import auth_logger
-from db.session import get_db
+from db.session import get_db, AsyncSessionLocal
 from models.user import User, Permission, PermissionGroup
 from schemas.user import UserCreate
 
@@ -41,6 +44,138 @@ class PermissionDeniedError(AuthError):
     """权限不足"""
     pass
 
+# 认证用户缓存：存活时间(秒)和最大条目数
+PRINCIPAL_CACHE_TTL = 60
+PRINCIPAL_CACHE_SIZE = 1024
+
+
+class Principal:
+    """缓存的认证主体：用户（含角色、权限）及展开后的权限集合"""
+
+    __slots__ = ("user", "permissions", "version", "expires_at")
+
+    def __init__(self, user: User, permissions: FrozenSet[str], version: int, expires_at: float):
+        self.user = user
+        self.permissions = permissions
+        self.version = version
+        self.expires_at = expires_at
+
+
+class PrincipalCache:
+    """认证用户缓存（TTL + LRU）
+
+    以令牌主题(用户名)为键，条目记录用户ID和写入时的版本号；
+    用户、角色、权限被修改时递增版本号使相关条目失效，
+    加载过程中发生失效的结果不会写入缓存，避免旧数据回填。
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Principal]" = OrderedDict()
+        self._user_versions: Dict[int, int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        """全局版本号，加载用户前读取，写入时用于判断期间是否发生过失效"""
+        return self._generation
+
+    def get(self, subject: str) -> Optional[Principal]:
+        with self._lock:
+            principal = self._entries.get(subject)
+            if principal is None:
+                self.misses += 1
+                return None
+            if (principal.expires_at <= time.monotonic()
+                    or principal.version != self._user_versions.get(principal.user.id, 0)):
+                del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return principal
+
+    def put(self, subject: str, user: User, permissions: FrozenSet[str], generation: int) -> Principal:
+        with self._lock:
+            principal = Principal(
+                user, permissions,
+                self._user_versions.get(user.id, 0),
+                time.monotonic() + self.ttl
+            )
+            if generation != self._generation:
+                # 加载期间有失效发生，结果可能已过时
+                return principal
+            self._entries[subject] = principal
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return principal
+
+    def invalidate_user(self, user_id: int) -> None:
+        """使指定用户的缓存失效"""
+        with self._lock:
+            self._generation += 1
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+            for subject in [k for k, v in self._entries.items() if v.user.id == user_id]:
+                del self._entries[subject]
+
+    def clear(self) -> None:
+        """清空缓存（角色或权限变更影响多个用户时使用）"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_user_cache(user_id: int) -> None:
+    """用户信息、状态或角色变更后调用"""
+    principal_cache.invalidate_user(user_id)
+
+
+def invalidate_permission_cache() -> None:
+    """角色或权限定义变更后调用"""
+    principal_cache.clear()
+
+
+def _collect_permissions(user: User) -> FrozenSet[str]:
+    """展开用户角色上的权限代码"""
+    if user.is_superuser:
+        return frozenset(["*"])
+    return frozenset(
+        permission.code
+        for role in user.roles
+        for permission in role.permissions
+    )
+
+
+async def _load_principal(subject: str) -> Optional[Principal]:
+    """从数据库加载认证主体（使用独立会话，加载后的对象与会话分离供缓存复用）"""
+    generation = principal_cache.generation
+    async with AsyncSessionLocal() as session:
+        user = await get_user_by_username(session, username=subject)
+        if user is None:
+            return None
+        permissions = _collect_permissions(user)
+    return principal_cache.put(subject, user, permissions, generation)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -97,13 +232,18 @@ async def get_current_user(
         if subject is None:
             raise credentials_exception
         
-        # 尝试将subject解析为用户ID
-        user = await get_user_by_username(db, username=subject)
-        if user is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
+
+    principal = principal_cache.get(subject)
+    if principal is None:
+        principal = await _load_principal(subject)
+        if principal is None:
+            raise credentials_exception
+
+    # 合并到当前请求的会话，得到独立副本，不产生查询
+    user = await db.merge(principal.user, load=False)
+    user._principal_permissions = principal.permissions
     return user
 
 async def get_current_active_user(
@@ -157,7 +297,7 @@ class PermissionChecker:
             return user
 
         # 获取用户的所有权限
-        user_permissions = get_user_permissions(user)
+        user_permissions = get_user_permission_set(user)
 
         # 如果是超级用户，直接通过
         if "*" in user_permissions:
@@ -187,7 +327,7 @@ def require_any_permission(*permissions: str):
                 return user
 
             # 获取用户的所有权限
-            user_permissions = get_user_permissions(user)
+            user_permissions = get_user_permission_set(user)
 
             # 如果是超级用户，直接通过
             if "*" in user_permissions:
@@ -208,24 +348,22 @@ def require_any_permission(*permissions: str):
 
 def get_user_permissions(user: User) -> List[str]:
     """获取用户的所有权限代码列表"""
-    if user.is_superuser:
-        # 超级用户拥有所有权限，这里返回一个特殊标识
-        return ["*"]  # 特殊标识，表示拥有所有权限
-
-    permissions = set()
-    for role in user.roles:
-        for permission in role.permissions:
-            permissions.add(permission.code)
+    return list(get_user_permission_set(user))
 
-    return list(permissions)
+def get_user_permission_set(user: User) -> FrozenSet[str]:
+    """获取用户的权限代码集合，优先使用认证时缓存的结果"""
+    permissions = getattr(user, "_principal_permissions", None)
+    if permissions is not None:
+        return permissions
+    # 超级用户返回特殊标识 "*"，表示拥有所有权限
+    return _collect_permissions(user)
 
 def has_permission(user: User, permission: str) -> bool:
     """检查用户是否具有指定权限"""
     if user.is_superuser:
         return True
 
-    user_permissions = get_user_permissions(user)
-    return permission in user_permissions
+    return permission in get_user_permission_set(user)
 
 def has_role(user: User, role: str) -> bool:
     """检查用户是否具有指定角色"""
@@ -345,6 +483,7 @@ async def update_user(db: AsyncSession, db_obj: User, obj_in: UserCreate) -> Use
     # user.password = get_password_hash(obj_in.password)
     db.add(user)
     await db.commit()
+    invalidate_user_cache(user.id)
     await db.refresh(user)
 
     logger.info(f"用户更新完成，最终头像: {user.avatar}")
@@ -355,6 +494,7 @@ async def update_password(db: AsyncSession, db_obj: User, new_password: str) ->
     user.hashed_password = get_password_hash(new_password)
     db.add(user)
     await db.commit()
+    invalidate_user_cache(user.id)
     return user
 async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[User]:
     """获取用户列表"""
@@ -363,8 +503,10 @@ async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[U
 
 async def delete_user(db: AsyncSession, user: User) -> None:
     """删除用户"""
+    user_id = user.id
     await db.delete(user)
     await db.commit()
+    invalidate_user_cache(user_id)
 
 
 # 通常在数据库迁移脚本或应用启动时执行
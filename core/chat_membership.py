@@ -0,0 +1,122 @@
+"""
+聊天室成员缓存
+
+发送消息、读取消息、表情回应、置顶等高频接口都要检查聊天室类型和当前用户的成员身份、角色、禁言状态。
+缓存中每个聊天室保存一份 RoomMembership（聊天室基本信息 + 成员 -> 角色/禁言），
+未命中时用一次查询（聊天室 LEFT JOIN 成员表）加载，命中时不访问数据库。
+加入、踢出、禁言、角色变更、转让群主、退出、修改或删除聊天室后必须调用 invalidate(room_id)。
+缓存只在当前进程内有效，与全局WebSocket管理器一样按单进程部署设计。
+"""
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.logger import get_logger
+from models.chat import ChatRoom, RoomType, chat_room_members
+
+logger = get_logger("chat_membership")
+
+# 最多缓存的聊天室数量（按最近使用淘汰）
+MAX_CACHED_ROOMS = 1024
+
+
+class MemberInfo(NamedTuple):
+    """聊天室成员信息"""
+    role: str
+    is_muted: bool
+
+
+class RoomMembership:
+    """聊天室基本信息和成员（属性名与 ChatRoom 一致，可直接用于通知函数）"""
+
+    def __init__(self, room_id: int, name: str, room_type: RoomType, is_public: bool,
+                 is_active: bool, created_by: int, members: Dict[int, MemberInfo]):
+        self.id = room_id
+        self.name = name
+        self.room_type = room_type
+        self.is_public = is_public
+        self.is_active = is_active
+        self.created_by = created_by
+        self.members = members
+
+    @property
+    def member_ids(self) -> Set[int]:
+        return set(self.members)
+
+    def is_member(self, user_id: int) -> bool:
+        return user_id in self.members
+
+    def get_member(self, user_id: int) -> Optional[MemberInfo]:
+        return self.members.get(user_id)
+
+    def is_admin(self, user_id: int) -> bool:
+        """是否为管理员（管理员、群主角色或创建者）"""
+        member = self.members.get(user_id)
+        return self.created_by == user_id or (member is not None and member.role in ("admin", "creator"))
+
+
+class ChatMembershipCache:
+    """聊天室成员缓存"""
+
+    def __init__(self, max_rooms: int = MAX_CACHED_ROOMS):
+        self._rooms: "OrderedDict[int, RoomMembership]" = OrderedDict()
+        self._max_rooms = max_rooms
+        # 聊天室ID -> 失效次数，用于判断加载期间是否发生变更
+        self._versions: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, db: AsyncSession, room_id: int) -> Optional[RoomMembership]:
+        """获取聊天室成员信息，聊天室不存在时返回None"""
+        membership = self._rooms.get(room_id)
+        if membership is not None:
+            self._rooms.move_to_end(room_id)
+            self.hits += 1
+            return membership
+
+        self.misses += 1
+        version = self._versions.get(room_id, 0)
+        result = await db.execute(
+            select(
+                ChatRoom.name, ChatRoom.room_type, ChatRoom.is_public, ChatRoom.is_active, ChatRoom.created_by,
+                chat_room_members.c.user_id, chat_room_members.c.role, chat_room_members.c.is_muted
+            ).outerjoin(
+                chat_room_members, chat_room_members.c.room_id == ChatRoom.id
+            ).where(ChatRoom.id == room_id)
+        )
+        rows = result.all()
+        if not rows:
+            return None
+
+        first = rows[0]
+        members = {
+            row.user_id: MemberInfo(row.role or "member", bool(row.is_muted))
+            for row in rows if row.user_id is not None
+        }
+        membership = RoomMembership(
+            room_id, first.name, first.room_type, first.is_public, first.is_active, first.created_by, members
+        )
+        # 加载期间聊天室被修改时不缓存，下次重新加载
+        if version == self._versions.get(room_id, 0):
+            self._rooms[room_id] = membership
+            if len(self._rooms) > self._max_rooms:
+                self._rooms.popitem(last=False)
+        return membership
+
+    async def get_member_ids(self, db: AsyncSession, room_id: int) -> Set[int]:
+        """获取聊天室成员ID"""
+        membership = await self.get(db, room_id)
+        return membership.member_ids if membership else set()
+
+    def invalidate(self, room_id: int) -> None:
+        """聊天室信息或成员变化后清除缓存"""
+        self._versions[room_id] = self._versions.get(room_id, 0) + 1
+        self._rooms.pop(room_id, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"rooms": len(self._rooms), "hits": self.hits, "misses": self.misses}
+
+
+chat_membership_cache = ChatMembershipCache()
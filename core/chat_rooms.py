@@ -0,0 +1,70 @@
+"""
+聊天室最后消息摘要
+
+聊天室列表直接读取 chat_rooms 表上冗余保存的最后一条消息（ID、预览、发送者、时间），
+不再为每个聊天室查询消息表。发送消息（包括系统消息）后调用 set_room_last_message，
+修改或删除消息后调用 refresh_room_last_message。
+"""
+from typing import Optional
+
+from sqlalchemy import select, update, and_, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.chat import ChatRoom as DBChatRoom, ChatMessage as DBChatMessage
+from models.user import User as DBUser
+
+
+def message_preview(content: Optional[str]) -> Optional[str]:
+    """消息预览，超过50个字符截断"""
+    if content is None:
+        return None
+    return content[:50] + "..." if len(content) > 50 else content
+
+
+async def set_room_last_message(db: AsyncSession, message: DBChatMessage, sender: DBUser):
+    """新消息发送后更新聊天室的最后消息摘要（消息需已flush获得ID），不需要先加载聊天室"""
+    await db.execute(
+        update(DBChatRoom).where(DBChatRoom.id == message.room_id).values(
+            last_message_id=message.id,
+            last_message_preview=message_preview(message.content),
+            last_message_sender_id=sender.id,
+            last_message_sender_name=sender.nickname or sender.username,
+            last_message_at=message.created_at
+        )
+    )
+
+
+async def refresh_room_last_message(db: AsyncSession, room_id: int, message_id: int):
+    """
+    消息被修改或删除后，如果它是聊天室的最后一条消息，重新计算摘要
+
+    修改时更新预览；删除时取最近一条未删除的消息，没有则清空摘要（最后消息时间保持不变，不影响列表排序）
+    """
+    last_message_id = (await db.execute(
+        select(DBChatRoom.last_message_id).where(DBChatRoom.id == room_id)
+    )).scalar_one_or_none()
+    if last_message_id != message_id:
+        return
+
+    latest = (await db.execute(
+        select(DBChatMessage.id, DBChatMessage.content, DBChatMessage.sender_id, DBUser.nickname, DBUser.username)
+        .join(DBUser, DBUser.id == DBChatMessage.sender_id)
+        .where(and_(DBChatMessage.room_id == room_id, DBChatMessage.is_deleted == False))
+        .order_by(desc(DBChatMessage.id))
+        .limit(1)
+    )).first()
+
+    values = {
+        "last_message_id": None,
+        "last_message_preview": None,
+        "last_message_sender_id": None,
+        "last_message_sender_name": None,
+    }
+    if latest:
+        values = {
+            "last_message_id": latest.id,
+            "last_message_preview": message_preview(latest.content),
+            "last_message_sender_id": latest.sender_id,
+            "last_message_sender_name": latest.nickname or latest.username,
+        }
+    await db.execute(update(DBChatRoom).where(DBChatRoom.id == room_id).values(**values))
@@ -0,0 +1,162 @@
+"""
+聊天室未读消息计数
+
+每个 (聊天室, 用户) 的未读数保存在 chat_room_unread 表中，并在内存中缓存：
+- 发送消息后为聊天室其他成员的未读数加一（一条 UPDATE，首次计数的成员补插一行）
+- 标记已读时清零，同时更新成员表的 last_read_at
+- 用户的全部计数在首次读取时整批加载，之后直接从内存返回
+计数变化通过全局WebSocket（unread_count_updated）推送给在线成员，客户端无需重新拉取消息；
+推送在后台并发进行，发送消息的请求不等待推送完成。
+内存缓存只在当前进程内有效，与全局WebSocket管理器一样按单进程部署设计。
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Set
+
+from sqlalchemy import select, update, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.chat_membership import chat_membership_cache
+from core.global_websocket_manager import global_ws_manager, MessageType
+from core.logger import get_logger
+from db.session import AsyncSessionLocal
+from models.chat import chat_room_members, chat_room_unread
+
+logger = get_logger("chat_unread")
+
+
+class ChatUnreadCounter:
+    """聊天室未读计数器"""
+
+    def __init__(self):
+        # 用户ID -> {聊天室ID: 未读数}，只保存已加载的用户
+        self._counts: Dict[int, Dict[int, int]] = {}
+        # 每次写入加一，用于判断加载期间计数是否发生变化
+        self._version = 0
+        self._push_tasks: Set[asyncio.Task] = set()
+
+    async def get_counts(self, db: AsyncSession, user_id: int) -> Dict[int, int]:
+        """获取用户在各聊天室的未读数（聊天室ID -> 未读数，没有记录的聊天室为0）"""
+        counts = self._counts.get(user_id)
+        if counts is not None:
+            return counts
+
+        version = self._version
+        result = await db.execute(
+            select(chat_room_unread.c.room_id, chat_room_unread.c.unread_count).where(
+                and_(chat_room_unread.c.user_id == user_id, chat_room_unread.c.unread_count > 0)
+            )
+        )
+        counts = {room_id: count for room_id, count in result.all()}
+        # 加载期间有写入时不缓存，下次重新加载
+        if version == self._version:
+            self._counts[user_id] = counts
+        return counts
+
+    async def on_new_message(self, room_id: int, sender_id: int) -> None:
+        """新消息已提交后调用：其他成员未读数加一并推送"""
+        try:
+            for attempt in range(2):
+                try:
+                    counts = await self._increment(room_id, sender_id)
+                    break
+                except IntegrityError:
+                    # 并发发送时补插的行已被其他请求插入，重试一次即可走 UPDATE
+                    if attempt:
+                        raise
+            self._store(room_id, counts)
+            self._schedule_push(room_id, counts)
+        except Exception as e:
+            logger.error(f"更新聊天室 {room_id} 未读计数失败: {e}")
+
+    async def _increment(self, room_id: int, sender_id: int) -> Dict[int, int]:
+        async with AsyncSessionLocal() as db:
+            member_ids = list(await chat_membership_cache.get_member_ids(db, room_id) - {sender_id})
+            if not member_ids:
+                return {}
+
+            await db.execute(
+                update(chat_room_unread).where(
+                    and_(chat_room_unread.c.room_id == room_id, chat_room_unread.c.user_id.in_(member_ids))
+                ).values(unread_count=chat_room_unread.c.unread_count + 1)
+            )
+            result = await db.execute(
+                select(chat_room_unread.c.user_id, chat_room_unread.c.unread_count).where(
+                    and_(chat_room_unread.c.room_id == room_id, chat_room_unread.c.user_id.in_(member_ids))
+                )
+            )
+            counts = {user_id: count for user_id, count in result.all()}
+
+            missing = [user_id for user_id in member_ids if user_id not in counts]
+            if missing:
+                await db.execute(
+                    chat_room_unread.insert(),
+                    [{"room_id": room_id, "user_id": user_id, "unread_count": 1} for user_id in missing]
+                )
+                counts.update({user_id: 1 for user_id in missing})
+            await db.commit()
+            return counts
+
+    async def mark_read(self, room_id: int, user_id: int) -> None:
+        """用户已读聊天室：未读数清零，更新 last_read_at 并推送"""
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(chat_room_unread).where(
+                        and_(chat_room_unread.c.room_id == room_id, chat_room_unread.c.user_id == user_id)
+                    ).values(unread_count=0)
+                )
+                await db.execute(
+                    update(chat_room_members).where(
+                        and_(chat_room_members.c.room_id == room_id, chat_room_members.c.user_id == user_id)
+                    ).values(last_read_at=datetime.now())
+                )
+                await db.commit()
+            self._store(room_id, {user_id: 0})
+            # 同一用户的其他客户端同步清除角标
+            self._schedule_push(room_id, {user_id: 0})
+        except Exception as e:
+            logger.error(f"清除用户 {user_id} 在聊天室 {room_id} 的未读计数失败: {e}")
+
+    def forget(self, room_id: int, user_id: int) -> None:
+        """成员离开聊天室后移除内存中的计数（数据库记录由调用方在同一事务中删除）"""
+        self._version += 1
+        counts = self._counts.get(user_id)
+        if counts is not None:
+            counts.pop(room_id, None)
+
+    def _store(self, room_id: int, counts: Dict[int, int]) -> None:
+        """将数据库中的最新计数写入已加载用户的缓存"""
+        self._version += 1
+        for user_id, count in counts.items():
+            user_counts = self._counts.get(user_id)
+            if user_counts is None:
+                continue
+            if count:
+                user_counts[room_id] = count
+            else:
+                user_counts.pop(room_id, None)
+
+    def _schedule_push(self, room_id: int, counts: Dict[int, int]) -> None:
+        """在后台推送计数，不阻塞调用方"""
+        if not any(global_ws_manager.is_user_online(user_id) for user_id in counts):
+            return
+        task = asyncio.create_task(self._push(room_id, counts))
+        self._push_tasks.add(task)
+        task.add_done_callback(self._push_tasks.discard)
+
+    async def _push(self, room_id: int, counts: Dict[int, int]) -> None:
+        """并发推送给在线成员（每个用户的计数不同，逐个用户发送）"""
+        await asyncio.gather(*(
+            global_ws_manager.send_to_user(
+                user_id,
+                MessageType.UNREAD_COUNT_UPDATED,
+                {"room_id": room_id, "unread_count": count}
+            )
+            for user_id, count in counts.items()
+            if global_ws_manager.is_user_online(user_id)
+        ))
+
+
+chat_unread_counter = ChatUnreadCounter()
@@ -4,8 +4,11 @@
 """
 
 import os
+import copy
 import json
 import base64
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, Any, Optional
@@ -17,6 +20,9 @@ from core.logger import get_logger
 
 logger = get_logger("config")
 
+# 配置文件mtime检查的最小间隔（秒），避免每个请求都stat文件
+CONFIG_MTIME_CHECK_INTERVAL = 1.0
+
 class ConfigManager:
     """配置管理器"""
     
@@ -26,7 +32,16 @@ class ConfigManager:
         self.key_file = self.config_dir / ".key"
         self._ensure_config_dir()
         self._cipher = None
-        
+
+        # 解密后配置的内存缓存，按文件mtime失效
+        self._cache_lock = threading.RLock()
+        self._cached_config: Optional[Dict[str, Any]] = None
+        self._cached_mtime_ns: Optional[int] = None
+        self._cached_expiry_ts: Optional[float] = None
+        self._last_mtime_check = 0.0
+        self._cache_hits = 0
+        self._cache_misses = 0
+
     def _get_config_dir(self) -> Path:
         """获取配置目录"""
         home = Path.home()
@@ -88,6 +103,16 @@ class ConfigManager:
             "SQLALCHEMY_DATABASE_URI": "sqlite+aiosqlite:///database.sqlite",
             "SYNC_SQLALCHEMY_DATABASE_URI": "sqlite:///database.sqlite",
 
+            # 数据库连接池配置
+            "DB_POOL_SIZE": 5,
+            "DB_MAX_OVERFLOW": 10,
+            "DB_POOL_TIMEOUT": 30,
+            "DB_POOL_RECYCLE": 1800,
+            "DB_POOL_PRE_PING": True,
+            "DB_ECHO": False,
+            "SQLITE_WAL": True,
+            "SQLITE_SYNCHRONOUS": "NORMAL",
+
             # 文件配置
             "UPLOAD_DIR": "data/uploads",
             "MAX_FILE_SIZE": 100 * 1024 * 1024,  # 100MB
@@ -107,6 +132,20 @@ class ConfigManager:
             "EXTENSIONS_DIR": "data/extensions",
             "EXTENSIONS_ENTRY_POINT_PREFIX": "/query/",
             "ALLOW_EXTENSION_UPLOAD": True,
+            "EXTENSION_LAZY_LOAD": False,
+            "EXTENSION_HOT_RELOAD": False,
+            "EXTENSION_WATCH_INTERVAL": 2.0,
+            "EXTENSION_THREAD_WORKERS": 8,
+            "EXTENSION_PROCESS_WORKERS": 2,
+            "EXTENSION_MAX_CONCURRENCY": 4,
+            "EXTENSION_TIMEOUT": 120,
+            "EXTENSION_WORKER_MAX_CALLS": 500,
+            "EXTENSION_WORKER_MAX_RSS_MB": 512,
+            "EXTENSION_CACHE_MAX_ENTRIES": 256,
+            "EXTENSION_UPLOAD_BYTES_LIMIT_MB": 50,
+            "EXTENSION_JOB_MAX_PER_USER": 2,
+            "EXTENSION_JOB_TIMEOUT": 3600,
+            "EXTENSION_JOB_RESULT_TTL": 86400,
 
             # 用户配置
             "ALLOW_REGISTER": True,
@@ -152,8 +191,58 @@ class ConfigManager:
 
         return default_config
     
-    def load_config(self) -> Dict[str, Any]:
-        """加载配置"""
+    def _get_config_mtime_ns(self) -> Optional[int]:
+        """获取配置文件的修改时间，文件不存在时返回None"""
+        try:
+            return self.config_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _parse_expiry_ts(config: Dict[str, Any]) -> Optional[float]:
+        """预先解析过期时间戳，解析失败返回None（视为已过期）"""
+        expiry_date_str = config.get("EXPIRY_DATE")
+        if not expiry_date_str:
+            return None
+        try:
+            return datetime.fromisoformat(expiry_date_str).timestamp()
+        except (TypeError, ValueError) as e:
+            logger.error(f"解析过期时间失败: {e}")
+            return None
+
+    def _set_cache(self, config: Dict[str, Any], mtime_ns: Optional[int]):
+        """写入配置缓存（调用方需持有锁）"""
+        self._cached_config = config
+        self._cached_mtime_ns = mtime_ns
+        self._cached_expiry_ts = self._parse_expiry_ts(config)
+        self._last_mtime_check = time.monotonic()
+
+    def invalidate_cache(self):
+        """使配置缓存失效，下次读取时重新解密配置文件"""
+        with self._cache_lock:
+            self._cached_config = None
+            self._cached_mtime_ns = None
+            self._cached_expiry_ts = None
+            self._last_mtime_check = 0.0
+
+    def _get_cached_config(self) -> Dict[str, Any]:
+        """获取缓存的配置，文件被外部修改时自动重新加载"""
+        with self._cache_lock:
+            if self._cached_config is not None:
+                now = time.monotonic()
+                if now - self._last_mtime_check < CONFIG_MTIME_CHECK_INTERVAL:
+                    self._cache_hits += 1
+                    return self._cached_config
+                self._last_mtime_check = now
+                if self._get_config_mtime_ns() == self._cached_mtime_ns:
+                    self._cache_hits += 1
+                    return self._cached_config
+
+            self._cache_misses += 1
+            return self._read_config_file()
+
+    def _read_config_file(self) -> Dict[str, Any]:
+        """从磁盘读取并解密配置（调用方需持有锁）"""
         try:
             if not self.config_file.exists():
                 # 首次运行，创建默认配置
@@ -161,20 +250,39 @@ class ConfigManager:
                 self.save_config(default_config)
                 logger.info("创建默认配置文件")
                 return default_config
-            
+
+            # 先取mtime再读文件，读取期间被改写时下次检查会重新加载
+            mtime_ns = self._get_config_mtime_ns()
+
             # 读取加密配置
             encrypted_data = self.config_file.read_bytes()
             cipher = self._get_cipher()
             decrypted_data = cipher.decrypt(encrypted_data)
             config = json.loads(decrypted_data.decode('utf-8'))
-            
+
+            self._set_cache(config, mtime_ns)
             # logger.info("成功加载配置文件")
             return config
-            
+
         except Exception as e:
             logger.error(f"加载配置失败: {e}")
-            # 返回默认配置
+            # 返回默认配置（不缓存，下次继续尝试读取文件）
             return self._get_default_config()
+
+    def load_config(self) -> Dict[str, Any]:
+        """加载配置（返回副本，调用方可自由修改）"""
+        return copy.deepcopy(self._get_cached_config())
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取配置缓存命中统计"""
+        with self._cache_lock:
+            total = self._cache_hits + self._cache_misses
+            return {
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "hit_rate": round(self._cache_hits / total, 4) if total else 0.0,
+                "cached": self._cached_config is not None,
+            }
     
     def save_config(self, config: Dict[str, Any]) -> bool:
         """保存配置"""
@@ -191,11 +299,15 @@ class ConfigManager:
             config_json = json.dumps(config, indent=2, ensure_ascii=False)
             encrypted_data = cipher.encrypt(config_json.encode('utf-8'))
             
-            self.config_file.write_bytes(encrypted_data)
-            
-            # 设置文件权限
-            if os.name != 'nt':  # 非Windows系统
-                os.chmod(self.config_file, 0o600)
+            with self._cache_lock:
+                self.config_file.write_bytes(encrypted_data)
+
+                # 设置文件权限
+                if os.name != 'nt':  # 非Windows系统
+                    os.chmod(self.config_file, 0o600)
+
+                # 直接刷新缓存，避免下次读取再解密
+                self._set_cache(copy.deepcopy(config), self._get_config_mtime_ns())
             
             logger.info("配置保存成功")
             return True
@@ -206,8 +318,8 @@ class ConfigManager:
     
     def get_config_value(self, key: str, default: Any = None) -> Any:
         """获取单个配置值"""
-        config = self.load_config()
-        return config.get(key, default)
+        config = self._get_cached_config()
+        return copy.deepcopy(config.get(key, default))
     
     def set_config_value(self, key: str, value: Any) -> bool:
         """设置单个配置值"""
@@ -218,12 +330,17 @@ class ConfigManager:
     def is_expired(self) -> bool:
         """检查是否过期"""
         try:
-            expiry_date_str = self.get_config_value("EXPIRY_DATE")
-            if not expiry_date_str:
+            with self._cache_lock:
+                config = self._get_cached_config()
+                if config is self._cached_config:
+                    expiry_ts = self._cached_expiry_ts
+                else:
+                    # 读取失败时返回的是未缓存的默认配置
+                    expiry_ts = self._parse_expiry_ts(config)
+            if expiry_ts is None:
                 return True
-            
-            expiry_date = datetime.fromisoformat(expiry_date_str)
-            return datetime.now() > expiry_date
+
+            return time.time() > expiry_ts
             
         except Exception as e:
             logger.error(f"检查过期时间失败: {e}")
@@ -0,0 +1,188 @@
+"""
+数据导出
+
+把 DBManager.stream_rows 产出的分批数据编码为 CSV、NDJSON、JSON、Parquet 或 Arrow 字节流，
+供 StreamingResponse 边读边发送，导出大表时内存占用只与批大小有关。
+Parquet/Arrow 格式需要安装 pyarrow。
+"""
+import csv
+import io
+import json
+from datetime import datetime, date, time as dt_time
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List
+
+from sqlalchemy import Table
+
+from core.logger import get_logger
+
+logger = get_logger("db_export")
+
+# 导出格式：媒体类型和文件扩展名
+EXPORT_FORMATS = {
+    "json": ("application/json", "json"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+
+def _json_default(value: Any) -> Any:
+    """JSON序列化无法直接处理的类型"""
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _dumps(row: Dict[str, Any]) -> str:
+    return json.dumps(row, ensure_ascii=False, default=_json_default)
+
+
+async def iter_csv(table: Table, batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """编码为CSV，每批输出一次"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=list(table.c.keys()))
+    writer.writeheader()
+    yield output.getvalue().encode("utf-8")
+
+    async for batch in batches:
+        output.seek(0)
+        output.truncate()
+        writer.writerows(batch)
+        yield output.getvalue().encode("utf-8")
+
+
+async def iter_ndjson(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """编码为NDJSON，每行一个对象"""
+    async for batch in batches:
+        yield "".join(_dumps(row) + "\n" for row in batch).encode("utf-8")
+
+
+async def iter_json(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """编码为JSON数组"""
+    yield b"["
+    first = True
+    async for batch in batches:
+        chunk = ",".join(_dumps(row) for row in batch)
+        if chunk:
+            yield (chunk if first else "," + chunk).encode("utf-8")
+            first = False
+    yield b"]"
+
+
+class _DrainableSink(io.RawIOBase):
+    """可被pyarrow写入的内存缓冲区，每批写完后取走已写入的字节"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema(pa, table: Table):
+    """根据反射得到的列类型生成Arrow schema"""
+    type_mapping = {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        float: pa.float64(),
+        Decimal: pa.string(),
+        str: pa.string(),
+        bytes: pa.binary(),
+        datetime: pa.timestamp("us"),
+        date: pa.date32(),
+        dt_time: pa.time64("us"),
+    }
+    fields = []
+    for column in table.columns:
+        try:
+            arrow_type = type_mapping.get(column.type.python_type, pa.string())
+        except NotImplementedError:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _load_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise ValueError("导出Parquet/Arrow格式需要安装 pyarrow")
+    return pyarrow
+
+
+async def iter_arrow(table: Table, batches: AsyncIterator[List[Dict[str, Any]]],
+                     file_format: str) -> AsyncIterator[bytes]:
+    """编码为Parquet（每批一个row group）或Arrow IPC流"""
+    pa = _load_pyarrow()
+    schema = _arrow_schema(pa, table)
+    string_columns = [f.name for f in schema if pa.types.is_string(f.type)]
+    sink = _DrainableSink()
+    if file_format == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    try:
+        async for batch in batches:
+            for row in batch:
+                # Decimal等无法直接映射的类型统一转为字符串
+                for name in string_columns:
+                    value = row.get(name)
+                    if value is not None and not isinstance(value, str):
+                        row[name] = _json_default(value)
+            if file_format == "parquet":
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            else:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(table: Table, batches: AsyncIterator[List[Dict[str, Any]]],
+                file_format: str) -> AsyncIterator[bytes]:
+    """按格式返回导出字节流
+
+    Args:
+        table: 表对象
+        batches: DBManager.stream_rows 产出的分批数据
+        file_format: json / csv / ndjson / parquet / arrow
+
+    Returns:
+        字节块异步迭代器
+    """
+    if file_format == "csv":
+        return iter_csv(table, batches)
+    if file_format == "ndjson":
+        return iter_ndjson(batches)
+    if file_format in ("parquet", "arrow"):
+        # 提前检查依赖，避免响应开始后才报错
+        _load_pyarrow()
+        return iter_arrow(table, batches, file_format)
+    return iter_json(batches)
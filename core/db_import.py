@@ -0,0 +1,435 @@
+"""
+数据导入
+
+流式解析CSV、JSON数组和NDJSON文件，按表结构转换字段类型后分批写入数据库。
+文件只按块读取，内存占用与文件大小无关；每次导入对应一个任务，可通过任务ID查询进度。
+"""
+import asyncio
+import codecs
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, date, time as dt_time
+from decimal import Decimal
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import Table
+
+from core.logger import get_logger
+
+logger = get_logger("db_import")
+
+# 每批写入数据库的行数
+IMPORT_BATCH_SIZE = 1000
+# 每次从文件读取的字符数
+READ_CHUNK_SIZE = 64 * 1024
+# 已结束任务的保留时间（秒）
+IMPORT_JOB_TTL = 3600
+
+# 支持的导入格式（按文件扩展名）
+IMPORT_FORMATS = {
+    "csv": "csv",
+    "json": "json",
+    "ndjson": "ndjson",
+    "jsonl": "ndjson",
+}
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y", "on"}
+FALSE_VALUES = {"0", "false", "f", "no", "n", "off"}
+
+
+def detect_import_format(filename: Optional[str]) -> str:
+    """根据文件名判断导入格式
+
+    Args:
+        filename: 上传的文件名
+
+    Returns:
+        csv / json / ndjson
+    """
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension not in IMPORT_FORMATS:
+        raise ValueError("只支持CSV、JSON或NDJSON文件")
+    return IMPORT_FORMATS[extension]
+
+
+def _open_text(binary_file: BinaryIO):
+    """以UTF-8（兼容BOM）流式读取二进制文件"""
+    return codecs.getreader("utf-8-sig")(binary_file)
+
+
+def iter_csv_rows(binary_file: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """逐行解析CSV文件"""
+    yield from csv.DictReader(_open_text(binary_file))
+
+
+def iter_ndjson_rows(text_file) -> Iterator[Dict[str, Any]]:
+    """逐行解析NDJSON，每行一个JSON对象"""
+    for line in text_file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_json_array(text_file) -> Iterator[Any]:
+    """增量解析JSON数组，每次只在缓冲区中保留当前元素"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    state = "start"
+
+    while True:
+        # 跳过空白字符，缓冲区用完时继续读取
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                break
+            chunk = text_file.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        char = buffer[pos]
+        if state == "start":
+            if char != "[":
+                raise ValueError("JSON文件必须包含数据对象的数组")
+            pos += 1
+            state = "first"
+        elif state in ("first", "value") and not (state == "first" and char == "]"):
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 元素跨越了缓冲区边界，读取更多内容后重试
+                if eof:
+                    raise
+                chunk = text_file.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            pos = end
+            state = "separator"
+            yield value
+        elif char == "]":
+            return
+        elif state == "separator" and char == ",":
+            pos += 1
+            state = "value"
+        else:
+            raise json.JSONDecodeError("JSON数组格式无效", buffer, pos)
+
+    if state != "start":
+        raise json.JSONDecodeError("JSON数组未结束", buffer, pos)
+
+
+def iter_json_rows(binary_file: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """解析JSON文件，自动识别JSON数组和NDJSON"""
+    text_file = _open_text(binary_file)
+    first_char = ""
+    while not first_char:
+        char = text_file.read(1)
+        if not char:
+            return
+        if not char.isspace():
+            first_char = char
+
+    # 把已读取的首字符放回流中
+    def _chain():
+        yield first_char
+        while True:
+            chunk = text_file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    if first_char == "[":
+        yield from iter_json_array(_ChunkReader(_chain()))
+    else:
+        yield from iter_ndjson_rows(_ChunkReader(_chain()))
+
+
+class _ChunkReader:
+    """把字符串块迭代器包装为支持 read() 和按行迭代的文本流"""
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            newline = self._buffer.find("\n")
+            if newline >= 0:
+                line, self._buffer = self._buffer[:newline + 1], self._buffer[newline + 1:]
+                yield line
+                continue
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                if self._buffer:
+                    yield self._buffer
+                    self._buffer = ""
+                return
+            self._buffer += chunk
+
+
+def iter_import_rows(binary_file: BinaryIO, file_format: str) -> Iterator[Dict[str, Any]]:
+    """按格式逐条解析导入文件"""
+    if file_format == "csv":
+        rows = iter_csv_rows(binary_file)
+    elif file_format == "ndjson":
+        rows = iter_ndjson_rows(_open_text(binary_file))
+    else:
+        rows = iter_json_rows(binary_file)
+
+    for row in rows:
+        if not isinstance(row, dict):
+            raise ValueError("JSON文件必须包含数据对象的数组")
+        yield row
+
+
+def _to_bool(value: str) -> bool:
+    lowered = value.strip().lower()
+    if lowered in TRUE_VALUES:
+        return True
+    if lowered in FALSE_VALUES:
+        return False
+    raise ValueError(f"无法转换为布尔值: {value}")
+
+
+# 字符串到各Python类型的转换函数
+_STRING_CONVERTERS: Dict[type, Callable[[str], Any]] = {
+    int: lambda v: int(v.strip()),
+    float: lambda v: float(v.strip()),
+    Decimal: lambda v: Decimal(v.strip()),
+    bool: _to_bool,
+    datetime: lambda v: datetime.fromisoformat(v.strip()),
+    date: lambda v: date.fromisoformat(v.strip()),
+    dt_time: lambda v: dt_time.fromisoformat(v.strip()),
+}
+
+
+def build_row_coercer(table: Table) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """根据反射得到的列类型生成行转换函数
+
+    CSV中的值全部是字符串，JSON中的日期也是字符串，这里统一转换为列对应的Python类型；
+    非字符串列的空字符串视为NULL。
+
+    Args:
+        table: 表对象
+
+    Returns:
+        接收一行数据并返回转换后数据的函数
+    """
+    converters: Dict[str, Callable[[str], Any]] = {}
+    for column in table.columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            continue
+        # datetime 是 date 的子类，需要精确匹配
+        converter = _STRING_CONVERTERS.get(python_type)
+        if converter is None:
+            for base_type, base_converter in _STRING_CONVERTERS.items():
+                if issubclass(python_type, base_type):
+                    converter = base_converter
+                    break
+        if converter is not None:
+            converters[column.name] = converter
+
+    def coerce(row: Dict[str, Any]) -> Dict[str, Any]:
+        result = {}
+        for key, value in row.items():
+            converter = converters.get(key)
+            if converter is not None and isinstance(value, str):
+                value = converter(value) if value.strip() else None
+            result[key] = value
+        return result
+
+    return coerce
+
+
+class ImportJob:
+    """导入任务，记录进度和结果"""
+
+    def __init__(self, table_name: str, filename: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.table_name = table_name
+        self.filename = filename
+        self.status = "pending"
+        self.total_bytes = 0
+        self.bytes_read = 0
+        self.processed_rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        progress = 100.0 if self.status == "completed" else (
+            round(self.bytes_read * 100 / self.total_bytes, 1) if self.total_bytes else 0.0
+        )
+        return {
+            "job_id": self.id,
+            "table_name": self.table_name,
+            "filename": self.filename,
+            "status": self.status,
+            "progress": min(progress, 100.0),
+            "processed_rows": self.processed_rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ImportJobManager:
+    """导入任务管理器（进程内）"""
+
+    def __init__(self):
+        self.jobs: Dict[str, ImportJob] = {}
+
+    def create(self, table_name: str, filename: Optional[str]) -> ImportJob:
+        self._cleanup()
+        job = ImportJob(table_name, filename)
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self.jobs.get(job_id)
+
+    def _cleanup(self):
+        """清理过期的已结束任务"""
+        now = datetime.now()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished and job.finished_at and (now - job.finished_at).total_seconds() > IMPORT_JOB_TTL
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+def _read_batch(rows: Iterator[Dict[str, Any]], coerce: Callable, batch_size: int,
+                start_row: int) -> List[Dict[str, Any]]:
+    """读取并转换一批数据（在线程池中执行，避免阻塞事件循环）"""
+    batch = []
+    for row in rows:
+        try:
+            batch.append(coerce(row))
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise ValueError(f"第 {start_row + len(batch) + 1} 行数据类型转换失败: {e}")
+        if len(batch) >= batch_size:
+            break
+    return batch
+
+
+def _file_size(binary_file: BinaryIO) -> int:
+    try:
+        current = binary_file.tell()
+        binary_file.seek(0, os.SEEK_END)
+        size = binary_file.tell()
+        binary_file.seek(current)
+        return size
+    except (OSError, AttributeError):
+        return 0
+
+
+async def run_import(db_manager, job: ImportJob, binary_file: BinaryIO, file_format: str,
+                     batch_size: int = IMPORT_BATCH_SIZE) -> ImportJob:
+    """执行导入任务：流式解析文件并分批写入
+
+    Args:
+        db_manager: 数据库管理器
+        job: 导入任务
+        binary_file: 以二进制方式打开的导入文件
+        file_format: csv / json / ndjson
+        batch_size: 每批写入的行数
+
+    Returns:
+        执行完成的任务
+    """
+    job.status = "running"
+    started = time.time()
+    try:
+        if not await db_manager.table_exists(job.table_name):
+            raise ValueError(f"表 {job.table_name} 不存在")
+
+        coerce = build_row_coercer(db_manager.tables[job.table_name])
+        job.total_bytes = _file_size(binary_file)
+        rows = iter_import_rows(binary_file, file_format)
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await loop.run_in_executor(None, _read_batch, rows, coerce, batch_size, job.processed_rows)
+            if not batch:
+                break
+            result = await db_manager.bulk_upsert(job.table_name, batch, chunk_size=batch_size)
+            job.processed_rows += len(batch)
+            job.inserted += result["inserted"]
+            job.updated += result["updated"]
+            try:
+                job.bytes_read = binary_file.tell()
+            except (OSError, AttributeError):
+                pass
+
+        if job.processed_rows == 0:
+            raise ValueError("文件不包含有效数据")
+
+        job.status = "completed"
+        logger.info(
+            f"导入任务 {job.id} 完成：表 {job.table_name}，{job.processed_rows} 行，"
+            f"耗时 {time.time() - started:.2f}s"
+        )
+        return job
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        logger.error(f"导入任务 {job.id} 失败: {e}")
+        raise
+    finally:
+        job.finished_at = datetime.now()
+
+
+def spool_to_tempfile(binary_file: BinaryIO) -> BinaryIO:
+    """把上传文件按块复制到临时文件（请求结束后上传文件会被关闭，后台任务需要自己的副本）"""
+    binary_file.seek(0)
+    temp_file = tempfile.TemporaryFile()
+    shutil.copyfileobj(binary_file, temp_file, READ_CHUNK_SIZE)
+    temp_file.seek(0)
+    return temp_file
+
+
+async def run_import_in_background(db_manager, job: ImportJob, binary_file: BinaryIO, file_format: str):
+    """后台执行导入任务，完成后关闭临时文件"""
+    try:
+        await run_import(db_manager, job, binary_file, file_format)
+    except Exception:
+        # 错误已记录在任务中
+        pass
+    finally:
+        binary_file.close()
+
+
+# 全局导入任务管理器
+import_jobs = ImportJobManager()
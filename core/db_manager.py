@@ -3,17 +3,24 @@
 
 提供动态管理数据库表的功能，允许创建、修改、删除表和数据。
 """
+import asyncio
+import base64
+import json
 import os
-from typing import Dict, List, Any, Optional
+import time
+from typing import AsyncIterator, Dict, List, Any, Optional
 from datetime import datetime
 
 from sqlalchemy import MetaData, Table, Column, Integer, String, Float, Boolean, Text, DateTime, func
-from sqlalchemy import select, insert, update, delete
+from sqlalchemy import select, insert, update, delete, tuple_
+from sqlalchemy.dialects import sqlite as sqlite_dialect, postgresql as postgresql_dialect, mysql as mysql_dialect
 from sqlalchemy.schema import CreateTable, DropTable
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.sql import text
+from sqlalchemy.sql import text, bindparam
 
 from config import settings
+from db.pool import create_pooled_engine
+from core.db_import import build_row_coercer
+from core.db_search import create_search_index, is_search_index_table
 from core.logger import get_logger
 
 logger = get_logger("db_manager")
@@ -54,6 +61,16 @@ COLUMN_TYPES = {
     "datetime": DateTime,
 }
 
+# 批量写入默认每批行数
+DEFAULT_BULK_CHUNK_SIZE = 1000
+
+# 行数缓存有效期（秒），过期后先返回旧值并在后台刷新
+ROW_COUNT_TTL = 60
+# 行数超过该值的表使用数据库统计信息中的估算值（PostgreSQL/MySQL），不再执行 COUNT(*)
+ESTIMATED_COUNT_THRESHOLD = 100000
+# 并发统计行数时的最大连接数
+TABLE_STATS_CONCURRENCY = 4
+
 class DBManager:
     """数据库管理器"""
     
@@ -69,6 +86,11 @@ class DBManager:
         self.engine = None
         self.metadata = MetaData()
         self.tables = {}
+        # 行数缓存：表名 -> (行数, 刷新时间)，写操作时增量维护
+        self._row_counts: Dict[str, tuple] = {}
+        self._count_refreshing: Dict[str, asyncio.Task] = {}
+        # 已确认存在的搜索索引：表名 -> TableSearchIndex
+        self._search_indexes: Dict[str, Any] = {}
         
         # 确保目录存在
         if db_type == "sqlite":
@@ -110,13 +132,19 @@ class DBManager:
         """初始化数据库连接并加载现有表信息"""
         if not self.engine:
             url = self._get_connection_url()
-            self.engine = create_async_engine(url, echo=True)
+            self.engine = create_pooled_engine("db_manager", url)
             
             # 加载现有表信息
             async with self.engine.begin() as conn:
                 # await self.metadata.reflect(bind=conn)
                 # 使用run_sync执行同步反射
-                await conn.run_sync(self.metadata.reflect)
+                await conn.run_sync(
+                    lambda sync_conn: self.metadata.reflect(
+                        bind=sync_conn,
+                        # 搜索索引的影子表不作为业务表管理
+                        only=lambda name, _: not is_search_index_table(name)
+                    )
+                )
 
             # 缓存表对象
             for table_name, table in self.metadata.tables.items():
@@ -171,14 +199,12 @@ class DBManager:
         if not self.engine:
             await self.initialize()
             
+        # 批量获取记录数（缓存 / 统计信息 / 并发 COUNT）
+        counts = await self.get_row_counts(list(self.tables))
+
         result = []
         for table_name, table in self.tables.items():
-            # 获取记录数
-            count = 0
-            async with self.engine.connect() as conn:
-                count_query = select(func.count()).select_from(table)
-                count_result = await conn.execute(count_query)
-                count = count_result.scalar()
+            count = counts.get(table_name, 0)
             
             # 获取创建时间（可能需要从表中的特定字段获取）
             created_at = datetime.now()  # 默认使用当前时间
@@ -318,6 +344,7 @@ class DBManager:
         # 更新缓存
         self.tables[table_name] = table
         
+        self._row_counts[table_name] = (0, time.monotonic())
         logger.info(f"创建表 {table_name} 成功")
         return table_name
     
@@ -341,12 +368,14 @@ class DBManager:
         
         # 在数据库中删除表
         async with self.engine.begin() as conn:
+            await self._drop_search_index(conn, table_name)
             await conn.execute(DropTable(table))
         
         # 从缓存中删除表
         del self.tables[table_name]
         self.metadata.remove(table)
         
+        self.invalidate_row_count(table_name)
         logger.info(f"删除表 {table_name} 成功")
         return True
     
@@ -425,7 +454,8 @@ class DBManager:
                         insert_stmt = insert(temp_table).values(**filtered_row)
                         await conn.execute(insert_stmt)
                 
-                # 删除原表
+                # 删除原表（搜索索引随表结构一起失效）
+                await self._drop_search_index(conn, table_name)
                 await conn.execute(DropTable(self.tables[table_name]))
                 
                 # 重命名临时表为原表名
@@ -473,6 +503,7 @@ class DBManager:
                 pass
             raise
         
+        self.invalidate_row_count(table_name)
         logger.info(f"修改表 {table_name} 结构成功")
         return True
 
@@ -542,7 +573,8 @@ class DBManager:
                         insert_stmt = insert(temp_table).values(**filtered_row)
                         await conn.execute(insert_stmt)
 
-                # 删除原表
+                # 删除原表（搜索索引随表结构一起失效）
+                await self._drop_search_index(conn, table_name)
                 await conn.execute(DropTable(self.tables[table_name]))
 
                 if self.db_type == "sqlite":
@@ -598,6 +630,7 @@ class DBManager:
                 pass
             raise
 
+        self.invalidate_row_count(table_name)
         logger.info(f"修改表 {table_name} 结构成功")
         return True
     async def execute_query(self, operation: str, table_name: Optional[str] = None, 
@@ -637,7 +670,9 @@ class DBManager:
                     result = await conn.execute(text(sql), params)
                     if result.returns_rows:
                         return [dict(row._mapping) for row in result]
-                    return {"affected_rows": result.rowcount}
+                # 无法判断原始SQL影响了哪些表，行数缓存全部失效
+                self.invalidate_row_count()
+                return {"affected_rows": result.rowcount}
             
             elif table_name and table_name in self.tables:
                 table = self.tables[table_name]
@@ -677,7 +712,8 @@ class DBManager:
                         print(data)
                         # print(**data['data'])
                         result = await conn.execute(insert(table).values(**data))
-                        return {"id": result.inserted_primary_key[0] if result.inserted_primary_key else None}
+                    self._adjust_row_count(table_name, 1)
+                    return {"id": result.inserted_primary_key[0] if result.inserted_primary_key else None}
                 
                 elif operation == "update" and data:
                     # 构建更新
@@ -705,7 +741,12 @@ class DBManager:
                     # 执行删除
                     async with self.engine.begin() as conn:
                         result = await conn.execute(query)
-                        return {"affected_rows": result.rowcount}
+                    if result.rowcount < 0:
+                        # 驱动无法报告删除行数时重新统计
+                        self.invalidate_row_count(table_name)
+                    else:
+                        self._adjust_row_count(table_name, -result.rowcount)
+                    return {"affected_rows": result.rowcount}
             
             raise ValueError(f"无法执行操作: {operation}, 表: {table_name}")
         
@@ -714,12 +755,462 @@ class DBManager:
             logger.error(f"数据库操作失败: {str(e)}")
             raise
 
+    def _build_upsert_statement(self, table: Table, keys: List[str], pk_columns: List[str]):
+        """构建数据库原生的 upsert 语句（用于 executemany）
+
+        Args:
+            table: 表对象
+            keys: 本批数据包含的列名
+            pk_columns: 主键列名
+
+        Returns:
+            upsert 语句，数据库不支持时返回None
+        """
+        update_columns = [k for k in keys if k not in pk_columns]
+        dialect_name = self.engine.dialect.name
+
+        if dialect_name in ("sqlite", "postgresql"):
+            dialect_module = sqlite_dialect if dialect_name == "sqlite" else postgresql_dialect
+            stmt = dialect_module.insert(table)
+            if not update_columns:
+                return stmt.on_conflict_do_nothing(index_elements=pk_columns)
+            return stmt.on_conflict_do_update(
+                index_elements=pk_columns,
+                set_={k: stmt.excluded[k] for k in update_columns}
+            )
+
+        if dialect_name in ("mysql", "mariadb"):
+            stmt = mysql_dialect.insert(table)
+            # 没有可更新的列时把主键赋值给自身，相当于忽略
+            update_columns = update_columns or pk_columns[:1]
+            return stmt.on_duplicate_key_update({k: stmt.inserted[k] for k in update_columns})
+
+        return None
+
+    async def bulk_upsert(self, table_name: str, rows: List[Dict[str, Any]],
+                          chunk_size: int = DEFAULT_BULK_CHUNK_SIZE) -> Dict[str, int]:
+        """批量插入或更新数据
+
+        按主键判断：主键已存在则更新，否则插入。每批数据在一个事务中完成，
+        先用一条 IN 查询找出已存在的主键，再用数据库原生的
+        INSERT ... ON CONFLICT / ON DUPLICATE KEY 语句 executemany 写入。
+
+        Args:
+            table_name: 表名
+            rows: 数据列表
+            chunk_size: 每批处理的行数
+
+        Returns:
+            插入和更新的行数，如 {"inserted": 10, "updated": 2}
+        """
+        if not self.engine:
+            await self.initialize()
+
+        if table_name not in self.tables:
+            raise ValueError(f"表 {table_name} 不存在")
+        if chunk_size < 1:
+            raise ValueError("chunk_size 必须大于0")
+
+        table = self.tables[table_name]
+        pk_columns = [c.name for c in table.primary_key.columns]
+        if not pk_columns:
+            raise ValueError(f"表 {table_name} 没有主键，无法批量插入")
+
+        column_names = set(table.c.keys())
+        inserted = 0
+        updated = 0
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+
+            # 校验列名，并按列集合分组（executemany 要求每行的列一致）
+            groups: Dict[tuple, List[Dict[str, Any]]] = {}
+            keyed_rows: Dict[tuple, Dict[str, Any]] = {}
+            for row in chunk:
+                unknown = set(row) - column_names
+                if unknown:
+                    raise ValueError(f"表 {table_name} 不存在列: {', '.join(sorted(unknown))}")
+                pk_value = tuple(row.get(pk) for pk in pk_columns)
+                if None not in pk_value:
+                    # 同一批中主键重复时以最后一行为准
+                    keyed_rows[pk_value] = row
+                else:
+                    groups.setdefault(tuple(sorted(row)), []).append(row)
+            for row in keyed_rows.values():
+                groups.setdefault(tuple(sorted(row)), []).append(row)
+
+            async with self.engine.begin() as conn:
+                existing = set()
+                if keyed_rows:
+                    if len(pk_columns) == 1:
+                        pk_column = table.c[pk_columns[0]]
+                        query = select(pk_column).where(pk_column.in_([k[0] for k in keyed_rows]))
+                    else:
+                        pk_tuple = tuple_(*[table.c[pk] for pk in pk_columns])
+                        query = select(*[table.c[pk] for pk in pk_columns]).where(pk_tuple.in_(list(keyed_rows)))
+                    result = await conn.execute(query)
+                    existing = {tuple(r) for r in result}
+
+                for keys, group_rows in groups.items():
+                    has_pk = all(pk in keys for pk in pk_columns)
+                    stmt = self._build_upsert_statement(table, list(keys), pk_columns) if has_pk else insert(table)
+                    if stmt is not None:
+                        await conn.execute(stmt, group_rows)
+                        continue
+
+                    # 不支持原生 upsert 的数据库：同一事务内逐行更新或插入
+                    for row in group_rows:
+                        pk_value = tuple(row[pk] for pk in pk_columns)
+                        if pk_value in existing:
+                            query = update(table).values(**row)
+                            for pk, value in zip(pk_columns, pk_value):
+                                query = query.where(table.c[pk] == value)
+                            await conn.execute(query)
+                        else:
+                            await conn.execute(insert(table).values(**row))
+
+            chunk_inserted = sum(len(r) for r in groups.values()) - len(existing)
+            updated += len(existing)
+            inserted += chunk_inserted
+            self._adjust_row_count(table_name, chunk_inserted)
+
+        logger.info(f"表 {table_name} 批量写入完成：插入 {inserted} 条，更新 {updated} 条")
+        return {"inserted": inserted, "updated": updated}
+
+    async def _count_rows(self, table_name: str) -> int:
+        """执行 COUNT(*) 并写入行数缓存"""
+        table = self.tables[table_name]
+        async with self.engine.connect() as conn:
+            result = await conn.execute(select(func.count()).select_from(table))
+            count = result.scalar() or 0
+        self._row_counts[table_name] = (count, time.monotonic())
+        return count
+
+    async def _fetch_estimated_row_counts(self, table_names: List[str]) -> Dict[str, int]:
+        """从数据库统计信息读取大表的估算行数
+
+        PostgreSQL 使用 pg_class.reltuples，MySQL 使用 information_schema.TABLES.TABLE_ROWS，
+        一次查询取回所有表；只返回超过 ESTIMATED_COUNT_THRESHOLD 的表，小表仍精确统计。
+        SQLite 的 sqlite_stat1 只在执行 ANALYZE 后更新，不使用。
+        """
+        dialect_name = self.engine.dialect.name
+        if dialect_name == "postgresql":
+            sql = (
+                "SELECT c.relname AS name, c.reltuples::bigint AS estimate FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p') AND c.relname IN :names"
+            )
+        elif dialect_name in ("mysql", "mariadb"):
+            sql = (
+                "SELECT TABLE_NAME AS name, TABLE_ROWS AS estimate FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN :names"
+            )
+        else:
+            return {}
+
+        if not table_names:
+            return {}
+        try:
+            query = text(sql).bindparams(bindparam("names", expanding=True))
+            async with self.engine.connect() as conn:
+                result = await conn.execute(query, {"names": table_names})
+                rows = result.all()
+        except Exception as e:
+            logger.warning(f"读取表统计信息失败: {e}")
+            return {}
+
+        estimates = {}
+        now = time.monotonic()
+        for name, estimate in rows:
+            if estimate is not None and int(estimate) >= ESTIMATED_COUNT_THRESHOLD:
+                estimates[name] = int(estimate)
+                self._row_counts[name] = (int(estimate), now)
+        return estimates
+
+    async def _refresh_row_count(self, table_name: str):
+        """后台刷新行数缓存，大表优先使用统计信息"""
+        try:
+            if table_name in self.tables:
+                cached = self._row_counts.get(table_name)
+                if cached is None or cached[0] < ESTIMATED_COUNT_THRESHOLD or \
+                        table_name not in await self._fetch_estimated_row_counts([table_name]):
+                    await self._count_rows(table_name)
+        except Exception as e:
+            logger.warning(f"刷新表 {table_name} 行数失败: {e}")
+        finally:
+            self._count_refreshing.pop(table_name, None)
+
+    def _schedule_row_count_refresh(self, table_name: str, refreshed_at: float):
+        """缓存过期时安排后台刷新"""
+        if time.monotonic() - refreshed_at > ROW_COUNT_TTL and table_name not in self._count_refreshing:
+            self._count_refreshing[table_name] = asyncio.create_task(self._refresh_row_count(table_name))
+
+    async def get_row_count(self, table_name: str) -> int:
+        """获取表的行数（缓存）
+
+        首次访问时同步执行 COUNT(*)；之后通过写操作增量维护，
+        超过 ROW_COUNT_TTL 后先返回旧值并在后台重新统计，翻页时不再每次全表计数。
+
+        Args:
+            table_name: 表名
+
+        Returns:
+            行数
+        """
+        if not self.engine:
+            await self.initialize()
+
+        if table_name not in self.tables:
+            raise ValueError(f"表 {table_name} 不存在")
+
+        cached = self._row_counts.get(table_name)
+        if cached is None:
+            return await self._count_rows(table_name)
+
+        count, refreshed_at = cached
+        self._schedule_row_count_refresh(table_name, refreshed_at)
+        return count
+
+    async def get_row_counts(self, table_names: List[str]) -> Dict[str, int]:
+        """批量获取多张表的行数
+
+        已缓存的直接返回；未缓存的大表先从统计信息一次性读取估算值，
+        其余表在 TABLE_STATS_CONCURRENCY 个连接内并发执行 COUNT(*)。
+
+        Args:
+            table_names: 表名列表
+
+        Returns:
+            表名 -> 行数
+        """
+        if not self.engine:
+            await self.initialize()
+
+        counts = {}
+        missing = []
+        for table_name in table_names:
+            cached = self._row_counts.get(table_name)
+            if cached is None:
+                missing.append(table_name)
+            else:
+                counts[table_name] = cached[0]
+                self._schedule_row_count_refresh(table_name, cached[1])
+
+        if missing:
+            estimates = await self._fetch_estimated_row_counts(missing)
+            counts.update(estimates)
+
+            semaphore = asyncio.Semaphore(TABLE_STATS_CONCURRENCY)
+
+            async def count_table(name: str):
+                async with semaphore:
+                    try:
+                        return name, await self._count_rows(name)
+                    except Exception as e:
+                        logger.warning(f"统计表 {name} 行数失败: {e}")
+                        return name, 0
+
+            results = await asyncio.gather(
+                *[count_table(name) for name in missing if name not in estimates]
+            )
+            counts.update(results)
+
+        return counts
+
+    def _adjust_row_count(self, table_name: str, delta: int):
+        """写操作后增量更新行数缓存"""
+        cached = self._row_counts.get(table_name)
+        if cached is not None and delta:
+            self._row_counts[table_name] = (max(0, cached[0] + delta), cached[1])
+
+    def invalidate_row_count(self, table_name: Optional[str] = None):
+        """使行数缓存失效
+
+        Args:
+            table_name: 表名，为空时清空全部缓存
+        """
+        if table_name is None:
+            self._row_counts.clear()
+        else:
+            self._row_counts.pop(table_name, None)
+
+    @staticmethod
+    def _encode_cursor(values: List[Any]) -> str:
+        """把游标值编码为URL安全的字符串"""
+        payload = json.dumps(
+            [v.isoformat() if hasattr(v, "isoformat") else v for v in values],
+            default=str
+        )
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> List[Any]:
+        """解码游标字符串"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("无效的分页游标")
+        if not isinstance(values, list):
+            raise ValueError("无效的分页游标")
+        return values
+
+    async def select_keyset_page(self, table_name: str, limit: int, sort_by: Optional[str] = None,
+                                 sort_desc: bool = False, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """游标（keyset）分页查询
+
+        按 (排序字段, 主键) 排序，用上一页最后一行的键值作为条件定位下一页，
+        不使用 OFFSET，翻到多深的页面都只需要一次索引范围扫描。
+
+        Args:
+            table_name: 表名
+            limit: 每页行数
+            sort_by: 排序字段，默认为主键
+            sort_desc: 是否降序
+            cursor: 上一页返回的 next_cursor，为空时查询第一页
+
+        Returns:
+            {"items": [...], "next_cursor": str 或 None, "has_more": bool}
+        """
+        if not self.engine:
+            await self.initialize()
+
+        if table_name not in self.tables:
+            raise ValueError(f"表 {table_name} 不存在")
+
+        table = self.tables[table_name]
+        pk_columns = list(table.primary_key.columns)
+        if not pk_columns:
+            raise ValueError(f"表 {table_name} 没有主键，无法使用游标分页")
+
+        key_columns = list(pk_columns)
+        if sort_by and sort_by not in [c.name for c in pk_columns]:
+            if not hasattr(table.c, sort_by):
+                raise ValueError(f"表 {table_name} 不存在列: {sort_by}")
+            sort_column = table.c[sort_by]
+            if sort_column.nullable:
+                raise ValueError(f"排序字段 {sort_by} 可为空，无法使用游标分页")
+            key_columns.insert(0, sort_column)
+
+        query = select(table)
+        if cursor:
+            values = self._decode_cursor(cursor)
+            if len(values) != len(key_columns):
+                raise ValueError("分页游标与排序字段不匹配")
+            # 游标中的日期等值以字符串保存，按列类型还原
+            coerced = build_row_coercer(table)({c.name: v for c, v in zip(key_columns, values)})
+            key_values = [coerced[c.name] for c in key_columns]
+            key_tuple = tuple_(*key_columns)
+            value_tuple = tuple_(*key_values)
+            query = query.where(key_tuple < value_tuple if sort_desc else key_tuple > value_tuple)
+
+        query = query.order_by(*[c.desc() if sort_desc else c.asc() for c in key_columns])
+        # 多取一行用于判断是否还有下一页
+        query = query.limit(limit + 1)
+
+        async with self.engine.connect() as conn:
+            result = await conn.execute(query)
+            rows = [dict(row._mapping) for row in result]
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more and rows:
+            next_cursor = self._encode_cursor([rows[-1][c.name] for c in key_columns])
+
+        return {"items": rows, "next_cursor": next_cursor, "has_more": has_more}
+
+    async def _drop_search_index(self, conn, table_name: str):
+        """删除表的搜索索引（在调用方事务中执行）"""
+        search_index = self._search_indexes.pop(table_name, None)
+        if search_index is None:
+            try:
+                search_index = create_search_index(self.tables[table_name], self.engine.dialect)
+            except ValueError:
+                return
+        await search_index.drop(conn)
+
+    async def search_table(self, table_name: str, keyword: str, limit: int, offset: int = 0,
+                           sort_by: Optional[str] = None, sort_desc: bool = False) -> Dict[str, Any]:
+        """全文搜索表数据
+
+        首次搜索时为表的文本列创建全文索引（见 core.db_search），之后直接走索引，
+        结果默认按相关度排序。
+
+        Args:
+            table_name: 表名
+            keyword: 搜索关键词，多个词之间为“与”关系
+            limit: 返回的行数
+            offset: 跳过的行数
+            sort_by: 排序字段，为空时按相关度排序
+            sort_desc: 是否降序
+
+        Returns:
+            {"items": [...], "total": 匹配总数}
+        """
+        if not self.engine:
+            await self.initialize()
+
+        if table_name not in self.tables:
+            raise ValueError(f"表 {table_name} 不存在")
+
+        search_index = self._search_indexes.get(table_name)
+        if search_index is None:
+            search_index = create_search_index(self.tables[table_name], self.engine.dialect)
+            async with self.engine.begin() as conn:
+                await search_index.ensure(conn)
+            self._search_indexes[table_name] = search_index
+
+        query, count_query, params = search_index.build_queries(keyword.strip())
+        table = self.tables[table_name]
+        if sort_by and hasattr(table.c, sort_by):
+            sort_column = table.c[sort_by]
+            query = query.order_by(None).order_by(sort_column.desc() if sort_desc else sort_column)
+        query = query.limit(limit).offset(offset)
+
+        async with self.engine.connect() as conn:
+            result = await conn.execute(query, params)
+            items = [dict(row._mapping) for row in result]
+            total = (await conn.execute(count_query, params)).scalar() or 0
+
+        return {"items": items, "total": total}
+
+    async def stream_rows(self, table_name: str,
+                          batch_size: int = DEFAULT_BULK_CHUNK_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+        """分批流式读取整张表
+
+        使用服务端游标（stream_results）按批返回数据，内存占用只与批大小有关。
+
+        Args:
+            table_name: 表名
+            batch_size: 每批行数
+
+        Returns:
+            异步迭代器，每次产出一批数据
+        """
+        if not self.engine:
+            await self.initialize()
+
+        if table_name not in self.tables:
+            raise ValueError(f"表 {table_name} 不存在")
+
+        table = self.tables[table_name]
+        query = select(table).execution_options(yield_per=batch_size)
+        async with self.engine.connect() as conn:
+            result = await conn.stream(query)
+            async for partition in result.mappings().partitions(batch_size):
+                yield [dict(row) for row in partition]
+
     async def refresh(self):
         """
         刷新表
         :return:
         """
+        if self.engine:
+            await self.engine.dispose()
         self.engine=None
+        self.invalidate_row_count()
+        self._search_indexes.clear()
         await self.initialize()
         return {"status": "success", "message": f"数据库表刷新成功，类型：{self.db_type}"}
 
@@ -727,5 +1218,7 @@ class DBManager:
         """
         :return:
         """
+        if self.engine:
+            await self.engine.dispose()
         self.engine=None
 
@@ -0,0 +1,251 @@
+"""
+表数据全文搜索
+
+为 DBManager 管理的表建立全文索引，按相关度返回分页结果：
+- SQLite：FTS5 外部内容影子表（优先使用 trigram 分词，支持中文子串），由触发器保持同步
+- PostgreSQL：to_tsvector 表达式 GIN 索引
+- MySQL：FULLTEXT 索引（ngram 分词）
+其他数据库退化为 LIKE 查询。索引覆盖反射得到的全部文本列，首次搜索时自动创建。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Table, bindparam, column, func, literal_column, or_, select, table as table_clause, text
+from sqlalchemy.sql import Select
+
+from core.logger import get_logger
+
+logger = get_logger("db_search")
+
+# 索引对象名后缀
+SEARCH_INDEX_SUFFIX = "__fts"
+# FTS5 影子表的后缀
+_FTS5_SHADOW_SUFFIXES = ("", "_data", "_idx", "_content", "_docsize", "_config")
+# trigram 分词要求的最短搜索词长度
+TRIGRAM_MIN_LENGTH = 3
+
+
+def is_search_index_table(table_name: str) -> bool:
+    """判断是否为搜索索引使用的内部表（反射时需要排除）"""
+    return any(table_name.endswith(SEARCH_INDEX_SUFFIX + suffix) for suffix in _FTS5_SHADOW_SUFFIXES)
+
+
+def get_text_columns(table: Table) -> List:
+    """获取表中的文本列"""
+    columns = []
+    for col in table.columns:
+        try:
+            if col.type.python_type is str:
+                columns.append(col)
+        except NotImplementedError:
+            continue
+    return columns
+
+
+class TableSearchIndex:
+    """搜索索引基类（无索引，使用 LIKE 查询）"""
+
+    def __init__(self, table: Table, dialect):
+        self.table = table
+        self.dialect = dialect
+        self.preparer = dialect.identifier_preparer
+        self.text_columns = get_text_columns(table)
+        self.index_name = f"{table.name}{SEARCH_INDEX_SUFFIX}"
+
+    def quote(self, name: str) -> str:
+        return self.preparer.quote(name)
+
+    async def ensure(self, conn):
+        """确保索引存在"""
+
+    async def drop(self, conn):
+        """删除索引"""
+
+    def prepare_query(self, keyword: str) -> Optional[str]:
+        """把用户输入转换为索引查询语句，返回None时使用 LIKE 查询"""
+        return None
+
+    def _like_condition(self, keyword: str):
+        terms = keyword.split()
+        conditions = []
+        for i, term in enumerate(terms):
+            pattern = bindparam(f"search_term_{i}", f"%{term}%")
+            conditions.append(or_(*[col.like(pattern) for col in self.text_columns]))
+        return conditions
+
+    def build_queries(self, keyword: str) -> Tuple[Select, Select, Dict[str, Any]]:
+        """构建搜索查询
+
+        Returns:
+            (结果查询, 计数查询, 参数)，结果查询已按相关度排序
+        """
+        conditions = self._like_condition(keyword)
+        query = select(self.table).where(*conditions)
+        count_query = select(func.count()).select_from(self.table).where(*conditions)
+        return query, count_query, {}
+
+
+class SQLiteSearchIndex(TableSearchIndex):
+    """SQLite FTS5 外部内容索引，触发器保持同步"""
+
+    def __init__(self, table: Table, dialect):
+        super().__init__(table, dialect)
+        self.tokenizer = "trigram"
+
+    async def _exists(self, conn) -> bool:
+        result = await conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": self.index_name}
+        )
+        row = result.first()
+        if row and "trigram" not in (row[0] or ""):
+            self.tokenizer = "unicode61"
+        return row is not None
+
+    async def ensure(self, conn):
+        if await self._exists(conn):
+            return
+
+        t = self.quote(self.table.name)
+        fts = self.quote(self.index_name)
+        cols = [self.quote(c.name) for c in self.text_columns]
+        col_list = ", ".join(cols)
+        new_values = ", ".join(f"new.{c}" for c in cols)
+        old_values = ", ".join(f"old.{c}" for c in cols)
+
+        try:
+            await conn.execute(text(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({col_list}, content={t}, "
+                f"content_rowid='rowid', tokenize='trigram')"
+            ))
+        except Exception:
+            # 低版本SQLite不支持 trigram 分词
+            self.tokenizer = "unicode61"
+            await conn.execute(text(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({col_list}, content={t}, content_rowid='rowid')"
+            ))
+
+        await conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {self.quote(self.index_name + '_ai')} AFTER INSERT ON {t} BEGIN "
+            f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.rowid, {new_values}); END"
+        ))
+        await conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {self.quote(self.index_name + '_ad')} AFTER DELETE ON {t} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.rowid, {old_values}); END"
+        ))
+        await conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {self.quote(self.index_name + '_au')} AFTER UPDATE ON {t} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.rowid, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.rowid, {new_values}); END"
+        ))
+        # 用现有数据构建索引
+        await conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        logger.info(f"为表 {self.table.name} 创建FTS5索引（{self.tokenizer}）")
+
+    async def drop(self, conn):
+        for suffix in ("_ai", "_ad", "_au"):
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {self.quote(self.index_name + suffix)}"))
+        await conn.execute(text(f"DROP TABLE IF EXISTS {self.quote(self.index_name)}"))
+
+    def prepare_query(self, keyword: str) -> Optional[str]:
+        terms = keyword.split()
+        if self.tokenizer == "trigram" and any(len(term) < TRIGRAM_MIN_LENGTH for term in terms):
+            return None
+        quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+        if self.tokenizer != "trigram":
+            # unicode61 按词切分，使用前缀匹配
+            quoted = [term + "*" for term in quoted]
+        return " ".join(quoted)
+
+    def build_queries(self, keyword: str) -> Tuple[Select, Select, Dict[str, Any]]:
+        match_query = self.prepare_query(keyword)
+        if match_query is None:
+            return super().build_queries(keyword)
+
+        fts = table_clause(self.index_name, column("rowid"), column("rank"))
+        match = literal_column(self.quote(self.index_name)).op("MATCH")(bindparam("search_query"))
+        rowid = literal_column(f"{self.quote(self.table.name)}.rowid")
+        query = (
+            select(self.table)
+            .join_from(self.table, fts, rowid == fts.c.rowid)
+            .where(match)
+            .order_by(fts.c.rank)
+        )
+        count_query = select(func.count()).select_from(fts).where(match)
+        return query, count_query, {"search_query": match_query}
+
+
+class PostgresSearchIndex(TableSearchIndex):
+    """PostgreSQL to_tsvector 表达式 GIN 索引"""
+
+    def _document_sql(self) -> str:
+        # 索引表达式与查询表达式必须完全一致，规划器才能使用索引
+        parts = [f"coalesce({self.quote(c.name)}::text, '')" for c in self.text_columns]
+        return "to_tsvector('simple', " + " || ' ' || ".join(parts) + ")"
+
+    async def ensure(self, conn):
+        await conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {self.quote(self.index_name)} "
+            f"ON {self.quote(self.table.name)} USING GIN ({self._document_sql()})"
+        ))
+
+    async def drop(self, conn):
+        await conn.execute(text(f"DROP INDEX IF EXISTS {self.quote(self.index_name)}"))
+
+    def build_queries(self, keyword: str) -> Tuple[Select, Select, Dict[str, Any]]:
+        document = literal_column(self._document_sql())
+        ts_query = func.plainto_tsquery(literal_column("'simple'"), bindparam("search_query"))
+        match = document.op("@@")(ts_query)
+        query = select(self.table).where(match).order_by(func.ts_rank(document, ts_query).desc())
+        count_query = select(func.count()).select_from(self.table).where(match)
+        return query, count_query, {"search_query": keyword}
+
+
+class MySQLSearchIndex(TableSearchIndex):
+    """MySQL FULLTEXT 索引（ngram 分词）"""
+
+    async def ensure(self, conn):
+        result = await conn.execute(
+            text(
+                "SELECT 1 FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND INDEX_NAME = :index"
+            ),
+            {"table": self.table.name, "index": self.index_name}
+        )
+        if result.first():
+            return
+        col_list = ", ".join(self.quote(c.name) for c in self.text_columns)
+        await conn.execute(text(
+            f"ALTER TABLE {self.quote(self.table.name)} "
+            f"ADD FULLTEXT INDEX {self.quote(self.index_name)} ({col_list}) WITH PARSER ngram"
+        ))
+        logger.info(f"为表 {self.table.name} 创建FULLTEXT索引")
+
+    async def drop(self, conn):
+        try:
+            await conn.execute(text(
+                f"ALTER TABLE {self.quote(self.table.name)} DROP INDEX {self.quote(self.index_name)}"
+            ))
+        except Exception:
+            pass
+
+    def build_queries(self, keyword: str) -> Tuple[Select, Select, Dict[str, Any]]:
+        col_list = ", ".join(self.quote(c.name) for c in self.text_columns)
+        match = text(f"MATCH ({col_list}) AGAINST (:search_query IN NATURAL LANGUAGE MODE)")
+        query = select(self.table).where(match).order_by(
+            text(f"MATCH ({col_list}) AGAINST (:search_query IN NATURAL LANGUAGE MODE) DESC")
+        )
+        count_query = select(func.count()).select_from(self.table).where(match)
+        return query, count_query, {"search_query": keyword}
+
+
+def create_search_index(table: Table, dialect) -> TableSearchIndex:
+    """根据数据库类型创建搜索索引对象"""
+    if not get_text_columns(table):
+        raise ValueError(f"表 {table.name} 没有可搜索的文本列")
+    if dialect.name == "sqlite":
+        return SQLiteSearchIndex(table, dialect)
+    if dialect.name == "postgresql":
+        return PostgresSearchIndex(table, dialect)
+    if dialect.name in ("mysql", "mariadb"):
+        return MySQLSearchIndex(table, dialect)
+    return TableSearchIndex(table, dialect)
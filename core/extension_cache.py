@@ -0,0 +1,165 @@
+"""
+扩展查询结果缓存
+
+扩展可声明 CACHE_TTL（秒）或 get_cache_policy() 返回 {"ttl": 秒} 开启结果缓存，
+相同扩展、相同查询参数、相同配置的请求在有效期内直接返回缓存结果。
+缓存按 LRU + TTL 淘汰并限制条目数；并发的相同请求只执行一次（single-flight）。
+执行失败的结果不缓存，扩展配置更新或重新加载时清除该扩展的缓存。
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import settings
+from core.logger import get_logger
+
+logger = get_logger("extension_cache")
+
+
+class _LeaderCancelled(Exception):
+    """执行查询的请求被取消，等待同一结果的请求需要重新执行"""
+    pass
+
+
+def get_cache_ttl(module: Any) -> Optional[float]:
+    """读取扩展声明的缓存时间，未声明或无效时返回None"""
+    ttl = None
+    if hasattr(module, "get_cache_policy"):
+        try:
+            policy = module.get_cache_policy() or {}
+            ttl = policy.get("ttl")
+        except Exception as e:
+            logger.warning(f"读取扩展 {module.__name__} 缓存策略失败: {e}")
+    elif hasattr(module, "CACHE_TTL"):
+        ttl = module.CACHE_TTL
+    try:
+        ttl = float(ttl) if ttl is not None else None
+    except (TypeError, ValueError):
+        return None
+    return ttl if ttl and ttl > 0 else None
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def make_cache_key(extension_id: str, query: Any, config: Any) -> Tuple[str, str, str]:
+    """缓存键：扩展ID + 规范化查询参数 + 配置哈希"""
+    config_hash = hashlib.sha1(_canonical(config).encode("utf-8")).hexdigest()
+    return extension_id, _canonical(query), config_hash
+
+
+class ExtensionResultCache:
+    """扩展结果缓存（LRU + TTL + single-flight）"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.EXTENSION_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def _get(self, key) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        result, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, result
+
+    def _put(self, key, result: Any, ttl: float) -> None:
+        self._entries[key] = (result, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_execute(
+        self,
+        extension_id: str,
+        query: Any,
+        config: Any,
+        ttl: float,
+        execute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda result: True,
+    ) -> Any:
+        """
+        返回缓存结果，未命中时执行查询并缓存
+
+        Args:
+            extension_id: 扩展ID
+            query: 查询参数
+            config: 扩展配置
+            ttl: 缓存时间(秒)
+            execute: 执行查询的协程函数
+            cacheable: 判断结果是否可缓存
+
+        Returns:
+            查询结果
+        """
+        key = make_cache_key(extension_id, query, config)
+        while True:
+            found, result = self._get(key)
+            if found:
+                self.hits += 1
+                return result
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            # 相同请求正在执行，等待其结果
+            self.shared += 1
+            try:
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                # 执行的请求被取消（如客户端断开），重新检查缓存，必要时由当前请求执行
+                continue
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await execute()
+        except asyncio.CancelledError:
+            # 不取消共享的future，否则等待中的请求也会被取消
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 避免没有等待者时出现未获取异常的警告
+            future.exception()
+            raise
+        else:
+            if cacheable(result):
+                self._put(key, result, ttl)
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, extension_id: Optional[str] = None) -> None:
+        """清除指定扩展（为空时全部）的缓存"""
+        if extension_id is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == extension_id]:
+            del self._entries[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
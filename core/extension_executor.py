@@ -0,0 +1,256 @@
+"""
+扩展执行后端
+
+异步扩展直接在事件循环中执行；同步扩展默认提交到有界线程池，
+CPU密集型或需要隔离的扩展可在模块中声明 EXECUTION_BACKEND = "process"，
+由常驻工作进程池执行（见 core/extension_workers.py），避免阻塞事件循环。
+每个扩展有独立的并发上限和超时时间，并记录排队、运行和耗时等指标。
+
+扩展模块可声明：
+    EXECUTION_BACKEND: "thread" / "process"（异步扩展忽略此项）
+    MAX_CONCURRENCY: 同时执行的最大调用数
+    TIMEOUT: 单次调用超时时间(秒)
+"""
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from config import settings
+from core.extension_workers import ExtensionWorkerPool
+from core.logger import get_logger
+
+logger = get_logger("extension_executor")
+
+# 执行后端
+BACKEND_ASYNC = "async"
+BACKEND_THREAD = "thread"
+BACKEND_PROCESS = "process"
+EXECUTION_BACKENDS = (BACKEND_ASYNC, BACKEND_THREAD, BACKEND_PROCESS)
+
+
+# 同步生成器结束标记
+_STREAM_END = object()
+
+
+class ExtensionTimeoutError(Exception):
+    """扩展执行超时"""
+    pass
+
+
+async def _ready(value: Any) -> Any:
+    return value
+
+
+class ExtensionMetrics:
+    """单个扩展的执行指标"""
+
+    def __init__(self):
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.streaming = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "streaming": self.streaming,
+            "avg_time_ms": round(self.total_time * 1000 / finished, 3) if finished else 0.0,
+            "max_time_ms": round(self.max_time * 1000, 3),
+        }
+
+
+class ExtensionExecutor:
+    """扩展执行器：按调用计划选择执行后端，限制并发并记录指标"""
+
+    def __init__(self):
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self.worker_pool = ExtensionWorkerPool()
+        self._pool_lock = threading.Lock()
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._metrics: Dict[str, ExtensionMetrics] = {}
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=settings.EXTENSION_THREAD_WORKERS,
+                    thread_name_prefix="extension"
+                )
+            return self._thread_pool
+
+    def _get_limit(self, name: str, max_concurrency: int) -> asyncio.Semaphore:
+        semaphore = self._limits.get(name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max_concurrency)
+            self._limits[name] = semaphore
+        return semaphore
+
+    def _get_metrics(self, name: str) -> ExtensionMetrics:
+        metrics = self._metrics.get(name)
+        if metrics is None:
+            metrics = ExtensionMetrics()
+            self._metrics[name] = metrics
+        return metrics
+
+    def reset_limit(self, name: str) -> None:
+        """扩展重新加载后重建并发限制（并发上限可能已变化）"""
+        self._limits.pop(name, None)
+
+    def _submit(self, plan, query: Any, db_manager, progress, backend: str):
+        """按执行后端提交调用，返回可等待对象"""
+        if backend == BACKEND_PROCESS:
+            return self.worker_pool.call(plan.filepath, plan.version, query, plan.config, progress)
+        args = plan.build_args(query, plan.config, db_manager, progress)
+        if backend == BACKEND_ASYNC:
+            if plan.is_stream:
+                # 异步生成器函数调用后直接返回生成器
+                return _ready(plan.func(*args))
+            return plan.func(*args)
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._get_thread_pool(), functools.partial(plan.func, *args))
+
+    async def run(self, plan, query: Any, db_manager=None, progress=None, timeout: Optional[float] = None,
+                  backend: Optional[str] = None) -> Any:
+        """
+        执行扩展查询
+
+        Args:
+            plan: 扩展调用计划
+            query: 查询参数
+            db_manager: 数据库管理器（进程池执行时不可用）
+            progress: 进度回调（线程安全），后台任务使用
+            timeout: 超时时间(秒)，默认使用扩展的超时时间
+            backend: 执行后端，默认使用扩展声明的后端（后台任务可指定工作进程池）
+
+        Returns:
+            扩展返回结果
+        """
+        timeout = timeout or plan.timeout
+        backend = backend or plan.backend
+        metrics = self._get_metrics(plan.name)
+        semaphore = self._get_limit(plan.name, plan.max_concurrency)
+
+        plan.inflight += 1
+        try:
+            metrics.queued += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                metrics.queued -= 1
+
+            metrics.running += 1
+            start = time.perf_counter()
+            try:
+                # 线程中的调用超时后无法强制终止，只是不再等待其结果；工作进程会被终止
+                result = await asyncio.wait_for(self._submit(plan, query, db_manager, progress, backend), timeout=timeout)
+                metrics.completed += 1
+                return result
+            except asyncio.TimeoutError:
+                metrics.timeouts += 1
+                metrics.failed += 1
+                logger.warning(f"扩展 {plan.name} 执行超时({timeout}秒)")
+                raise ExtensionTimeoutError(f"执行超时({timeout}秒)")
+            except Exception:
+                metrics.failed += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.running -= 1
+                metrics.total_time += elapsed
+                metrics.max_time = max(metrics.max_time, elapsed)
+                semaphore.release()
+        finally:
+            plan.inflight -= 1
+
+    async def iterate(self, plan, result: Any, timeout: Optional[float] = None) -> AsyncIterator[Any]:
+        """
+        逐块读取扩展返回的生成器（流式响应）
+
+        同步生成器的每一块在线程池中生成，避免阻塞事件循环；每块的等待时间不超过扩展超时时间。
+        输出期间占用扩展的并发名额，客户端断开时关闭生成器。
+
+        Args:
+            plan: 扩展调用计划
+            result: 扩展返回的生成器或异步生成器
+            timeout: 每块的超时时间(秒)，默认使用扩展的超时时间
+
+        Yields:
+            扩展生成的数据块
+        """
+        timeout = timeout or plan.timeout
+        metrics = self._get_metrics(plan.name)
+        semaphore = self._get_limit(plan.name, plan.max_concurrency)
+        plan.inflight += 1
+        metrics.streaming += 1
+        try:
+            async with semaphore:
+                if inspect.isasyncgen(result):
+                    while True:
+                        try:
+                            item = await asyncio.wait_for(result.__anext__(), timeout=timeout)
+                        except StopAsyncIteration:
+                            break
+                        yield item
+                else:
+                    loop = asyncio.get_running_loop()
+                    pool = self._get_thread_pool()
+                    while True:
+                        item = await asyncio.wait_for(
+                            loop.run_in_executor(pool, next, result, _STREAM_END), timeout=timeout
+                        )
+                        if item is _STREAM_END:
+                            break
+                        yield item
+        except asyncio.TimeoutError:
+            metrics.timeouts += 1
+            logger.warning(f"扩展 {plan.name} 流式输出超时({timeout}秒)")
+            raise ExtensionTimeoutError(f"执行超时({timeout}秒)")
+        finally:
+            metrics.streaming -= 1
+            plan.inflight -= 1
+            try:
+                if inspect.isasyncgen(result):
+                    await result.aclose()
+                else:
+                    result.close()
+            except (RuntimeError, ValueError):
+                # 超时后生成器仍在线程中执行，无法关闭
+                pass
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取执行器指标"""
+        return {
+            "thread_workers": settings.EXTENSION_THREAD_WORKERS,
+            "process_workers": settings.EXTENSION_PROCESS_WORKERS,
+            "thread_pool_queue": self._thread_pool._work_queue.qsize() if self._thread_pool else 0,
+            "worker_pool": self.worker_pool.get_metrics(),
+            "extensions": {name: m.to_dict() for name, m in self._metrics.items()},
+        }
+
+    async def start_workers(self, preload: List[Tuple[str, Optional[int]]]) -> None:
+        """启动扩展工作进程池并预加载扩展"""
+        await self.worker_pool.start(preload)
+
+    def shutdown(self) -> None:
+        """关闭线程池和工作进程池"""
+        with self._pool_lock:
+            if self._thread_pool:
+                self._thread_pool.shutdown(wait=False, cancel_futures=True)
+                self._thread_pool = None
+        self.worker_pool.shutdown()
+
+
+extension_executor = ExtensionExecutor()
@@ -0,0 +1,317 @@
+"""
+扩展后台任务
+
+耗时较长的扩展查询可以以后台任务方式提交（POST /query/{extension_id}?mode=job），请求立即返回任务ID，
+查询不再占用HTTP连接，也不会因代理超时中断：
+- 任务在扩展工作进程池中执行，取消或超时时直接终止工作进程；
+  生成器扩展和需要 db_manager 的扩展无法跨进程，仍使用扩展自身的执行后端
+- 扩展在 execute_query 中声明 progress 参数即可上报进度：progress(百分比, 说明)
+- 任务状态变化和进度通过全局WebSocket（global_ws_manager）推送给提交任务的用户，也可以轮询任务接口
+- 结果写入 EXTENSION_JOB_DIR（普通结果为JSON，生成器结果分批写为NDJSON），保留 EXTENSION_JOB_RESULT_TTL 秒
+- 任务可以取消；每个用户同时运行的任务数不超过 EXTENSION_JOB_MAX_PER_USER。
+  线程中的调用无法强制终止，取消后任务处于 cancelling 状态并继续计入运行中的任务，直到调用真正结束
+任务信息只保存在内存中，服务重启后未完成的任务丢失，遗留的结果文件到期后清理。
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+
+from config import settings
+from core.extension_executor import extension_executor, BACKEND_PROCESS, BACKEND_THREAD
+from core.extension_streaming import is_stream_result
+from core.extension_uploads import UploadedFile, close_files
+from core.global_websocket_manager import global_ws_manager, MessageType
+from core.logger import get_logger
+
+logger = get_logger("extension_jobs")
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_CANCELLING = "cancelling"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+# 结果格式
+RESULT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+# 进度推送的最小间隔(秒)
+PROGRESS_NOTIFY_INTERVAL = 0.5
+# 清理过期任务的最小间隔(秒)
+PURGE_INTERVAL = 60
+# 生成器结果每批写入的条数
+RESULT_WRITE_BATCH = 100
+
+
+class ExtensionJobLimitError(Exception):
+    """用户同时运行的任务数超过上限"""
+    pass
+
+
+class ExtensionJob:
+    """扩展后台任务"""
+
+    def __init__(self, extension_id: str, user_id: int, backend: str,
+                 files: Optional[Dict[str, UploadedFile]] = None):
+        self.id = uuid.uuid4().hex
+        self.extension_id = extension_id
+        self.user_id = user_id
+        self.backend = backend
+        self.status = JOB_PENDING
+        self.progress = 0.0
+        self.message: Optional[str] = None
+        self.error: Optional[str] = None
+        self.result_format: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.files = files or {}
+        self.task: Optional[asyncio.Task] = None
+        self._last_notified = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in JOB_FINISHED_STATES
+
+    @property
+    def result_path(self) -> Optional[str]:
+        if self.result_format is None:
+            return None
+        return os.path.join(settings.EXTENSION_JOB_DIR, f"{self.id}.{self.result_format}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "extension_id": self.extension_id,
+            "backend": self.backend,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": self.error,
+            "result_format": self.result_format,
+            "has_result": self.status == JOB_SUCCEEDED,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _write_json(path: str, result: Any) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(jsonable_encoder(result), f, ensure_ascii=False, default=str)
+
+
+def _truncate(path: str) -> None:
+    open(path, "w", encoding="utf-8").close()
+
+
+def _append_ndjson(path: str, items: List[Any]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(jsonable_encoder(item), ensure_ascii=False, default=str) + "\n")
+
+
+def job_backend(plan) -> str:
+    """后台任务的执行后端：能跨进程的扩展使用工作进程池，以便取消时终止"""
+    if plan.is_stream or plan.uses_db_manager or not plan.filepath:
+        return plan.backend
+    return BACKEND_PROCESS
+
+
+def _remove(path: Optional[str]) -> None:
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ExtensionJobManager:
+    """扩展后台任务管理器"""
+
+    def __init__(self):
+        self._jobs: Dict[str, ExtensionJob] = {}
+        self._notify_tasks: Set[asyncio.Task] = set()
+        self._last_purge = 0.0
+
+    def get(self, job_id: str) -> Optional[ExtensionJob]:
+        self.purge_expired()
+        return self._jobs.get(job_id)
+
+    def list_jobs(self, user_id: Optional[int] = None) -> List[ExtensionJob]:
+        """列出任务（指定用户时只列出该用户的任务），按创建时间倒序"""
+        self.purge_expired()
+        jobs = [job for job in self._jobs.values() if user_id is None or job.user_id == user_id]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def active_count(self, user_id: int) -> int:
+        return sum(1 for job in self._jobs.values() if job.user_id == user_id and not job.finished)
+
+    def submit(self, extension_id: str, user_id: int, plan, query: Any, db_manager=None,
+               files: Optional[Dict[str, UploadedFile]] = None) -> ExtensionJob:
+        """
+        提交后台任务
+
+        Args:
+            extension_id: 扩展ID
+            user_id: 提交任务的用户ID
+            plan: 扩展调用计划
+            query: 查询参数
+            db_manager: 数据库管理器
+            files: 已脱离请求的上传文件，任务结束后关闭
+
+        Returns:
+            任务对象
+        """
+        self.purge_expired()
+        if self.active_count(user_id) >= settings.EXTENSION_JOB_MAX_PER_USER:
+            raise ExtensionJobLimitError(f"同时运行的任务数已达上限({settings.EXTENSION_JOB_MAX_PER_USER})")
+        job = ExtensionJob(extension_id, user_id, job_backend(plan), files)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, plan, query, db_manager))
+        logger.info(f"用户 {user_id} 提交扩展 {extension_id} 后台任务 {job.id}")
+        return job
+
+    def cancel(self, job: ExtensionJob) -> bool:
+        """取消任务，已结束的任务返回False"""
+        if job.finished or job.task is None:
+            return False
+        if job.status == JOB_PENDING:
+            # 任务尚未开始执行，直接结束
+            job.task.cancel()
+            self._finish(job, JOB_CANCELLED)
+        elif job.backend == BACKEND_THREAD:
+            # 线程中的调用无法强制终止：标记为取消中，调用结束（或流式结果的下一块）后丢弃结果
+            if job.status != JOB_CANCELLING:
+                job.status = JOB_CANCELLING
+                self._notify(job)
+        else:
+            job.task.cancel()
+        return True
+
+    async def _run(self, job: ExtensionJob, plan, query: Any, db_manager) -> None:
+        loop = asyncio.get_running_loop()
+
+        def progress(percent: float, message: Optional[str] = None) -> None:
+            # 扩展可能在线程池或工作进程的等待线程中调用
+            loop.call_soon_threadsafe(self._report, job, percent, message)
+
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        self._notify(job)
+        timeout = settings.EXTENSION_JOB_TIMEOUT
+        status = JOB_SUCCEEDED
+        try:
+            os.makedirs(settings.EXTENSION_JOB_DIR, exist_ok=True)
+            result = await extension_executor.run(plan, query, db_manager, progress, timeout=timeout,
+                                                  backend=job.backend)
+            self._check_cancelled(job)
+            if is_stream_result(result):
+                job.result_format = "ndjson"
+                await asyncio.to_thread(_truncate, job.result_path)
+                batch: List[Any] = []
+                async for item in extension_executor.iterate(plan, result, timeout=timeout):
+                    self._check_cancelled(job)
+                    batch.append(item)
+                    if len(batch) >= RESULT_WRITE_BATCH:
+                        await asyncio.to_thread(_append_ndjson, job.result_path, batch)
+                        batch = []
+                if batch:
+                    await asyncio.to_thread(_append_ndjson, job.result_path, batch)
+            else:
+                job.result_format = "json"
+                await asyncio.to_thread(_write_json, job.result_path, result)
+            job.progress = 100.0
+        except asyncio.CancelledError:
+            status = JOB_CANCELLED
+            logger.info(f"扩展后台任务 {job.id} 已取消")
+        except Exception as e:
+            if job.status == JOB_CANCELLING:
+                status = JOB_CANCELLED
+                logger.info(f"扩展后台任务 {job.id} 已取消")
+            else:
+                status = JOB_FAILED
+                job.error = str(e)
+                logger.error(f"扩展后台任务 {job.id} 执行失败: {e}")
+        finally:
+            self._finish(job, status)
+
+    @staticmethod
+    def _check_cancelled(job: ExtensionJob) -> None:
+        """线程后端的任务在调用结束后检查是否已请求取消"""
+        if job.status == JOB_CANCELLING:
+            raise asyncio.CancelledError()
+
+    def _finish(self, job: ExtensionJob, status: str) -> None:
+        if job.finished:
+            return
+        job.status = status
+        if status != JOB_SUCCEEDED:
+            _remove(job.result_path)
+            job.result_format = None
+        job.finished_at = time.time()
+        close_files(job.files)
+        job.files = {}
+        job.task = None
+        self._notify(job)
+
+    def _report(self, job: ExtensionJob, percent: float, message: Optional[str]) -> None:
+        """记录扩展上报的进度，按间隔推送"""
+        if job.finished:
+            return
+        try:
+            job.progress = max(0.0, min(100.0, float(percent)))
+        except (TypeError, ValueError):
+            return
+        if message is not None:
+            job.message = str(message)
+        if time.monotonic() - job._last_notified >= PROGRESS_NOTIFY_INTERVAL:
+            self._notify(job)
+
+    def _notify(self, job: ExtensionJob) -> None:
+        """通过全局WebSocket推送任务状态"""
+        job._last_notified = time.monotonic()
+        task = asyncio.create_task(
+            global_ws_manager.send_to_user(job.user_id, MessageType.EXTENSION_JOB_UPDATED, job.to_dict())
+        )
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    def purge_expired(self, force: bool = False) -> None:
+        """清理过期任务及其结果文件（包括服务重启前遗留的结果文件）"""
+        now = time.time()
+        if not force and now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        ttl = settings.EXTENSION_JOB_RESULT_TTL
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at + ttl < now:
+                _remove(job.result_path)
+                del self._jobs[job_id]
+        try:
+            with os.scandir(settings.EXTENSION_JOB_DIR) as entries:
+                for entry in entries:
+                    job_id = entry.name.split(".", 1)[0]
+                    if job_id not in self._jobs and entry.stat().st_mtime + ttl < now:
+                        _remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def shutdown(self) -> None:
+        """取消所有未完成的任务"""
+        for job in self._jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+
+
+extension_job_manager = ExtensionJobManager()
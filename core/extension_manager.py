@@ -1,19 +1,30 @@
+import asyncio
 import os
 import json
-from typing import Dict, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
 
 # from engineio.static_files import content_types
 from datetime import datetime
 from fastapi import FastAPI, HTTPException, status, UploadFile, Request
+from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from fastapi.routing import APIRoute
+from starlette.datastructures import UploadFile as FormFile
 from sqlalchemy import select
 
 from models.extension import Extension
 from schemas.extension import ExtensionUpdate
 
 from core.logger import get_logger
-from core.sandbox import load_module_in_sandbox, execute_query_in_sandbox, SandboxException
+from core.sandbox import load_module_in_sandbox, scan_module_file, compile_call_plan, execute_call_plan, is_query_error, SandboxException
+from core.extension_cache import ExtensionResultCache
+from core.extension_executor import extension_executor, BACKEND_PROCESS
+from core.extension_watcher import ExtensionWatcher
+from core.extension_uploads import UploadedFile, close_files, describe_files
+from core.extension_streaming import is_stream_result, build_stream_response, close_stream_result
+from core.extension_jobs import extension_job_manager, ExtensionJobLimitError
+from core.auth import get_current_user_from_token
 from sqlalchemy.ext.asyncio import AsyncSession
 from config import settings
 from api.v1.endpoints.database import db_manager
@@ -21,6 +32,20 @@ from api.v1.endpoints.database import db_manager
 logger = get_logger("extension")
 
 
+def _import_extension(filepath: str, lazy: bool = False) -> Tuple[Any, float, Optional[str]]:
+    """
+    导入扩展模块（在线程池中执行），返回 (模块或静态分析结果, 耗时, 错误信息)
+
+    懒加载模式下只做静态分析，不执行扩展代码
+    """
+    start = time.perf_counter()
+    try:
+        loaded = scan_module_file(filepath) if lazy else load_module_in_sandbox(filepath)
+        return loaded, time.perf_counter() - start, None
+    except Exception as e:
+        return None, time.perf_counter() - start, str(e)
+
+
 class ExtensionManager:
     """
     扩展管理器类
@@ -41,40 +66,30 @@ class ExtensionManager:
         self.app = app
         # self.db_session_maker = db_session_maker  # 传入会话工厂
         self.loaded_extensions: Dict[str, dict] = {}
+        # 懒加载时每个扩展的导入锁，避免并发的首次请求重复导入
+        self._import_locks: Dict[str, asyncio.Lock] = {}
         self.file_manager = None  # 文件管理器、不使用了，太罗嗦
+        # 扩展查询结果缓存（扩展声明 CACHE_TTL 或 get_cache_policy 时启用）
+        self.result_cache = ExtensionResultCache()
+        # 扩展文件监听（EXTENSION_HOT_RELOAD 开启时由应用启动）
+        self.watcher = ExtensionWatcher(self)
         # 额外的数据库，取决于api中的database
         self.db_manager = db_manager
         # 确保目录存在
         os.makedirs(settings.EXTENSIONS_DIR, exist_ok=True)
+        # 所有扩展共用一个查询路由，按扩展ID在 loaded_extensions 中分发，
+        # 启用、禁用和重新加载扩展都不修改路由表
+        self.app.add_api_route(
+            path=settings.EXTENSIONS_ENTRY_POINT_PREFIX + "{extension_id}",
+            endpoint=self.query_endpoint,
+            methods=["POST"],
+            response_model=Dict,
+            tags=["extensions"],
+            summary="Extension query endpoint",
+            response_description="Extension query result"
+        )
         logger.info(f"扩展管理器初始化完成。扩展目录: {settings.EXTENSIONS_DIR}")
 
-    def get_route_by_path(self, path: str) -> Optional[APIRoute]:
-        """
-        获取指定路径的路由对象
-
-        Args:
-            path: API路径
-
-        Returns:
-            路由对象，如果不存在则返回None
-        """
-        for route in self.app.routes:
-            if isinstance(route, APIRoute) and route.path == path:
-                return route
-        return None
-
-    def route_exists(self, path: str) -> bool:
-        """
-        检查路由是否已存在
-
-        Args:
-            path: API路径
-
-        Returns:
-            如果路由存在返回True，否则返回False
-        """
-        return self.get_route_by_path(path) is not None
-
     async def load_extension(self, extension_id: str, db: AsyncSession):
         """
         加载单个扩展
@@ -95,31 +110,10 @@ class ExtensionManager:
             # 使用沙箱加载模块
             module = load_module_in_sandbox(filepath)
 
-            # 记录扩展信息
-            self.loaded_extensions[extension_id] = {
-                "module": module,
-                "extension": jsonable_encoder(extension),
-                "has_config_form": hasattr(module, "get_config_form"),
-                "has_query_form": hasattr(module, "get_query_form")
-            }
-            extension.has_config_form = hasattr(module, "get_config_form")
-            extension.has_query_form = hasattr(module, "get_query_form")
-            if hasattr(module, "get_default_config") and extension.config is None:
-                extension.config = module.get_default_config()
+            self._apply_module_metadata(extension, module)
             await db.commit()
-            # 如果扩展启用，注册API路由
-            if extension.enabled:
-                logger.info(f"为扩展 {extension_id} 注册API端点: {extension.entry_point}")
-                self.app.add_api_route(
-                    path=extension.entry_point,
-                    endpoint=self.create_query_endpoint(module, extension_id),
-                    methods=["POST"],
-                    response_model=Dict,
-                    tags=["extensions"],
-                    summary=f"Extension endpoint for {extension.name}",
-                    response_description="Extension query result"
-                )
-                logger.debug(f"扩展 {extension_id} 的API端点注册成功")
+
+            self._register_module(extension_id, extension, module)
 
             logger.info(f"扩展 {extension_id} 加载完成")
             return self.loaded_extensions[extension_id]
@@ -130,120 +124,263 @@ class ExtensionManager:
         except Exception as e:
             logger.error(f"扩展 {extension_id} 加载失败: {str(e)}")
 
-    def create_query_endpoint(self, module, extension_id):
+    def _apply_module_metadata(self, extension: Extension, module) -> None:
+        """根据模块更新扩展的表单标记和默认配置"""
+        extension.has_config_form = hasattr(module, "get_config_form")
+        extension.has_query_form = hasattr(module, "get_query_form")
+        if hasattr(module, "get_default_config") and extension.config is None:
+            extension.config = module.get_default_config()
+
+    def _apply_scan_metadata(self, extension: Extension, scan: dict) -> None:
+        """根据静态分析结果更新扩展的表单标记"""
+        extension.has_config_form = "get_config_form" in scan["functions"]
+        extension.has_query_form = "get_query_form" in scan["functions"]
+
+    def _register_module(self, extension_id: str, extension: Extension, module=None, scan: Optional[dict] = None) -> dict:
         """
-        创建扩展的查询端点
+        记录已加载扩展的信息，调用计划在此一次性生成
+
+        懒加载模式下 module 为空，只登记静态分析结果，首次使用时再导入（见 get_module）
+        """
+        extension_data = jsonable_encoder(extension)
+        self.result_cache.invalidate(extension_id)
+        self.loaded_extensions[extension_id] = {
+            "module": None,
+            "extension": extension_data,
+            "filepath": os.path.join(settings.EXTENSIONS_DIR, f"{extension_id}.py"),
+            "scan": scan,
+            "plan": None,
+            "has_config_form": extension.has_config_form,
+            "has_query_form": extension.has_query_form
+        }
+        if module is not None:
+            self._compile_plan(extension_id, module)
+        return self.loaded_extensions[extension_id]
+
+    def _compile_plan(self, extension_id: str, module) -> None:
+        """为已导入的模块生成调用计划"""
+        loaded = self.loaded_extensions[extension_id]
+        plan = compile_call_plan(module, loaded["extension"].get("config"))
+        extension_executor.reset_limit(module.__name__)
+        loaded["plan"] = plan
+        loaded["has_config_form"] = hasattr(module, "get_config_form")
+        loaded["has_query_form"] = hasattr(module, "get_query_form")
+        loaded["module"] = module
+
+    async def get_module(self, extension_id: str):
+        """
+        获取扩展模块，懒加载的扩展在首次使用时导入并缓存
 
         Args:
-            module: 扩展模块
             extension_id: 扩展ID
 
         Returns:
-            查询端点函数
+            扩展模块
+        """
+        loaded = self.loaded_extensions.get(extension_id)
+        if loaded is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Extension not loaded")
+        if loaded["module"] is not None:
+            return loaded["module"]
+
+        lock = self._import_locks.setdefault(extension_id, asyncio.Lock())
+        async with lock:
+            if loaded["module"] is None:
+                start = time.perf_counter()
+                module = await asyncio.to_thread(load_module_in_sandbox, loaded["filepath"])
+                self._compile_plan(extension_id, module)
+                logger.info(f"首次使用时加载扩展 {extension_id}，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        return loaded["module"]
+
+    async def get_call_plan(self, extension_id: str):
+        """获取扩展调用计划（必要时先导入模块）"""
+        await self.get_module(extension_id)
+        return self.loaded_extensions[extension_id]["plan"]
+
+    @staticmethod
+    def _declared_backend(loaded: dict) -> Optional[str]:
+        """扩展的执行后端，未导入时使用静态分析得到的声明"""
+        if loaded["plan"] is not None:
+            return loaded["plan"].backend
+        return ((loaded.get("scan") or {}).get("constants") or {}).get("EXECUTION_BACKEND")
+
+    async def query_endpoint(self, extension_id: str, request: Request):
         """
+        扩展查询端点（所有扩展共用），支持表单和文件上传
 
-        # 修改路由接口，支持表单和文件上传
-        async def query_endpoint(request: Request):
-            logger.info(f"执行扩展查询: {extension_id}")
+        查询参数 mode=job 时以后台任务方式执行（需要登录），立即返回任务信息（见 core/extension_jobs.py）
 
-            try:
-                config = self.loaded_extensions[extension_id]["extension"].get("config")
-                # config=json.loads(json.dumps(config))
-                # try:
-                #     if config:
-                #         config = json.loads(config)  # 尝试解析 JSON 字符串
-                #     else:
-                #         config = {}
-                # except json.JSONDecodeError:
-                #     config = {}  # 如果解析失败，设为空字典
-                #
-                # 使用表单接收数据，包括文件
-                form = await request.form()
-                # 打印所有字段和类型
-
-                # 构建查询参数字典
-                query_params = {}
-                files = {}
-                # 统一处理所有表单字段
-                for key, value in form.multi_items():
-                    try:
-                        is_file = value.filename
-                    except AttributeError:
-                        is_file = False
-                    if is_file or isinstance(value, UploadFile):
-                        # 处理文件上传
-
-                        file_content = await value.read()
-                        await value.seek(0)  # 重置文件指针
-                        files[key] = {
-                            "filename": value.filename,
-                            "content_type": value.content_type,
-                            "content": file_content
-                        }
-                    else:
-                        # 处理普通表单字段
-                        query_params[key] = value
-
-                # 构建最终参数
-                params = {
-                    "query": query_params,
-                    "files": files if files else None,  # 如果没有文件就设为None
-                    "extension_id": extension_id
-                }
-                # 如果有文件管理器，传递给沙箱环境
-                if self.file_manager:
-                    params["file_manager"] = self.file_manager
-                    # params["logger"] = get_logger("extension")
-
-                logger.debug(f"查询参数: {str(params)[:1000]}...")  # 日志记录部分参数，避免过大
-                if self.db_manager:
-                    # 在沙箱中执行查询
-                    result = await execute_query_in_sandbox(module, params, config, db_manager=self.db_manager)
+        Args:
+            extension_id: 扩展ID（调用计划在每次请求时按ID获取，支持懒加载和重新加载）
+            request: 请求对象
+
+        Returns:
+            扩展查询结果
+        """
+        loaded = self.loaded_extensions.get(extension_id)
+        if loaded is None or not loaded["extension"].get("enabled"):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Extension not loaded")
+
+        logger.info(f"执行扩展查询: {extension_id}")
+
+        files = {}
+        try:
+            # 使用表单接收数据，包括文件
+            form = await request.form()
+
+            # 构建查询参数字典
+            query = {}
+            # 统一处理所有表单字段；上传文件已由表单解析写入临时文件，按句柄传给扩展，不整体读入内存
+            for key, value in form.multi_items():
+                if isinstance(value, FormFile):
+                    files[key] = UploadedFile(value)
                 else:
-                    # 在沙箱中执行查询
-                    result = await execute_query_in_sandbox(module, params, config)
-                logger.info(f"扩展 {extension_id} 查询成功完成")
-                return result
-
-            except SandboxException as e:
-                raise
-                logger.error(f"扩展 {extension_id} 查询执行失败(沙箱错误): {str(e)}")
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-            except Exception as e:
-                raise
-                logger.error(f"扩展 {extension_id} 查询执行失败: {str(e)}")
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+                    # 处理普通表单字段
+                    query[key] = value
+            if files:
+                query["files"] = files
+
+            # 日志只记录字段名和文件摘要，避免把参数整体转成字符串
+            logger.debug(f"查询参数: {[key for key in query if key != 'files']}，文件: {describe_files(files)}")
+            # 按调用计划执行查询，声明了缓存时间且不含文件的查询使用结果缓存，流式结果不缓存
+            plan = await self.get_call_plan(extension_id)
+            if request.query_params.get("mode") == "job":
+                return await self._submit_job(extension_id, request, plan, query, files)
+            if plan.cache_ttl and not plan.is_stream and not files:
+                result = await self.result_cache.get_or_execute(
+                    extension_id, query, plan.config, plan.cache_ttl,
+                    lambda: execute_call_plan(plan, query, db_manager=self.db_manager),
+                    cacheable=lambda r: not is_query_error(r) and not is_stream_result(r)
+                )
+            else:
+                result = await execute_call_plan(plan, query, db_manager=self.db_manager)
+            if is_stream_result(result):
+                # 生成器结果以流式响应返回，上传文件在输出结束后关闭
+                stream_files, files = files, {}
+
+                async def close_stream():
+                    # 响应未开始输出时执行器不会关闭生成器
+                    await close_stream_result(result)
+                    close_files(stream_files)
+
+                logger.info(f"扩展 {extension_id} 开始流式输出")
+                return build_stream_response(
+                    extension_id, extension_executor.iterate(plan, result),
+                    loaded["extension"].get("render_type"), request.headers.get("accept"),
+                    on_close=close_stream
+                )
+            logger.info(f"扩展 {extension_id} 查询成功完成")
+            return result
 
-        return query_endpoint
+        except SandboxException as e:
+            raise
+            logger.error(f"扩展 {extension_id} 查询执行失败(沙箱错误): {str(e)}")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except Exception as e:
+            raise
+            logger.error(f"扩展 {extension_id} 查询执行失败: {str(e)}")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        finally:
+            close_files(files)
+
+    async def _submit_job(self, extension_id: str, request: Request, plan, query: dict, files: dict) -> JSONResponse:
+        """以后台任务方式提交查询，上传文件复制为独立文件交给任务"""
+        authorization = request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        user = await get_current_user_from_token(token) if scheme.lower() == "bearer" and token else None
+        if user is None or not user.is_active:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="后台任务需要登录")
+
+        job_files = {}
+        for key, uploaded in files.items():
+            job_files[key] = await asyncio.to_thread(uploaded.detach)
+        if job_files:
+            query["files"] = job_files
+        try:
+            job = extension_job_manager.submit(extension_id, user.id, plan, query, self.db_manager, job_files)
+        except ExtensionJobLimitError as e:
+            close_files(job_files)
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.to_dict())
 
     async def load_all_extensions(self, db: AsyncSession):
-        """加载所有扩展"""
-        logger.info("开始加载所有扩展")
-        count = 0
-        for filename in os.listdir(settings.EXTENSIONS_DIR):
-            if filename.endswith(".py"):
-                extension_id = filename[:-3]
-                if await self.load_extension(extension_id, db):
-                    count += 1
-        logger.info(f"完成加载所有扩展，共 {count} 个")
-
-    def remove_route(self, path: str):
         """
-        移除路由
+        启动时加载所有扩展
 
-        Args:
-            path: 要移除的API路径
+        一次查询读取全部扩展记录，在线程池中并发导入模块，
+        元数据变更统一提交一次，并输出每个扩展的加载耗时。
         """
-        logger.info(f"移除API路由: {path}")
-        for i, route in enumerate(self.app.routes):
-            if hasattr(route, "path") and route.path == path:
-                self.app.routes.pop(i)
-                logger.debug(f"已从路由列表中移除: {path}")
-                break
+        start = time.perf_counter()
+        extension_ids = [f[:-3] for f in os.listdir(settings.EXTENSIONS_DIR) if f.endswith(".py")]
+        logger.info(f"开始加载所有扩展，共 {len(extension_ids)} 个文件")
+
+        extensions: Dict[str, Extension] = {}
+        if extension_ids:
+            result = await db.execute(select(Extension).where(Extension.id.in_(extension_ids)))
+            extensions = {extension.id: extension for extension in result.scalars().all()}
+        for extension_id in extension_ids:
+            if extension_id not in extensions:
+                logger.error(f"扩展配置不存在: {extension_id}")
+
+        # 并发导入模块；懒加载模式下只做静态分析，缺少默认配置的扩展仍需导入以生成配置
+        def is_lazy(extension: Extension) -> bool:
+            return settings.EXTENSION_LAZY_LOAD and extension.config is not None
+
+        imported = []
+        if extensions:
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(max_workers=min(8, len(extensions)), thread_name_prefix="extension-load") as pool:
+                imported = await asyncio.gather(*[
+                    loop.run_in_executor(
+                        pool, _import_extension,
+                        os.path.join(settings.EXTENSIONS_DIR, f"{extension_id}.py"),
+                        is_lazy(extension)
+                    )
+                    for extension_id, extension in extensions.items()
+                ])
+
+        timings = []
+        enabled = 0
+        for extension_id, (loaded, elapsed, error) in zip(extensions, imported):
+            extension = extensions[extension_id]
+            if error is None:
+                try:
+                    if is_lazy(extension):
+                        self._apply_scan_metadata(extension, loaded)
+                        self._register_module(extension_id, extension, scan=loaded)
+                    else:
+                        self._apply_module_metadata(extension, loaded)
+                        self._register_module(extension_id, extension, loaded)
+                except Exception as e:
+                    error = str(e)
+            if error is not None:
+                logger.error(f"扩展 {extension_id} 加载失败: {error}")
+                timings.append((extension_id, elapsed, "失败"))
+                continue
+            timings.append((extension_id, elapsed, "成功"))
+            if extension.enabled:
+                enabled += 1
+
+        await db.commit()
+
+        count = sum(1 for _, _, state in timings if state == "成功")
+        report = "\n".join(
+            f"  {extension_id:<40} {elapsed * 1000:>9.1f}ms  {state}"
+            for extension_id, elapsed, state in sorted(timings, key=lambda t: t[1], reverse=True)
+        )
+        logger.info(
+            f"完成加载所有扩展，成功 {count} 个，启用 {enabled} 个，"
+            f"总耗时 {time.perf_counter() - start:.2f}s\n{report}"
+        )
 
-        # 清除FastAPI内部路由缓存
-        self.app.openapi_schema = None
-        self.app.setup()
+        # 启动工作进程池，预加载启用的进程隔离扩展
+        preload = [
+            (item["filepath"], item["plan"].version if item["plan"] is not None else None)
+            for item in self.loaded_extensions.values()
+            if item["extension"].get("enabled") and self._declared_backend(item) == BACKEND_PROCESS
+        ]
+        if preload:
+            await extension_executor.start_workers(preload)
 
     async def update_extension(self, extension_id: str, updateExtension: ExtensionUpdate, db: AsyncSession):
         """
@@ -264,37 +401,85 @@ class ExtensionManager:
         update_data = updateExtension.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(extension, field, value)
-        if update_data.get("enabled") and not self.route_exists(settings.EXTENSIONS_ENTRY_POINT_PREFIX + extension_id):
-            # extension.entry_point=f"/query/{extension_id}"
-            # 如果扩展启用，注册API路由
-            logger.info(f"为扩展 {extension_id} 注册API端点: {extension.entry_point}")
-
-            # 使用沙箱加载模块
+        loaded = self.loaded_extensions.get(extension_id)
+        if extension.deleted == True:
+            self.loaded_extensions.pop(extension_id, None)
+            self.result_cache.invalidate(extension_id)
+        elif update_data.get("enabled") and not (loaded and loaded["extension"].get("enabled")):
+            # 扩展启用时从文件重新加载模块，查询路由按扩展ID分发，无需注册
+            logger.info(f"启用扩展 {extension_id}")
             filepath = os.path.join(settings.EXTENSIONS_DIR, f"{extension_id}.py")
-            module = load_module_in_sandbox(filepath)
-            self.app.add_api_route(
-                path=extension.entry_point,
-                endpoint=self.create_query_endpoint(module, extension_id),
-                methods=["POST"],
-                response_model=Dict,
-                tags=["extensions"],
-                summary=f"Extension endpoint for {extension.name}",
-                response_description="Extension query result"
-            )
-            logger.debug(f"扩展 {extension_id} 的API端点注册成功")
-        elif extension.deleted == True:
-            try:
-                self.remove_route(settings.EXTENSIONS_ENTRY_POINT_PREFIX + extension_id)
-                self.loaded_extensions.pop(extension_id)
-            except:
-                pass
+            module = await asyncio.to_thread(load_module_in_sandbox, filepath)
+            self._register_module(extension_id, extension, module)
 
         extension.updated_at = datetime.now()
         await db.commit()
         await db.refresh(extension)
+        loaded = self.loaded_extensions.get(extension_id)
+        if loaded:
+            loaded["extension"]["enabled"] = extension.enabled
+        if "config" in update_data:
+            self.refresh_call_plan(extension_id, extension.config)
         logger.info(f"已保存扩展配置到数据库: {extension_id}")
         return extension
 
+    def refresh_call_plan(self, extension_id: str, config: Optional[dict]):
+        """
+        扩展配置变更后刷新已加载扩展的配置和调用计划
+
+        Args:
+            extension_id: 扩展ID
+            config: 新配置
+        """
+        loaded = self.loaded_extensions.get(extension_id)
+        if not loaded:
+            return
+        loaded["extension"]["config"] = jsonable_encoder(config)
+        if loaded["plan"] is not None:
+            loaded["plan"].update_config(loaded["extension"]["config"])
+        self.result_cache.invalidate(extension_id)
+
+    async def reload_extension(self, extension_id: str) -> bool:
+        """
+        扩展文件变更后重新加载（热加载）
+
+        新模块导入并生成调用计划成功后才替换，失败时保留旧版本；
+        替换后等待旧版本正在执行的调用结束，再清除结果缓存，避免缓存旧版本的结果。
+
+        Args:
+            extension_id: 扩展ID
+
+        Returns:
+            是否重新加载成功
+        """
+        loaded = self.loaded_extensions.get(extension_id)
+        if loaded is None:
+            return False
+        start = time.perf_counter()
+        lock = self._import_locks.setdefault(extension_id, asyncio.Lock())
+        async with lock:
+            try:
+                if loaded["module"] is None:
+                    # 懒加载且尚未使用：只更新静态分析结果，首次使用时导入新文件
+                    loaded["scan"] = await asyncio.to_thread(scan_module_file, loaded["filepath"])
+                    logger.info(f"扩展 {extension_id} 文件已更新，将在首次使用时加载")
+                    return True
+                module = await asyncio.to_thread(load_module_in_sandbox, loaded["filepath"])
+                old_plan = loaded["plan"]
+                self._compile_plan(extension_id, module)
+            except Exception as e:
+                logger.error(f"扩展 {extension_id} 重新加载失败，继续使用旧版本: {e}")
+                return False
+        self.result_cache.invalidate(extension_id)
+
+        # 等待旧版本的调用结束（最长为其超时时间）
+        deadline = time.monotonic() + old_plan.timeout
+        while old_plan.inflight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self.result_cache.invalidate(extension_id)
+        logger.info(f"扩展 {extension_id} 已重新加载，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        return True
+
     async def list_extensions(self, db: AsyncSession):
         """
         获取所有扩展的列表
@@ -320,9 +505,9 @@ class ExtensionManager:
             extension.deleted = True
             await db.commit()
 
-            self.remove_route(f"/query/{extension_id}")
+            self.loaded_extensions.pop(extension_id, None)
+            self.result_cache.invalidate(extension_id)
             try:
-                self.loaded_extensions.pop(extension_id)
                 os.remove(os.path.join(settings.EXTENSIONS_DIR, f"{extension_id}.py"))
             except:
                 pass
@@ -361,7 +546,7 @@ class ExtensionManager:
         if not extension:
             logger.error(f"扩展配置不存在: {extension_id}")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Extension not loaded")
-        module = self.loaded_extensions[extension_id]["module"]
+        module = await self.get_module(extension_id)
         # 获取module的get_document方法
         docstring = module.__doc__ or "无详细说明"
         function_docs = {
@@ -387,7 +572,7 @@ class ExtensionManager:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Extension not loaded")
         if not extension.has_config_form:
             return None
-        module = self.loaded_extensions[extension_id]["module"]
+        module = await self.get_module(extension_id)
         config_form = module.get_config_form()
         return config_form
 
@@ -402,7 +587,7 @@ class ExtensionManager:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Extension not loaded")
         if not extension.has_query_form:
             return None
-        module = self.loaded_extensions[extension_id]["module"]
+        module = await self.get_module(extension_id)
         query_form = module.get_query_form()
         return query_form
 
@@ -418,4 +603,5 @@ class ExtensionManager:
         extension.config = config
         await db.commit()
         await db.refresh(extension)
+        self.refresh_call_plan(extension_id, extension.config)
         return extension
\ No newline at end of file
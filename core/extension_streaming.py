@@ -0,0 +1,160 @@
+"""
+扩展流式响应
+
+execute_query 可以返回生成器或异步生成器（或直接写成生成器函数），查询端点将其转换为 StreamingResponse，
+首批数据生成后立即发送给浏览器，服务端不需要在内存中构建完整结果。输出格式按扩展的渲染方式选择：
+    table       NDJSON，每行一个JSON对象（application/x-ndjson）
+    html / text 分块输出文本片段
+    chart       SSE，每个数据块一个 data 事件，结束时发送 end 事件，适合逐步渲染图表
+    其他        NDJSON
+请求头 Accept 为 text/event-stream 或 application/x-ndjson 时优先使用对应格式。
+流中途出错时无法再修改状态码，错误以当前格式的一条记录输出。
+无论正常结束、客户端在首块之前断开还是发送失败，响应结束时都会关闭生成器并释放并发名额。
+"""
+import html
+import inspect
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi.responses import StreamingResponse
+
+from core.logger import get_logger
+from core.sandbox import QUERY_ERROR_KEY
+
+logger = get_logger("extension_streaming")
+
+STREAM_NDJSON = "ndjson"
+STREAM_SSE = "sse"
+STREAM_HTML = "html"
+STREAM_TEXT = "text"
+
+_MEDIA_TYPES = {
+    STREAM_NDJSON: "application/x-ndjson",
+    STREAM_SSE: "text/event-stream",
+    STREAM_HTML: "text/html; charset=utf-8",
+    STREAM_TEXT: "text/plain; charset=utf-8",
+}
+
+
+def is_stream_result(result: Any) -> bool:
+    """判断扩展返回的是否为流式结果"""
+    return inspect.isgenerator(result) or inspect.isasyncgen(result)
+
+
+def choose_stream_format(render_type: Optional[str], accept: Optional[str] = None) -> str:
+    """根据请求头和扩展渲染方式选择流格式"""
+    accept = accept or ""
+    if "text/event-stream" in accept:
+        return STREAM_SSE
+    if "application/x-ndjson" in accept:
+        return STREAM_NDJSON
+    if render_type == "html":
+        return STREAM_HTML
+    if render_type == "text":
+        return STREAM_TEXT
+    if render_type == "chart":
+        return STREAM_SSE
+    return STREAM_NDJSON
+
+
+async def close_stream_result(result: Any) -> None:
+    """关闭扩展返回的生成器（已关闭或仍在线程中执行时忽略）"""
+    try:
+        if inspect.isasyncgen(result):
+            await result.aclose()
+        elif inspect.isgenerator(result):
+            result.close()
+    except (RuntimeError, ValueError):
+        pass
+
+
+def _dumps(item: Any) -> str:
+    return json.dumps(item, ensure_ascii=False, default=str)
+
+
+def _encode(fmt: str, item: Any) -> bytes:
+    """将一个数据块编码为对应格式"""
+    if isinstance(item, bytes) and fmt in (STREAM_HTML, STREAM_TEXT):
+        return item
+    if fmt == STREAM_SSE:
+        return f"data: {_dumps(item)}\n\n".encode("utf-8")
+    if fmt == STREAM_NDJSON:
+        return (_dumps(item) + "\n").encode("utf-8")
+    return (item if isinstance(item, str) else _dumps(item)).encode("utf-8")
+
+
+def _encode_error(fmt: str, message: str) -> bytes:
+    if fmt == STREAM_SSE:
+        return f"event: error\ndata: {_dumps({QUERY_ERROR_KEY: message})}\n\n".encode("utf-8")
+    if fmt == STREAM_NDJSON:
+        return (_dumps({QUERY_ERROR_KEY: message}) + "\n").encode("utf-8")
+    if fmt == STREAM_HTML:
+        return f'<div class="alert alert-danger">{QUERY_ERROR_KEY}: {html.escape(message)}</div>'.encode("utf-8")
+    return f"\n{QUERY_ERROR_KEY}: {message}\n".encode("utf-8")
+
+
+async def _body(fmt: str, items: AsyncIterator[Any], extension_id: str) -> AsyncIterator[bytes]:
+    count = 0
+    try:
+        async for item in items:
+            count += 1
+            yield _encode(fmt, item)
+    except Exception as e:
+        logger.error(f"扩展 {extension_id} 流式输出失败(已输出 {count} 块): {e}")
+        yield _encode_error(fmt, str(e))
+        return
+    if fmt == STREAM_SSE:
+        yield b"event: end\ndata: {}\n\n"
+    logger.info(f"扩展 {extension_id} 流式输出完成，共 {count} 块")
+
+
+class ExtensionStreamingResponse(StreamingResponse):
+    """
+    扩展流式响应
+
+    Starlette 在客户端断开时不执行 background，也不关闭响应体迭代器，
+    这里在 __call__ 结束时（包括异常和取消）总是执行清理。
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], cleanup: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self._cleanup = cleanup
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._cleanup()
+
+
+def build_stream_response(extension_id: str, items: AsyncIterator[Any], render_type: Optional[str],
+                          accept: Optional[str] = None,
+                          on_close: Optional[Callable[[], Awaitable[None]]] = None) -> StreamingResponse:
+    """
+    将扩展的流式结果包装为 StreamingResponse
+
+    Args:
+        extension_id: 扩展ID
+        items: 扩展结果的异步迭代器（见 ExtensionExecutor.iterate）
+        render_type: 扩展渲染方式
+        accept: 请求头 Accept
+        on_close: 响应结束（包括客户端断开）后的异步清理回调，如关闭扩展生成器和上传文件
+
+    Returns:
+        流式响应
+    """
+    fmt = choose_stream_format(render_type, accept)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    body = _body(fmt, items, extension_id)
+
+    async def cleanup() -> None:
+        # 先关闭响应体，再关闭执行器迭代器（释放并发名额和指标计数）
+        try:
+            await body.aclose()
+            await items.aclose()
+        except Exception as e:
+            logger.warning(f"扩展 {extension_id} 关闭流式输出失败: {e}")
+        if on_close is not None:
+            await on_close()
+
+    return ExtensionStreamingResponse(body, cleanup, media_type=_MEDIA_TYPES[fmt], headers=headers)
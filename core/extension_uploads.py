@@ -0,0 +1,173 @@
+"""
+扩展上传文件
+
+查询请求中的上传文件以 UploadedFile 传给扩展（params["files"][字段名]），不再整体读入内存。
+multipart 解析时文件已写入临时文件（超过1MB落盘），扩展可按需选择读取方式：
+    file          底层二进制文件对象，适合流式读取（如 csv / pandas 直接读取）
+    path          磁盘上的文件路径，适合 mmap 或只接受路径的库
+    chunks()      同步分块迭代
+    iter_chunks() 异步分块迭代（异步扩展）
+    content       一次读入全部字节（兼容旧写法 file_info["content"]），
+                  只允许不超过 EXTENSION_UPLOAD_BYTES_LIMIT_MB 的文件
+进程隔离的扩展收到的是只包含路径的副本，在工作进程中按路径打开。
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, Optional
+
+from config import settings
+
+# 默认分块大小
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadedFile:
+    """传给扩展的上传文件"""
+
+    def __init__(self, upload=None, filename: Optional[str] = None, content_type: Optional[str] = None,
+                 size: Optional[int] = None, path: Optional[str] = None):
+        self._upload = upload
+        self._path = path
+        self._owns_path = False
+        self._handle: Optional[BinaryIO] = None
+        self._content: Optional[bytes] = None
+        self.filename = filename if filename is not None else getattr(upload, "filename", None)
+        self.content_type = content_type if content_type is not None else getattr(upload, "content_type", None)
+        self.size = size if size is not None else self._detect_size()
+
+    def _detect_size(self) -> int:
+        if self._upload is not None:
+            if self._upload.size is not None:
+                return self._upload.size
+            f = self._upload.file
+            position = f.tell()
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(position)
+            return size
+        return os.path.getsize(self._path) if self._path else 0
+
+    @property
+    def file(self) -> BinaryIO:
+        """二进制文件对象（已定位到开头）"""
+        if self._upload is not None:
+            f = self._upload.file
+        else:
+            if self._handle is None:
+                self._handle = open(self._path, "rb")
+            f = self._handle
+        f.seek(0)
+        return f
+
+    @property
+    def path(self) -> str:
+        """文件在磁盘上的路径，首次访问时从上传临时文件复制"""
+        if self._path is None:
+            suffix = os.path.splitext(self.filename or "")[1]
+            fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(self.file, out, CHUNK_SIZE)
+            self._path = path
+            self._owns_path = True
+        return self._path
+
+    @property
+    def content(self) -> bytes:
+        """全部文件内容（仅限小文件）"""
+        if self._content is None:
+            limit = settings.EXTENSION_UPLOAD_BYTES_LIMIT_MB * 1024 * 1024
+            if self.size > limit:
+                raise ValueError(
+                    f"文件 {self.filename} 大小 {self.size} 字节超过 {settings.EXTENSION_UPLOAD_BYTES_LIMIT_MB}MB，"
+                    f"请使用 file、path 或 chunks() 读取"
+                )
+            self._content = self.file.read()
+        return self._content
+
+    def read(self) -> bytes:
+        return self.content
+
+    def chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """同步分块读取"""
+        f = self.file
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    async def iter_chunks(self, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """异步分块读取（磁盘读取在线程中执行）"""
+        if self._upload is not None:
+            await self._upload.seek(0)
+            while True:
+                chunk = await self._upload.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            f = await asyncio.to_thread(open, self._path, "rb")
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(f.read, chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                f.close()
+
+    # 兼容旧的字典写法：file_info["filename"] / file_info["content"]
+    def __getitem__(self, key: str) -> Any:
+        if key in ("filename", "content_type", "content", "size", "path"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key in ("filename", "content_type", "content", "size", "path")
+
+    def __reduce__(self):
+        # 跨进程传递时只传路径
+        return UploadedFile, (None, self.filename, self.content_type, self.size, self.path)
+
+    def __repr__(self) -> str:
+        return f"UploadedFile(filename={self.filename!r}, content_type={self.content_type!r}, size={self.size})"
+
+    def detach(self) -> "UploadedFile":
+        """复制为不依赖当前请求的文件（后台任务使用），临时文件由返回的对象负责删除"""
+        detached = UploadedFile(None, self.filename, self.content_type, self.size, self.path)
+        detached._owns_path = self._owns_path
+        self._owns_path = False
+        return detached
+
+    def close(self) -> None:
+        """关闭文件并删除复制出的临时文件"""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        self._content = None
+        if self._owns_path and self._path:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+            self._owns_path = False
+
+
+def close_files(files: Dict[str, UploadedFile]) -> None:
+    """关闭请求中的全部上传文件"""
+    for uploaded in files.values():
+        uploaded.close()
+
+
+def describe_files(files: Dict[str, UploadedFile]) -> Dict[str, str]:
+    """用于日志的文件摘要"""
+    return {key: f"{f.filename} ({f.size} bytes)" for key, f in files.items()}
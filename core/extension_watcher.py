@@ -0,0 +1,125 @@
+"""
+扩展文件监听
+
+开启 EXTENSION_HOT_RELOAD 后监听扩展目录，已加载的扩展文件发生变化时在后台重新加载：
+新模块导入并生成调用计划成功后才替换 loaded_extensions 中的模块，失败时保留旧版本继续服务。
+已安装 watchfiles 时使用系统文件事件（inotify 等），否则按 EXTENSION_WATCH_INTERVAL 轮询文件修改时间。
+"""
+import asyncio
+import os
+from typing import Dict, Optional, Set, Tuple
+
+from config import settings
+from core.logger import get_logger
+
+try:
+    from watchfiles import awatch
+except ImportError:
+    awatch = None
+
+logger = get_logger("extension_watcher")
+
+
+def _snapshot(directory: str) -> Dict[str, Tuple[int, int]]:
+    """扩展目录中所有扩展文件的 (修改时间, 大小)"""
+    result = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".py"):
+                    stat = entry.stat()
+                    result[entry.name[:-3]] = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        pass
+    return result
+
+
+class ExtensionWatcher:
+    """扩展文件监听器"""
+
+    def __init__(self, extension_manager):
+        self.extension_manager = extension_manager
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self.reloaded = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """启动后台监听任务"""
+        if self.running:
+            return
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        mode = "watchfiles" if awatch is not None else f"轮询({settings.EXTENSION_WATCH_INTERVAL}秒)"
+        logger.info(f"扩展热加载已启动，监听目录: {settings.EXTENSIONS_DIR}，方式: {mode}")
+
+    async def stop(self) -> None:
+        """停止监听"""
+        if not self.running:
+            return
+        self._stop_event.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        try:
+            if awatch is not None:
+                await self._watch_events()
+            else:
+                await self._watch_polling()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"扩展文件监听异常退出: {e}")
+
+    async def _watch_events(self) -> None:
+        """使用文件系统事件监听（watchfiles 自带防抖）"""
+        async for changes in awatch(settings.EXTENSIONS_DIR, stop_event=self._stop_event):
+            changed = {
+                os.path.basename(path)[:-3] for _, path in changes
+                if path.endswith(".py") and os.path.exists(path)
+            }
+            await self._reload(changed)
+
+    async def _watch_polling(self) -> None:
+        """轮询文件修改时间；文件在连续两次轮询间保持不变后才重新加载，避免读到写了一半的文件"""
+        interval = settings.EXTENSION_WATCH_INTERVAL
+        previous = await asyncio.to_thread(_snapshot, settings.EXTENSIONS_DIR)
+        pending: Set[str] = set()
+        while True:
+            await asyncio.sleep(interval)
+            current = await asyncio.to_thread(_snapshot, settings.EXTENSIONS_DIR)
+            changed = {
+                extension_id for extension_id, state in current.items()
+                if previous.get(extension_id) not in (None, state)
+            }
+            ready = {extension_id for extension_id in pending - changed if extension_id in current}
+            pending = changed
+            previous = current
+            await self._reload(ready)
+
+    async def _reload(self, extension_ids: Set[str]) -> None:
+        """重新加载已加载的扩展，新增的扩展文件仍通过上传接口注册"""
+        for extension_id in extension_ids:
+            if extension_id not in self.extension_manager.loaded_extensions:
+                continue
+            if await self.extension_manager.reload_extension(extension_id):
+                self.reloaded += 1
+            else:
+                self.failed += 1
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "running": self.running,
+            "mode": "watchfiles" if awatch is not None else "polling",
+            "reloaded": self.reloaded,
+            "failed": self.failed,
+        }
@@ -0,0 +1,295 @@
+"""
+扩展工作进程池
+
+常驻的扩展工作进程，启动时预加载启用的扩展模块，通过管道接收调用请求，
+请求和结果使用 pickle 二进制协议传输。扩展代码运行在独立进程中：
+- 调用超时或请求取消时直接终止该进程并补充新进程
+- 进程执行次数达到 EXTENSION_WORKER_MAX_CALLS 或内存(RSS)超过 EXTENSION_WORKER_MAX_RSS_MB 后回收重建
+这样单个扩展的内存泄漏或CPU占用不会影响主进程，也能利用多核。
+"""
+import asyncio
+import multiprocessing
+import pickle
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from core.logger import get_logger
+
+logger = get_logger("extension_workers")
+
+
+class WorkerCrashedError(Exception):
+    """工作进程异常退出"""
+    pass
+
+
+def _dumps(obj: Any) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _get_rss() -> int:
+    """当前进程的常驻内存(字节)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+def _load_module(modules: Dict[str, Tuple[Optional[int], Any]], filepath: str, version: Optional[int]) -> Any:
+    """加载扩展模块，只在主进程传来的版本变化时重新加载
+
+    版本由扩展管理器在新版本通过校验后更新，热加载失败时版本不变，
+    工作进程继续使用已加载的旧模块，不会自行导入未通过校验的文件
+    """
+    from core.sandbox import load_module_in_sandbox
+
+    cached = modules.get(filepath)
+    if cached and cached[0] == version:
+        return cached[1]
+    module = load_module_in_sandbox(filepath)
+    modules[filepath] = (version, module)
+    return module
+
+
+def _call_extension(modules: Dict[str, Tuple[Optional[int], Any]], filepath: str, version: Optional[int],
+                    query: Any, config: Optional[Dict], progress: Optional[Callable[..., None]] = None) -> Any:
+    """在工作进程中执行扩展查询"""
+    from core.sandbox import CallPlan
+
+    plan = CallPlan(_load_module(modules, filepath, version), config)
+    # 数据库管理器无法跨进程传递
+    args = plan.build_args(query, config, None, progress)
+    if plan.is_async:
+        return asyncio.run(plan.func(*args))
+    return plan.func(*args)
+
+
+def _worker_main(conn, preload: List[Tuple[str, Optional[int]]]) -> None:
+    """工作进程主循环
+
+    预加载: [(文件路径, 模块版本)]
+    请求: (文件路径, 模块版本, 查询参数, 配置, 是否上报进度)，None 表示退出
+    响应: (是否成功, 结果或错误信息, 当前RSS)；执行过程中的进度消息为 (None, (百分比, 说明), None)
+    """
+    modules: Dict[str, Tuple[Optional[int], Any]] = {}
+    for filepath, version in preload:
+        try:
+            _load_module(modules, filepath, version)
+        except Exception as e:
+            logger.warning(f"工作进程预加载扩展失败 {filepath}: {e}")
+
+    while True:
+        try:
+            request = pickle.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        filepath, version, query, config, report = request
+        progress = None
+        if report:
+            def progress(percent: float, message: Optional[str] = None) -> None:
+                conn.send_bytes(_dumps((None, (percent, message), None)))
+        try:
+            result = _call_extension(modules, filepath, version, query, config, progress)
+            payload = _dumps((True, result, _get_rss()))
+        except Exception as e:
+            # 执行失败或结果无法序列化
+            payload = _dumps((False, f"{type(e).__name__}: {e}", _get_rss()))
+        conn.send_bytes(payload)
+    conn.close()
+
+
+class ExtensionWorker:
+    """单个工作进程"""
+
+    def __init__(self, ctx, preload: List[Tuple[str, Optional[int]]]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, preload),
+            name="extension-worker", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.calls = 0
+        self.rss = 0
+        self.started_at = time.time()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    def call(self, filepath: str, version: Optional[int], query: Any, config: Optional[Dict],
+             progress: Optional[Callable[..., None]] = None) -> Tuple[bool, Any]:
+        """发送请求并等待结果（阻塞，在线程中调用）"""
+        try:
+            self.conn.send_bytes(_dumps((filepath, version, query, config, progress is not None)))
+            while True:
+                ok, value, rss = pickle.loads(self.conn.recv_bytes())
+                if ok is not None:
+                    break
+                progress(*value)
+        except (EOFError, OSError) as e:
+            raise WorkerCrashedError(f"扩展工作进程异常退出(exitcode={self.process.exitcode}): {e}")
+        self.calls += 1
+        self.rss = rss
+        return ok, value
+
+    def stop(self) -> None:
+        """通知进程退出"""
+        try:
+            self.conn.send_bytes(_dumps(None))
+        except (EOFError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+    def kill(self) -> None:
+        """立即终止进程"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ExtensionWorkerPool:
+    """常驻扩展工作进程池"""
+
+    def __init__(self):
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers: Set[ExtensionWorker] = set()
+        self._idle: Optional[asyncio.Queue] = None
+        self._preload: List[Tuple[str, Optional[int]]] = []
+        self._spawn_tasks: Set[asyncio.Task] = set()
+        self._start_lock: Optional[asyncio.Lock] = None
+        self.recycled = 0
+        self.killed = 0
+        self.crashed = 0
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    def _spawn(self) -> ExtensionWorker:
+        worker = ExtensionWorker(self._ctx, self._preload)
+        self._workers.add(worker)
+        return worker
+
+    async def start(self, preload: Optional[List[Tuple[str, Optional[int]]]] = None) -> None:
+        """
+        启动工作进程并预加载扩展
+
+        Args:
+            preload: 需要预加载的扩展 [(文件路径, 模块版本)]
+        """
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if preload is not None:
+                self._preload = list(preload)
+            if self.started:
+                return
+            idle = asyncio.Queue()
+            for _ in range(settings.EXTENSION_PROCESS_WORKERS):
+                idle.put_nowait(await asyncio.to_thread(self._spawn))
+            self._idle = idle
+            logger.info(f"扩展工作进程池已启动: {settings.EXTENSION_PROCESS_WORKERS} 个进程，预加载 {len(self._preload)} 个扩展")
+
+    def _retire(self, worker: ExtensionWorker, kill: bool = False) -> None:
+        """移除进程并在后台补充新进程"""
+        self._workers.discard(worker)
+        if kill:
+            worker.process.kill()
+        task = asyncio.create_task(self._replenish(worker, kill))
+        self._spawn_tasks.add(task)
+        task.add_done_callback(self._spawn_tasks.discard)
+
+    async def _replenish(self, old_worker: ExtensionWorker, kill: bool) -> None:
+        try:
+            await asyncio.to_thread(old_worker.kill if kill else old_worker.stop)
+            worker = await asyncio.to_thread(self._spawn)
+        except Exception as e:
+            logger.error(f"创建扩展工作进程失败: {e}")
+            return
+        if self._idle is not None:
+            self._idle.put_nowait(worker)
+
+    def _needs_recycle(self, worker: ExtensionWorker) -> bool:
+        if worker.calls >= settings.EXTENSION_WORKER_MAX_CALLS:
+            return True
+        return worker.rss > settings.EXTENSION_WORKER_MAX_RSS_MB * 1024 * 1024
+
+    async def call(self, filepath: str, version: Optional[int], query: Any, config: Optional[Dict],
+                   progress: Optional[Callable[..., None]] = None) -> Any:
+        """
+        在工作进程中执行扩展查询
+
+        Args:
+            filepath: 扩展文件路径
+            version: 扩展管理器已通过校验的模块版本，与工作进程中缓存的版本不同时才重新加载
+            query: 查询参数
+            config: 扩展配置
+            progress: 进度回调（在等待结果的线程中调用）
+
+        Returns:
+            扩展返回结果
+        """
+        if not self.started:
+            await self.start()
+        worker = await self._idle.get()
+        try:
+            ok, value = await asyncio.to_thread(worker.call, filepath, version, query, config, progress)
+        except asyncio.CancelledError:
+            # 超时或请求被取消：结果无法收回，终止该进程
+            self.killed += 1
+            logger.warning(f"终止扩展工作进程 {worker.pid}: 调用被取消或超时")
+            self._retire(worker, kill=True)
+            raise
+        except WorkerCrashedError:
+            self.crashed += 1
+            self._retire(worker, kill=True)
+            raise
+
+        if self._needs_recycle(worker):
+            self.recycled += 1
+            logger.info(f"回收扩展工作进程 {worker.pid}: 调用 {worker.calls} 次，内存 {worker.rss // (1024 * 1024)}MB")
+            self._retire(worker)
+        else:
+            self._idle.put_nowait(worker)
+
+        if not ok:
+            raise RuntimeError(value)
+        return value
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取进程池指标"""
+        return {
+            "started": self.started,
+            "idle": self._idle.qsize() if self._idle else 0,
+            "recycled": self.recycled,
+            "killed": self.killed,
+            "crashed": self.crashed,
+            "preloaded": len(self._preload),
+            "workers": [
+                {
+                    "pid": w.pid,
+                    "calls": w.calls,
+                    "rss_mb": round(w.rss / (1024 * 1024), 1),
+                    "uptime": round(time.time() - w.started_at, 1),
+                }
+                for w in list(self._workers)
+            ],
+        }
+
+    def shutdown(self) -> None:
+        """关闭所有工作进程"""
+        for task in list(self._spawn_tasks):
+            task.cancel()
+        for worker in list(self._workers):
+            worker.stop()
+        self._workers.clear()
+        self._idle = None
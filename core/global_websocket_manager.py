@@ -3,6 +3,7 @@
 用于管理用户的全局WebSocket连接，处理各种类型的实时通知
 """
 
+import asyncio
 import json
 import logging
 from datetime import datetime
@@ -12,6 +13,9 @@ from enum import Enum
 
 logger = logging.getLogger("global_websocket_manager")
 
+# 单个连接发送消息的超时时间(秒)，超时视为连接已断开
+SEND_TIMEOUT = 5
+
 class MessageType(str, Enum):
     """消息类型枚举"""
     # 系统消息
@@ -30,6 +34,10 @@ class MessageType(str, Enum):
     MESSAGE_UPDATED = "message_updated"
     MESSAGE_DELETED = "message_deleted"
     MESSAGE_REACTION = "message_reaction"
+    UNREAD_COUNT_UPDATED = "unread_count_updated"
+    
+    # 扩展后台任务
+    EXTENSION_JOB_UPDATED = "extension_job_updated"
     
     # 认证相关
     AUTH_RESPONSE = "auth_response"
@@ -45,6 +53,10 @@ class GlobalWebSocketManager:
         self.user_status: Dict[int, datetime] = {}
         # 用户所在的聊天室
         self.user_rooms: Dict[int, Set[int]] = {}
+        # 聊天室ID -> 在线用户ID（user_rooms 的反向索引，聊天室广播不需要遍历所有在线用户）
+        self.room_users: Dict[int, Set[int]] = {}
+        # 发送失败后在后台关闭连接、广播下线的任务
+        self._cleanup_tasks: Set[asyncio.Task] = set()
     
     async def connect(self, websocket: WebSocket, user_id: int):
         """建立全局WebSocket连接"""
@@ -71,17 +83,11 @@ class GlobalWebSocketManager:
         except Exception as e:
             logger.error(f"建立全局WebSocket连接失败: {e}")
     
-    async def disconnect(self, user_id: int):
-        """断开全局WebSocket连接"""
+    async def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None):
+        """断开全局WebSocket连接（传入websocket时只在它仍是当前连接时断开）"""
         try:
-            if user_id in self.active_connections:
-                del self.active_connections[user_id]
-            
-            if user_id in self.user_status:
-                del self.user_status[user_id]
-            
-            if user_id in self.user_rooms:
-                del self.user_rooms[user_id]
+            if not self._remove_connection(user_id, websocket):
+                return
             
             logger.info(f"用户 {user_id} 断开全局WebSocket连接")
             
@@ -91,39 +97,90 @@ class GlobalWebSocketManager:
         except Exception as e:
             logger.error(f"断开全局WebSocket连接失败: {e}")
     
+    def _remove_connection(self, user_id: int, websocket: Optional[WebSocket] = None) -> bool:
+        """移除用户连接、在线状态和聊天室索引，返回是否移除"""
+        current = self.active_connections.get(user_id)
+        if current is None or (websocket is not None and current is not websocket):
+            return False
+        
+        del self.active_connections[user_id]
+        self.user_status.pop(user_id, None)
+        for room_id in self.user_rooms.pop(user_id, set()):
+            self._remove_room_user(room_id, user_id)
+        return True
+    
+    async def _drop_connection(self, user_id: int, websocket: WebSocket):
+        """关闭发送失败的连接并广播下线（在后台运行）"""
+        try:
+            await asyncio.wait_for(websocket.close(), SEND_TIMEOUT)
+        except Exception:
+            pass
+        
+        # 关闭期间用户已重新连接时不广播下线
+        if not self.is_user_online(user_id):
+            await self.broadcast_user_status(user_id, False)
+    
+    @staticmethod
+    def _encode(message_type: MessageType, data: Any) -> str:
+        """序列化消息（广播时只序列化一次）"""
+        message = {
+            "type": message_type.value,
+            "data": data,
+            "timestamp": datetime.now().isoformat()
+        }
+        return json.dumps(message)
+
+    async def _send_text(self, user_id: int, text: str) -> bool:
+        """向用户的连接发送已序列化的消息，失败或超时时清理连接"""
+        websocket = self.active_connections.get(user_id)
+        if websocket is None:
+            return False
+
+        try:
+            await asyncio.wait_for(websocket.send_text(text), SEND_TIMEOUT)
+            return True
+
+        except Exception as e:
+            logger.error(f"向用户 {user_id} 发送消息失败: {e!r}")
+            # 连接可能已断开，立即移除（用户已重新连接时保留新连接），
+            # 关闭连接和广播下线放到后台，不阻塞当前的广播
+            if self._remove_connection(user_id, websocket):
+                logger.info(f"用户 {user_id} 的全局WebSocket连接发送失败，已断开")
+                task = asyncio.create_task(self._drop_connection(user_id, websocket))
+                self._cleanup_tasks.add(task)
+                task.add_done_callback(self._cleanup_tasks.discard)
+            return False
+
     async def send_to_user(self, user_id: int, message_type: MessageType, data: Any):
         """向指定用户发送消息"""
         if user_id not in self.active_connections:
             return False
-        
+
         try:
-            message = {
-                "type": message_type.value,
-                "data": data,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            await self.active_connections[user_id].send_text(json.dumps(message))
-            return True
-            
+            text = self._encode(message_type, data)
         except Exception as e:
             logger.error(f"向用户 {user_id} 发送消息失败: {e}")
-            # 连接可能已断开，清理连接
-            await self.disconnect(user_id)
             return False
+
+        return await self._send_text(user_id, text)
     
     async def send_to_users(self, user_ids: list, message_type: MessageType, data: Any, exclude_user: int = None):
-        """向多个用户发送消息"""
-        success_count = 0
-        
-        for user_id in user_ids:
-            if exclude_user and user_id == exclude_user:
-                continue
-                
-            if await self.send_to_user(user_id, message_type, data):
-                success_count += 1
-        
-        return success_count
+        """向多个用户发送消息（并发发送，消息只序列化一次）"""
+        targets = [
+            user_id for user_id in user_ids
+            if user_id != exclude_user and user_id in self.active_connections
+        ]
+        if not targets:
+            return 0
+
+        try:
+            text = self._encode(message_type, data)
+        except Exception as e:
+            logger.error(f"序列化广播消息失败: {e}")
+            return 0
+
+        results = await asyncio.gather(*(self._send_text(user_id, text) for user_id in targets))
+        return sum(1 for sent in results if sent)
     
     async def broadcast_to_all(self, message_type: MessageType, data: Any, exclude_user: int = None):
         """向所有在线用户广播消息"""
@@ -132,12 +189,7 @@ class GlobalWebSocketManager:
     
     async def broadcast_to_room_members(self, room_id: int, message_type: MessageType, data: Any, exclude_user: int = None):
         """向聊天室成员广播消息"""
-        room_members = []
-        
-        for user_id, rooms in self.user_rooms.items():
-            if room_id in rooms:
-                room_members.append(user_id)
-        
+        room_members = list(self.room_users.get(room_id, ()))
         return await self.send_to_users(room_members, message_type, data, exclude_user)
     
     async def join_room(self, user_id: int, room_id: int):
@@ -146,13 +198,22 @@ class GlobalWebSocketManager:
             self.user_rooms[user_id] = set()
         
         self.user_rooms[user_id].add(room_id)
+        self.room_users.setdefault(room_id, set()).add(user_id)
         logger.info(f"用户 {user_id} 加入聊天室 {room_id}")
     
     async def leave_room(self, user_id: int, room_id: int):
         """用户离开聊天室"""
         if user_id in self.user_rooms and room_id in self.user_rooms[user_id]:
             self.user_rooms[user_id].remove(room_id)
+            self._remove_room_user(room_id, user_id)
             logger.info(f"用户 {user_id} 离开聊天室 {room_id}")
+
+    def _remove_room_user(self, room_id: int, user_id: int):
+        users = self.room_users.get(room_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.room_users[room_id]
     
     async def broadcast_user_status(self, user_id: int, is_online: bool):
         """广播用户在线状态"""
@@ -181,5 +242,9 @@ class GlobalWebSocketManager:
         """获取用户所在的聊天室"""
         return self.user_rooms.get(user_id, set())
 
+    def get_room_users(self, room_id: int) -> Set[int]:
+        """获取聊天室中在线的用户"""
+        return self.room_users.get(room_id, set())
+
 # 全局WebSocket管理器实例
 global_ws_manager = GlobalWebSocketManager()
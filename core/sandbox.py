@@ -3,16 +3,19 @@
 
 提供安全的扩展执行环境，限制扩展的权限和资源访问。
 """
+import ast
 import asyncio
 import os
 import sys
 import importlib.util
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from io import BytesIO
 import inspect
 
 from config import settings
 from core.db_manager import DBManager
+from core.extension_cache import get_cache_ttl
+from core.extension_executor import extension_executor, EXECUTION_BACKENDS, BACKEND_ASYNC, BACKEND_THREAD, BACKEND_PROCESS
 from core.file_manager import FileManager
 class SandboxException(Exception):
     """沙箱异常"""
@@ -47,7 +50,13 @@ class FileManagerAPI:
             raise SandboxException(f"保存文件失败: {str(e)}")
 
 def load_module_in_sandbox(filepath: str) -> Any:
-    """在沙箱环境中加载模块"""
+    """在沙箱环境中加载模块，加载失败时恢复 sys.modules 中的旧模块
+
+    加载前记录文件的修改时间(纳秒)作为模块版本（__extension_version__），
+    工作进程按该版本判断是否需要重新加载（见 core/extension_workers.py）
+    """
+    installed = False
+    previous = None
     try:
         # 检查文件是否存在
         if not os.path.exists(filepath):
@@ -62,7 +71,10 @@ def load_module_in_sandbox(filepath: str) -> Any:
             raise SandboxException(f"无法加载模块: {filepath}")
         
         module = importlib.util.module_from_spec(spec)
+        module.__extension_version__ = os.stat(filepath).st_mtime_ns
+        previous = sys.modules.get(spec.name)
         sys.modules[spec.name] = module
+        installed = True
         spec.loader.exec_module(module)
         
         # 验证模块接口
@@ -71,13 +83,173 @@ def load_module_in_sandbox(filepath: str) -> Any:
         
         return module
         
-    except SandboxException:
-        raise
     except Exception as e:
+        if installed:
+            if previous is not None:
+                sys.modules[spec.name] = previous
+            else:
+                sys.modules.pop(spec.name, None)
+        if isinstance(e, SandboxException):
+            raise
         raise SandboxException(f"加载模块失败: {str(e)}")
-from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def scan_module_file(filepath: str) -> Dict[str, Any]:
+    """
+    静态分析扩展文件（不执行代码），用于懒加载模式下启动时登记扩展
+
+    Returns:
+        {"functions": 顶层函数名集合, "constants": 顶层常量赋值}
+    """
+    if not os.path.exists(filepath):
+        raise SandboxException(f"模块文件不存在: {filepath}")
+    try:
+        with open(filepath, "rb") as f:
+            tree = ast.parse(f.read(), filename=filepath)
+    except SyntaxError as e:
+        raise SandboxException(f"模块语法错误: {str(e)}")
+
+    functions = set()
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.add(node.name)
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    constants[target.id] = node.value.value
+
+    if "execute_query" not in functions:
+        raise SandboxException("模块必须实现execute_query方法")
+    return {"functions": functions, "constants": constants}
+
+
+# 调用计划中的参数来源
+_INJECT_PARAMS = 0
+_INJECT_CONFIG = 1
+_INJECT_DB_MANAGER = 2
+_INJECT_DEFAULT = 3
+_INJECT_PROGRESS = 4
+
+
+def _no_progress(percent: float, message: Optional[str] = None) -> None:
+    """非后台任务执行时的进度回调（忽略）"""
+    pass
+
+
+class CallPlan:
+    """扩展调用计划
+
+    加载扩展时解析一次 execute_query 的签名：参数注入顺序、是否异步以及扩展配置，
+    每次查询按计划直接组装参数调用，不再反射。配置更新时调用 update_config 刷新。
+    执行后端、并发上限和超时时间读取模块中的 EXECUTION_BACKEND、MAX_CONCURRENCY、TIMEOUT，
+    结果缓存时间读取 CACHE_TTL 或 get_cache_policy()。
+    inflight 记录按此计划正在执行的调用数，热加载替换模块后据此等待旧版本的调用结束。
+    execute_query 为生成器函数时 is_stream 为真，结果以流式响应返回（见 core/extension_streaming.py）。
+    声明 progress 参数的扩展会收到进度回调 progress(百分比, 说明)，后台任务执行时上报给任务（见 core/extension_jobs.py）。
+    version 为生成计划时已通过校验的模块版本，进程后端调用时随请求传给工作进程。
+    """
+
+    __slots__ = ("name", "filepath", "version", "func", "injections", "is_async", "config",
+                 "backend", "max_concurrency", "timeout", "cache_ttl", "inflight", "is_stream")
+
+    def __init__(self, module: Any, config: Optional[Dict] = None):
+        self.name = module.__name__
+        self.filepath = getattr(module, "__file__", None)
+        self.version = getattr(module, "__extension_version__", None)
+        self.func = module.execute_query
+        injections = []
+        # 根据参数名称确定注入的值
+        for param in inspect.signature(self.func).parameters.values():
+            if param.name == "params":
+                injections.append((_INJECT_PARAMS, None))
+            elif param.name == "config":
+                injections.append((_INJECT_CONFIG, None))
+            elif param.name == "db_manager":
+                injections.append((_INJECT_DB_MANAGER, None))
+            elif param.name == "progress":
+                injections.append((_INJECT_PROGRESS, None))
+            else:
+                injections.append((_INJECT_DEFAULT, param.default))
+        self.injections = tuple(injections)
+        self.is_async = asyncio.iscoroutinefunction(self.func)
+        self.is_stream = inspect.isgeneratorfunction(self.func) or inspect.isasyncgenfunction(self.func)
+        self.config = config
+
+        backend = getattr(module, "EXECUTION_BACKEND", None) or BACKEND_THREAD
+        if backend not in EXECUTION_BACKENDS:
+            raise ValueError(f"不支持的执行后端: {backend}")
+        if self.is_stream and backend == BACKEND_PROCESS:
+            # 生成器无法跨进程传递
+            backend = BACKEND_THREAD
+        if inspect.isasyncgenfunction(self.func):
+            backend = BACKEND_ASYNC
+        elif self.is_async and backend != BACKEND_PROCESS:
+            backend = BACKEND_ASYNC
+        elif backend == BACKEND_ASYNC:
+            backend = BACKEND_THREAD
+        if backend == BACKEND_PROCESS and not self.filepath:
+            backend = BACKEND_THREAD
+        self.backend = backend
+        self.max_concurrency = int(getattr(module, "MAX_CONCURRENCY", settings.EXTENSION_MAX_CONCURRENCY))
+        self.timeout = float(getattr(module, "TIMEOUT", settings.EXTENSION_TIMEOUT))
+        self.cache_ttl = get_cache_ttl(module)
+        self.inflight = 0
+
+    @property
+    def uses_db_manager(self) -> bool:
+        """execute_query 是否需要注入数据库管理器（工作进程中不可用）"""
+        return any(source == _INJECT_DB_MANAGER for source, _ in self.injections)
+
+    def update_config(self, config: Optional[Dict]) -> None:
+        """刷新预解析的扩展配置"""
+        self.config = config
+
+    def build_args(self, query: Any, config: Optional[Dict], db_manager: Optional[DBManager],
+                   progress: Optional[Callable[..., None]] = None) -> list:
+        """按注入顺序组装参数"""
+        args = []
+        for source, default in self.injections:
+            if source == _INJECT_PARAMS:
+                args.append(query)
+            elif source == _INJECT_CONFIG:
+                args.append(config)
+            elif source == _INJECT_DB_MANAGER:
+                args.append(db_manager)
+            elif source == _INJECT_PROGRESS:
+                args.append(progress or _no_progress)
+            else:
+                args.append(default)
+        return args
+
+
+def compile_call_plan(module: Any, config: Optional[Dict] = None) -> CallPlan:
+    """为已加载的扩展模块生成调用计划"""
+    try:
+        return CallPlan(module, config)
+    except (TypeError, ValueError) as e:
+        raise SandboxException(f"无法解析execute_query签名: {str(e)}")
+
+
+# 查询失败时返回结果中的键
+QUERY_ERROR_KEY = "执行查询失败"
+
+
+def is_query_error(result: Any) -> bool:
+    """判断是否为查询失败的返回结果"""
+    return isinstance(result, dict) and QUERY_ERROR_KEY in result
+
+
+async def execute_call_plan(plan: CallPlan, query: Any, db_manager: Optional[DBManager] = None) -> Any:
+    """按调用计划执行扩展查询"""
+    try:
+        return await extension_executor.run(plan, query, db_manager)
+    except Exception as e:
+        return {QUERY_ERROR_KEY: str(e)}
+
+
 async def execute_query_in_sandbox(module: Any, params: Dict, config: Dict, files: Optional[Dict] = None, file_manager: Optional[FileManager] = None,db_manager:Optional[DBManager]=None) -> Any:
-    """在沙箱环境中执行查询"""
+    """在沙箱环境中执行查询（未预先生成调用计划的调用方，如定时任务）"""
     try:
         # 如果有文件管理器，创建API接口
         if file_manager and files:
@@ -87,30 +259,9 @@ async def execute_query_in_sandbox(module: Any, params: Dict, config: Dict, file
         if not module:
             extension_id = params.get("extension_id")
             module = load_module_in_sandbox(f"{settings.EXTENSIONS_DIR}/{extension_id}.py")
-        parameters=[]
-        # 执行查询,根据参数名称注入所需的参数
-        # 获取execute_query方法的参数
-        sig = inspect.signature(module.execute_query)
-        # print(params)
-        # 根据参数名称注入所需的参数
-        for param in sig.parameters.values():
-            if param.name == "params":
-                parameters.append(params.get("query"))
-            elif param.name == "config":
-                parameters.append(config)
-            elif param.name == "db_manager":
-                parameters.append(db_manager)
-            else:
-                parameters.append(param.default)
-        # print(config,params,db_manager)
-        # 判断方法是否是异步
-        if asyncio.iscoroutinefunction(module.execute_query):
-            result = await module.execute_query(*parameters)
-        else:
-            result = module.execute_query(*parameters)
-        # print(result)
-        return result
-        
+        plan = compile_call_plan(module, config)
+        return await execute_call_plan(plan, params.get("query"), db_manager)
+
     except Exception as e:
-        return {"执行查询失败": str(e)}
+        return {QUERY_ERROR_KEY: str(e)}
         # raise SandboxException(f"执行查询失败: {str(e)}") 
\ No newline at end of file
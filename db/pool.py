@@ -0,0 +1,149 @@
+"""
+数据库连接池管理模块
+
+统一创建带连接池的异步引擎：连接池大小、溢出、预检测、回收时间由配置决定，
+SQLite 连接建立时设置 WAL 和 synchronous 等 PRAGMA。
+所有引擎注册到 pool_registry，运行时指标可通过管理接口查看。
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, exc as sa_exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config import settings
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkout_count = 0
+        self.timeout_count = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def recreate(self):
+        # engine.dispose() 时会重建连接池，保留累计指标
+        new_pool = super().recreate()
+        new_pool.checkout_count = self.checkout_count
+        new_pool.timeout_count = self.timeout_count
+        new_pool.total_wait_time = self.total_wait_time
+        new_pool.max_wait_time = self.max_wait_time
+        return new_pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeout_count += 1
+            raise
+        finally:
+            wait_time = time.perf_counter() - start
+            with self._metrics_lock:
+                self.checkout_count += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            checkouts = self.checkout_count
+            return {
+                "pool_size": self.size(),
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "overflow": self.overflow(),
+                "max_overflow": self._max_overflow,
+                "checkouts": checkouts,
+                "timeouts": self.timeout_count,
+                "avg_wait_ms": round(self.total_wait_time * 1000 / checkouts, 3) if checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_time * 1000, 3),
+            }
+
+
+# 已创建的引擎：名称 -> AsyncEngine
+pool_registry: Dict[str, AsyncEngine] = {}
+
+
+def _is_sqlite_memory(url) -> bool:
+    database = url.database or ""
+    return database in ("", ":memory:") or "mode=memory" in str(url)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite 连接建立时设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if settings.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        if settings.SQLITE_SYNCHRONOUS:
+            cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    finally:
+        cursor.close()
+
+
+def create_pooled_engine(name: str, url: str, **kwargs) -> AsyncEngine:
+    """创建带连接池的异步引擎并注册
+
+    Args:
+        name: 引擎名称，用于指标展示
+        url: 数据库连接URL
+        **kwargs: 额外传给 create_async_engine 的参数
+
+    Returns:
+        异步引擎
+    """
+    sa_url = make_url(url)
+    is_sqlite = sa_url.get_backend_name() == "sqlite"
+
+    engine_kwargs: Dict[str, Any] = {"echo": settings.DB_ECHO}
+    if not (is_sqlite and _is_sqlite_memory(sa_url)):
+        # 内存 SQLite 只能使用单连接，保持默认连接池
+        engine_kwargs.update(
+            poolclass=MeteredQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    engine_kwargs.update(kwargs)
+
+    engine = create_async_engine(url, **engine_kwargs)
+    if is_sqlite:
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+    pool_registry[name] = engine
+    return engine
+
+
+def get_pool_metrics(name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """获取连接池指标
+
+    Args:
+        name: 引擎名称，为空时返回全部
+
+    Returns:
+        引擎名称 -> 指标
+    """
+    result = {}
+    for engine_name, engine in pool_registry.items():
+        if name and engine_name != name:
+            continue
+        pool = engine.sync_engine.pool
+        if isinstance(pool, MeteredQueuePool):
+            metrics = pool.metrics()
+        else:
+            metrics = {"status": pool.status()}
+        metrics["pool_class"] = type(pool).__name__
+        metrics["dialect"] = engine.dialect.name
+        result[engine_name] = metrics
+    return result
@@ -3,18 +3,15 @@
 """
 
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
 
 from config import settings
+from db.pool import create_pooled_engine
 from models import Base
 
-# 创建异步数据库引擎
-engine = create_async_engine(
-    settings.SQLALCHEMY_DATABASE_URI,
-    poolclass=NullPool,
-)
+# 创建异步数据库引擎（连接池参数见 db/pool.py）
+engine = create_pooled_engine("main", settings.SQLALCHEMY_DATABASE_URI)
 
 # 创建异步会话工厂
 AsyncSessionLocal = sessionmaker(
@@ -120,8 +120,10 @@ export const deleteRecord = async (tableName, recordId) => {
 //导出表数据
 export const exportTableData = async (tableName, format = 'json') => {
     try {
+        // 除JSON外均为文件流，按二进制接收
         const response = await axios.get(`/api/db/tables/${tableName}/export`, {
-            params: { format }
+            params: { format },
+            responseType: format === 'json' ? 'json' : 'blob'
         })
         return response
     } catch (error) {
@@ -20,6 +20,8 @@ from core.auth import init_permissions, init_users, init_default_roles
 from api.v1.api import api_router
 from core.logger import get_logger
 from core.extension_manager import ExtensionManager
+from core.extension_executor import extension_executor
+from core.extension_jobs import extension_job_manager
 from db.session import init_models, AsyncSessionLocal
 from api.v1.endpoints.extensions import init_manager
 from core.middleware import ExpiryCheckMiddleware, SecurityHeadersMiddleware, RequestLoggingMiddleware
@@ -147,6 +149,8 @@ async def lifespan(app: FastAPI):
 
         # 加载所有扩展
         await extension_manager.load_all_extensions(db=db)
+    if settings.EXTENSION_HOT_RELOAD:
+        extension_manager.watcher.start()
     logger.info("应用启动完成")
 
     # 启动聊天室清理任务 (已移除)
@@ -155,6 +159,9 @@ async def lifespan(app: FastAPI):
     if settings.SCHEDULER_ENABLE:
         await stop_scheduler()
         logger.info("应用调度器已关闭")
+    await extension_manager.watcher.stop()
+    extension_job_manager.shutdown()
+    extension_executor.shutdown()
     logger.info("应用关闭...")
 
 
@@ -5,7 +5,7 @@ from datetime import datetime
 from typing import Optional
 import enum
 
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, Boolean, DateTime, Table, Enum, JSON
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, Boolean, DateTime, Table, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .base import BaseModel
@@ -23,6 +23,15 @@ chat_room_members = Table(
     Column('nickname', String(50), nullable=True)  # 群内昵称
 )
 
+# 聊天室未读消息计数（发送消息时为其他成员加一，标记已读时清零）
+chat_room_unread = Table(
+    'chat_room_unread',
+    BaseModel.metadata,
+    Column('room_id', Integer, ForeignKey('chat_rooms.id'), primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True, index=True),
+    Column('unread_count', Integer, nullable=False, default=0)
+)
+
 class MessageType(enum.Enum):
     """消息类型"""
     text = "text"
@@ -61,9 +70,15 @@ class ChatRoom(BaseModel):
     is_public = Column(Boolean, default=True)
     max_members = Column(Integer, default=500)
     created_by = Column(Integer, ForeignKey("users.id"))
-    last_message_at = Column(DateTime, default=func.now())
+    last_message_at = Column(DateTime, default=func.now(), index=True)
     is_active = Column(Boolean, default=True)
 
+    # 最后一条消息摘要（发送、修改、删除消息时维护，聊天室列表无需加载消息）
+    last_message_id = Column(Integer, nullable=True)
+    last_message_preview = Column(String(100), nullable=True)
+    last_message_sender_id = Column(Integer, nullable=True)
+    last_message_sender_name = Column(String(100), nullable=True)
+
     # 群聊设置
     allow_member_invite = Column(Boolean, default=True)
     allow_member_modify_info = Column(Boolean, default=False)
@@ -118,6 +133,10 @@ class ChatRoomJoinRequest(BaseModel):
 class ChatMessage(BaseModel):
     """聊天消息模型"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # 消息历史按 id 游标分页
+        Index("ix_chat_messages_room_deleted_id", "room_id", "is_deleted", "id"),
+    )
 
     room_id = Column(Integer, ForeignKey("chat_rooms.id"), nullable=False)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -50,6 +50,8 @@ class TableDataResponse(BaseModel):
     page: int = Field(..., description="当前页码")
     per_page: int = Field(..., description="每页记录数")
     pages: int = Field(..., description="总页数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（游标分页）")
+    has_more: Optional[bool] = Field(None, description="是否还有下一页（游标分页）")
 
 
 class TableDataCreate(BaseModel):
@@ -232,6 +232,8 @@ class ChatRoomListItem(BaseModel):
     is_member: bool = False
     created_at: datetime
     last_message: Optional[str] = None
+    last_message_id: Optional[int] = None
+    last_message_sender: Optional[str] = None
     last_message_at: Optional[datetime] = None
     unread_count: int = 0
     is_muted: bool = False
@@ -245,7 +247,7 @@ class ChatRoomListItem(BaseModel):
 class MessageList(BaseModel):
     """消息列表"""
     messages: List[Message]
-    total: int
+    total: Optional[int] = None  # 游标分页不再统计总数
     has_more: bool = False
 
 class TypingStatus(BaseModel):
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为聊天消息表添加游标分页索引 (room_id, is_deleted, id)
+"""
+
+import asyncio
+import sqlite3
+from pathlib import Path
+
+async def migrate_message_cursor_index():
+    """为聊天消息表添加游标分页索引"""
+
+    print("🚀 开始数据库迁移：为聊天消息表添加游标分页索引...\n")
+
+    # 数据库文件路径
+    db_path = Path("data/db/app.db")
+
+    if not db_path.exists():
+        print("❌ 数据库文件不存在")
+        return
+
+    conn = None
+    try:
+        # 连接数据库
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+
+        print("🔄 创建索引: ix_chat_messages_room_deleted_id")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_chat_messages_room_deleted_id "
+            "ON chat_messages (room_id, is_deleted, id)"
+        )
+        conn.commit()
+        print("✅ 索引已创建")
+
+        # 检查查询计划
+        print("\n🔄 检查消息分页查询计划...")
+        cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM chat_messages "
+            "WHERE room_id = 1 AND is_deleted = 0 AND id < 100 ORDER BY id DESC LIMIT 51"
+        )
+        for row in cursor.fetchall():
+            print(f"   - {row[-1]}")
+
+        print("\n✅ 数据库迁移完成!")
+
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_message_cursor_index())
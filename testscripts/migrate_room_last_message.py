@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为聊天室表添加最后消息摘要字段，并从已有消息回填
+"""
+
+import asyncio
+import sqlite3
+from pathlib import Path
+
+async def migrate_room_last_message():
+    """为聊天室表添加最后消息摘要字段"""
+
+    print("🚀 开始数据库迁移：为聊天室表添加最后消息摘要字段...\n")
+
+    # 数据库文件路径
+    db_path = Path("data/db/app.db")
+
+    if not db_path.exists():
+        print("❌ 数据库文件不存在")
+        return
+
+    conn = None
+    try:
+        # 连接数据库
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+
+        # 检查表结构
+        print("🔄 检查当前表结构...")
+        cursor.execute("PRAGMA table_info(chat_rooms)")
+        existing_columns = [col[1] for col in cursor.fetchall()]
+
+        # 需要添加的新字段
+        new_fields = [
+            ("last_message_id", "INTEGER"),
+            ("last_message_preview", "VARCHAR(100)"),
+            ("last_message_sender_id", "INTEGER"),
+            ("last_message_sender_name", "VARCHAR(100)")
+        ]
+
+        # 添加缺失的字段
+        for field_name, field_type in new_fields:
+            if field_name not in existing_columns:
+                print(f"🔄 添加字段: {field_name}")
+                try:
+                    cursor.execute(f"ALTER TABLE chat_rooms ADD COLUMN {field_name} {field_type}")
+                    print(f"✅ 成功添加字段: {field_name}")
+                except sqlite3.Error as e:
+                    print(f"❌ 添加字段 {field_name} 失败: {e}")
+            else:
+                print(f"✅ 字段已存在: {field_name}")
+
+        # 聊天室列表按最后消息时间排序
+        print("\n🔄 创建最后消息时间索引...")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_chat_rooms_last_message_at ON chat_rooms (last_message_at)")
+        print("✅ 索引已创建")
+
+        # 回填每个聊天室最近一条未删除的消息
+        print("\n🔄 回填最后消息摘要...")
+        cursor.execute("""
+            SELECT m.room_id, m.id, m.content, m.sender_id, COALESCE(u.nickname, u.username)
+            FROM chat_messages m
+            JOIN users u ON u.id = m.sender_id
+            WHERE m.id IN (
+                SELECT MAX(id) FROM chat_messages WHERE is_deleted = 0 GROUP BY room_id
+            )
+        """)
+        rows = cursor.fetchall()
+        for room_id, message_id, content, sender_id, sender_name in rows:
+            preview = content[:50] + "..." if content and len(content) > 50 else content
+            cursor.execute(
+                """
+                UPDATE chat_rooms
+                SET last_message_id = ?, last_message_preview = ?,
+                    last_message_sender_id = ?, last_message_sender_name = ?
+                WHERE id = ?
+                """,
+                (message_id, preview, sender_id, sender_name, room_id)
+            )
+        print(f"✅ 已回填 {len(rows)} 个聊天室")
+
+        # 提交更改
+        conn.commit()
+        print("\n✅ 数据库迁移完成!")
+
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_room_last_message())
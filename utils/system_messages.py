@@ -8,8 +8,11 @@ from datetime import datetime
 from typing import Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.chat import ChatMessage as DBChatMessage
+from models.user import User as DBUser
 from schemas.modern_chat import SystemMessageType
 from core.global_websocket_manager import global_ws_manager, MessageType
+from core.chat_unread import chat_unread_counter
+from core.chat_rooms import set_room_last_message
 
 
 async def create_system_message(
@@ -53,8 +56,18 @@ async def create_system_message(
     )
     
     db.add(system_message)
+    await db.flush()
+
+    # 系统消息也是聊天室的最后一条消息
+    sender = await db.get(DBUser, sender_id)
+    if sender:
+        await set_room_last_message(db, system_message, sender)
+
     await db.commit()
     await db.refresh(system_message)
+
+    # 其他成员未读数加一
+    await chat_unread_counter.on_new_message(room_id, sender_id)
     
     # 发送WebSocket通知
     if notify: